@@ -0,0 +1 @@
+# Offline OpenAI stand-in and end-to-end benchmark harness
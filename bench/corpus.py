@@ -0,0 +1,104 @@
+"""
+Fixed synthetic benchmark corpus
+
+Generates a deterministic set of drawing-like PDFs: each document has a
+title block, general notes and a dash-size table spread over several pages.
+Half of each document's pages are written as native text (exercising the
+text-layer fast path) and half as rasterized images (exercising OCR), so
+both OCR paths show up in the measurements.
+
+Usage:
+    python -m bench.corpus --out bench/corpus
+"""
+
+import argparse
+from pathlib import Path
+
+import fitz  # PyMuPDF
+
+# (file name, page count) for the default corpus
+DEFAULT_CORPUS = [
+    ("collar_small.pdf", 1),
+    ("collar_medium.pdf", 4),
+    ("collar_large.pdf", 12),
+    ("catalog_long.pdf", 30),
+]
+
+PAGE_WIDTH, PAGE_HEIGHT = 612, 792
+RASTER_DPI = 150
+
+
+def _page_lines(doc_index: int, page_index: int) -> list:
+    base = f"MK{doc_index + 1}"
+    lines = [f"{base} COLLAR - SELF-LOCKING, SHEET {page_index + 1}"]
+    if page_index == 0:
+        lines += [
+            "GENERAL NOTES",
+            "1. MATERIAL: 2024-T6 ALUMINUM ALLOY PER QQ-A-430.",
+            "2. FINISH: ANODIZE PER MIL-A-8625, TYPE II.",
+            "3. LUBRICANT: CETYL ALCOHOL OR SOLID FILM LUBE.",
+            f"4. PART NUMBER: {base} + MATERIAL CODE + DASH NUMBER.",
+        ]
+    lines.append("DASH NO   THREAD          DIA A    DIA B    LENGTH")
+    for row in range(24):
+        dash = page_index * 24 + row + 1
+        lines.append(f"-{dash:<8} {dash % 12 + 2}-32UNJF-3B    .{100 + dash:03d}    .{200 + dash:03d}    .{300 + dash:03d}")
+    return lines
+
+
+def _write_text_page(doc, lines):
+    page = doc.new_page(width=PAGE_WIDTH, height=PAGE_HEIGHT)
+    y = 48
+    for line in lines:
+        page.insert_text((36, y), line, fontname="cour", fontsize=9)
+        y += 13
+    return page
+
+
+def _write_image_page(doc, lines):
+    # Render the text on a scratch document, then place it as a bitmap only
+    scratch = fitz.open()
+    _write_text_page(scratch, lines)
+    pixmap = scratch[0].get_pixmap(dpi=RASTER_DPI)
+    scratch.close()
+    page = doc.new_page(width=PAGE_WIDTH, height=PAGE_HEIGHT)
+    page.insert_image(page.rect, pixmap=pixmap)
+    return page
+
+
+def build_document(path: Path, doc_index: int, pages: int):
+    doc = fitz.open()
+    for page_index in range(pages):
+        lines = _page_lines(doc_index, page_index)
+        if page_index % 2 == 0:
+            _write_text_page(doc, lines)
+        else:
+            _write_image_page(doc, lines)
+    doc.save(str(path), deflate=True)
+    doc.close()
+
+
+def build_corpus(out_dir: str, documents=None) -> list:
+    """
+    Write the corpus PDFs (skipping files that already exist)
+
+    Returns:
+        List of PDF paths in corpus order
+    """
+    out = Path(out_dir)
+    out.mkdir(parents=True, exist_ok=True)
+    paths = []
+    for doc_index, (name, pages) in enumerate(documents or DEFAULT_CORPUS):
+        path = out / name
+        if not path.exists():
+            build_document(path, doc_index, pages)
+            print(f"📄 Generated {path} ({pages} pages)")
+        paths.append(path)
+    return paths
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Generate the synthetic benchmark corpus")
+    parser.add_argument("--out", default="bench/corpus")
+    args = parser.parse_args()
+    build_corpus(args.out)
@@ -0,0 +1,311 @@
+"""
+Offline OpenAI chat-completions stand-in
+
+Serves POST /v1/chat/completions (plain and streamed) so the pipeline can
+run without an API key. Responses are replayed from a directory of recorded
+responses (the LLM cache format, keyed like services.llm_cache.cache_key)
+or synthesized deterministically from the prompt:
+
+- partition plans return MOCK_PARTITIONS "group k of n" subsets
+- rules prompts return a rule object that expands to MOCK_RECORDS parts
+- extraction batches return the next parts of a fixed family of
+  MOCK_RECORDS names, honoring the (compressed) exclusion list, the
+  requested batch size and the subset
+
+Latency, generation speed and failures are configurable to reproduce
+production behaviour: MOCK_LATENCY_MS before the first token,
+MOCK_TOKENS_PER_SEC while generating, MOCK_ERROR_RATE 500s,
+MOCK_429_RATE injected 429s and MOCK_RPM as a real per-minute limit.
+
+Usage:
+    python -m bench.mock_openai --port 8100
+    OPENAI_BASE_URL=http://127.0.0.1:8100/v1 OPENAI_API_KEY=mock python main.py
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import random
+import re
+import threading
+import time
+import uuid
+from collections import deque
+from pathlib import Path
+
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+
+from services.llm_cache import cache_key
+
+# Mock behaviour (overridable from the environment or the command line)
+MOCK_LATENCY_MS = float(os.getenv("MOCK_LATENCY_MS", "400"))
+MOCK_TOKENS_PER_SEC = float(os.getenv("MOCK_TOKENS_PER_SEC", "80"))
+MOCK_ERROR_RATE = float(os.getenv("MOCK_ERROR_RATE", "0"))
+MOCK_429_RATE = float(os.getenv("MOCK_429_RATE", "0"))
+MOCK_RPM = int(os.getenv("MOCK_RPM", "0"))
+MOCK_RECORDS = int(os.getenv("MOCK_RECORDS", "60"))
+MOCK_PARTITIONS = int(os.getenv("MOCK_PARTITIONS", "4"))
+MOCK_REPLAY_DIR = os.getenv("MOCK_REPLAY_DIR", "")
+MOCK_SEED = int(os.getenv("MOCK_SEED", "0"))
+
+CHARS_PER_TOKEN = 4
+STREAM_PIECE_CHARS = 16
+BASE_PART = "MK"
+
+app = FastAPI(title="Mock OpenAI API")
+
+_random = random.Random(MOCK_SEED)
+_lock = threading.Lock()
+_request_times = deque()
+_counters = {"requests": 0, "replayed": 0, "synthetic": 0, "errors_injected": 0, "rate_limited": 0}
+
+
+# ---------------------------------------------------------------------------
+# Synthetic responses
+# ---------------------------------------------------------------------------
+
+def part_name(index: int) -> str:
+    return f"{BASE_PART}{index}"
+
+
+def part_record(index: int) -> dict:
+    return {
+        "Name": part_name(index),
+        "Base Part Number 1": BASE_PART,
+        "Part Series": BASE_PART,
+        "Sales Description": f"MOCK COLLAR, DASH {index}",
+        "Part Material Detail": "2024 aluminum alloy",
+        "Thread": f"{index % 12 + 2}-32UNJF-3B",
+    }
+
+
+def expand_compressed(text: str) -> set:
+    """Inverse of prompts.compress_names for a comma-separated name list"""
+    names = set()
+    for match in re.finditer(r'([^\s,{}]*)\{([^}]*)\}([^\s,{}]*)|([^\s,{}]+)', text):
+        if match.group(4):
+            names.add(match.group(4))
+            continue
+        prefix, body, suffix = match.group(1), match.group(2), match.group(3)
+        for part in body.split(","):
+            bounds = part.strip().split("–")
+            width = len(bounds[0]) if bounds[0].startswith("0") else 0
+            start, end = int(bounds[0]), int(bounds[-1])
+            for number in range(start, end + 1):
+                names.add(f"{prefix}{number:0{width}d}{suffix}")
+    return names
+
+
+def synthetic_extraction(request_text: str) -> list:
+    excluded = set()
+    match = re.search(r"exclude all of these\):\s*(.*)", request_text)
+    if match:
+        excluded = expand_compressed(match.group(1))
+
+    batch_size = 25
+    match = re.search(r"up to (\d+)", request_text)
+    if match:
+        batch_size = int(match.group(1))
+
+    group, groups = 1, 1
+    match = re.search(r"group (\d+) of (\d+)", request_text)
+    if match:
+        group, groups = int(match.group(1)), int(match.group(2))
+
+    records = []
+    for index in range(1, MOCK_RECORDS + 1):
+        if (index - 1) % groups != group - 1 or part_name(index) in excluded:
+            continue
+        records.append(part_record(index))
+        if len(records) >= batch_size:
+            break
+    return records
+
+
+def synthetic_rules() -> dict:
+    return {
+        "base_part_number": BASE_PART,
+        "name_template": "{base}{dash}",
+        "shared_attributes": {"Part Series": BASE_PART, "Sales Description": "MOCK COLLAR, DASH {dash}"},
+        "variables": [
+            {"name": "dash", "options": [{"code": str(index)} for index in range(1, MOCK_RECORDS + 1)]},
+        ],
+        "exclusions": [],
+    }
+
+
+def synthetic_content(messages: list) -> str:
+    prompt = "\n".join(str(message.get("content", "")) for message in messages)
+    if "**disjoint** subsets" in prompt:
+        return json.dumps([f"Parts in group {k} of {MOCK_PARTITIONS}" for k in range(1, MOCK_PARTITIONS + 1)])
+    if "Do NOT list individual parts" in prompt:
+        return json.dumps(synthetic_rules(), indent=2)
+    return json.dumps(synthetic_extraction(str(messages[-1].get("content", ""))), indent=2)
+
+
+def replayed_content(model: str, temperature: float, messages: list):
+    if not MOCK_REPLAY_DIR:
+        return None
+    entry = Path(MOCK_REPLAY_DIR) / f"{cache_key(model, temperature, messages)}.json"
+    try:
+        with open(entry, "r", encoding="utf-8") as f:
+            return json.load(f)["response"]
+    except (FileNotFoundError, json.JSONDecodeError, KeyError):
+        return None
+
+
+# ---------------------------------------------------------------------------
+# Failure injection
+# ---------------------------------------------------------------------------
+
+def _error(status: int, message: str, error_type: str, headers: dict = None):
+    return JSONResponse(
+        status_code=status,
+        content={"error": {"message": message, "type": error_type, "param": None, "code": None}},
+        headers=headers,
+    )
+
+
+def injected_failure():
+    """Return an error response if this request should fail, else None"""
+    now = time.monotonic()
+    with _lock:
+        _counters["requests"] += 1
+        if MOCK_RPM > 0:
+            while _request_times and now - _request_times[0] > 60:
+                _request_times.popleft()
+            if len(_request_times) >= MOCK_RPM:
+                _counters["rate_limited"] += 1
+                retry_ms = int((60 - (now - _request_times[0])) * 1000) + 1
+                return _error(429, "Rate limit reached (mock RPM)", "requests",
+                              {"retry-after-ms": str(retry_ms), "retry-after": str(retry_ms // 1000 + 1)})
+            _request_times.append(now)
+
+        roll = _random.random()
+        if roll < MOCK_429_RATE:
+            _counters["rate_limited"] += 1
+            return _error(429, "Rate limit reached (injected)", "requests", {"retry-after-ms": "500"})
+        if roll < MOCK_429_RATE + MOCK_ERROR_RATE:
+            _counters["errors_injected"] += 1
+            return _error(500, "The server had an error (injected)", "server_error")
+    return None
+
+
+# ---------------------------------------------------------------------------
+# Endpoints
+# ---------------------------------------------------------------------------
+
+def _usage(messages: list, content: str) -> dict:
+    prompt_tokens = sum(len(str(message.get("content", ""))) for message in messages) // CHARS_PER_TOKEN + 1
+    completion_tokens = len(content) // CHARS_PER_TOKEN + 1
+    return {
+        "prompt_tokens": prompt_tokens,
+        "completion_tokens": completion_tokens,
+        "total_tokens": prompt_tokens + completion_tokens,
+        "prompt_tokens_details": {"cached_tokens": 0},
+    }
+
+
+def _chunk(completion_id: str, model: str, created: int, delta: dict, finish_reason=None) -> str:
+    payload = {
+        "id": completion_id,
+        "object": "chat.completion.chunk",
+        "created": created,
+        "model": model,
+        "choices": [{"index": 0, "delta": delta, "finish_reason": finish_reason}],
+    }
+    return f"data: {json.dumps(payload)}\n\n"
+
+
+async def _stream(completion_id, model, created, content, usage, include_usage):
+    yield _chunk(completion_id, model, created, {"role": "assistant", "content": ""})
+    piece_delay = STREAM_PIECE_CHARS / CHARS_PER_TOKEN / MOCK_TOKENS_PER_SEC if MOCK_TOKENS_PER_SEC > 0 else 0
+    for start in range(0, len(content), STREAM_PIECE_CHARS):
+        if piece_delay:
+            await asyncio.sleep(piece_delay)
+        yield _chunk(completion_id, model, created, {"content": content[start:start + STREAM_PIECE_CHARS]})
+    yield _chunk(completion_id, model, created, {}, finish_reason="stop")
+    if include_usage:
+        payload = {"id": completion_id, "object": "chat.completion.chunk", "created": created,
+                   "model": model, "choices": [], "usage": usage}
+        yield f"data: {json.dumps(payload)}\n\n"
+    yield "data: [DONE]\n\n"
+
+
+@app.post("/v1/chat/completions")
+async def chat_completions(request: Request):
+    body = await request.json()
+    model = body.get("model", "gpt-4o")
+    messages = body.get("messages", [])
+
+    failure = injected_failure()
+    if failure is not None:
+        return failure
+
+    content = replayed_content(model, body.get("temperature", 1.0), messages)
+    with _lock:
+        _counters["replayed" if content is not None else "synthetic"] += 1
+    if content is None:
+        content = synthetic_content(messages)
+
+    usage = _usage(messages, content)
+    completion_id = f"chatcmpl-mock-{uuid.uuid4().hex[:12]}"
+    created = int(time.time())
+
+    if MOCK_LATENCY_MS > 0:
+        await asyncio.sleep(MOCK_LATENCY_MS / 1000)
+
+    if body.get("stream"):
+        include_usage = bool((body.get("stream_options") or {}).get("include_usage"))
+        return StreamingResponse(
+            _stream(completion_id, model, created, content, usage, include_usage),
+            media_type="text/event-stream",
+        )
+
+    if MOCK_TOKENS_PER_SEC > 0:
+        await asyncio.sleep(usage["completion_tokens"] / MOCK_TOKENS_PER_SEC)
+    return {
+        "id": completion_id,
+        "object": "chat.completion",
+        "created": created,
+        "model": model,
+        "choices": [{"index": 0, "message": {"role": "assistant", "content": content}, "finish_reason": "stop"}],
+        "usage": usage,
+    }
+
+
+@app.get("/mock/stats")
+async def mock_stats():
+    with _lock:
+        return dict(_counters)
+
+
+if __name__ == "__main__":
+    import uvicorn
+
+    parser = argparse.ArgumentParser(description="Offline OpenAI chat-completions stand-in")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8100)
+    parser.add_argument("--latency-ms", type=float, default=MOCK_LATENCY_MS)
+    parser.add_argument("--tokens-per-sec", type=float, default=MOCK_TOKENS_PER_SEC)
+    parser.add_argument("--error-rate", type=float, default=MOCK_ERROR_RATE)
+    parser.add_argument("--rate-limit-rate", type=float, default=MOCK_429_RATE)
+    parser.add_argument("--rpm", type=int, default=MOCK_RPM)
+    parser.add_argument("--records", type=int, default=MOCK_RECORDS)
+    parser.add_argument("--partitions", type=int, default=MOCK_PARTITIONS)
+    parser.add_argument("--replay-dir", default=MOCK_REPLAY_DIR)
+    args = parser.parse_args()
+
+    MOCK_LATENCY_MS = args.latency_ms
+    MOCK_TOKENS_PER_SEC = args.tokens_per_sec
+    MOCK_ERROR_RATE = args.error_rate
+    MOCK_429_RATE = args.rate_limit_rate
+    MOCK_RPM = args.rpm
+    MOCK_RECORDS = args.records
+    MOCK_PARTITIONS = args.partitions
+    MOCK_REPLAY_DIR = args.replay_dir
+
+    print(f"🧪 Mock OpenAI API on http://{args.host}:{args.port}/v1")
+    uvicorn.run(app, host=args.host, port=args.port, log_level="warning")
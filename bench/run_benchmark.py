@@ -0,0 +1,300 @@
+"""
+End-to-end pipeline benchmark
+
+Runs a fixed corpus through the pipeline against the offline OpenAI
+stand-in (bench/mock_openai.py) and reports throughput (jobs/minute),
+p50/p95 latency per stage and peak memory. Two targets are supported:
+
+- processor: calls PDFProcessor.process_pdf directly from a thread pool
+- http: uploads through POST /upload and follows GET /status, against a
+  server it starts itself (--start-server) or one already running (--api-url)
+
+Caches are disabled by default so repeated runs measure the same work.
+
+Usage:
+    python -m bench.run_benchmark --target processor --concurrency 4 --repeat 2
+    python -m bench.run_benchmark --target http --start-server --output bench/report.json
+"""
+
+import argparse
+import json
+import os
+import resource
+import shutil
+import subprocess
+import sys
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+import httpx
+
+from bench.corpus import build_corpus
+from services.llm_metrics import timing_summary
+
+STAGE_ORDER = ["queued", "waiting_ocr", "ocr", "waiting_llm", "llm"]
+
+
+def _wait_for(url: str, timeout: float = 60.0):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            httpx.get(url, timeout=2.0)
+            return
+        except httpx.HTTPError:
+            time.sleep(0.25)
+    raise RuntimeError(f"Timed out waiting for {url}")
+
+
+def _peak_rss_mb(pid: int):
+    """Peak resident memory of a process and its descendants (Linux only)"""
+    total_kb = 0
+    pending = [pid]
+    while pending:
+        current = pending.pop()
+        try:
+            with open(f"/proc/{current}/status") as f:
+                for line in f:
+                    if line.startswith("VmHWM:"):
+                        total_kb += int(line.split()[1])
+            for task in Path(f"/proc/{current}/task").iterdir():
+                children = (task / "children").read_text().split()
+                pending.extend(int(child) for child in children)
+        except (FileNotFoundError, ProcessLookupError, PermissionError):
+            continue
+    return round(total_kb / 1024, 1) if total_kb else None
+
+
+def _stage_durations(timeline: list, finished_at: float) -> dict:
+    """Seconds spent in each stage from an ordered [(stage, timestamp)] list"""
+    durations = {}
+    for (stage, started), (_, ended) in zip(timeline, timeline[1:] + [(None, finished_at)]):
+        durations[stage] = durations.get(stage, 0.0) + (ended - started)
+    return durations
+
+
+class _Timeline:
+    """Thread-safe recorder of stage transitions for one job"""
+
+    def __init__(self):
+        self.entries = []
+        self._lock = threading.Lock()
+
+    def mark(self, stage: str):
+        with self._lock:
+            if not self.entries or self.entries[-1][0] != stage:
+                self.entries.append((stage, time.perf_counter()))
+
+
+def run_processor(pdfs: list, concurrency: int, keep_results: bool) -> list:
+    """Drive PDFProcessor.process_pdf directly; returns one result per job"""
+    # Imported here so environment set up by main() is seen at import time
+    from logic import PDFProcessor
+    from services import ocr_workers
+
+    processor = PDFProcessor()
+
+    def run_job(pdf_path, submitted):
+        upload_id = f"bench-{uuid.uuid4()}"
+        timeline = _Timeline()
+        timeline.entries.append(("queued", submitted))
+        result = {"file": pdf_path.name, "upload_id": upload_id, "status": "completed"}
+        try:
+            data = processor.process_pdf(
+                str(pdf_path), upload_id, pdf_path.name,
+                on_progress=lambda stage, progress, **updates: timeline.mark(stage),
+            )
+            result["records"] = data["records_extracted"]
+            result["llm_usage"] = data["llm_usage"]
+        except Exception as e:
+            result.update({"status": "error", "error": str(e)})
+        finished = time.perf_counter()
+        result["total_seconds"] = finished - submitted
+        result["stages"] = _stage_durations(timeline.entries, finished)
+        if not keep_results:
+            shutil.rmtree(processor.results_dir / upload_id, ignore_errors=True)
+        return result
+
+    try:
+        with ThreadPoolExecutor(max_workers=concurrency) as executor:
+            submitted = time.perf_counter()
+            return list(executor.map(run_job, pdfs, [submitted] * len(pdfs)))
+    finally:
+        ocr_workers.shutdown()
+
+
+def run_http(pdfs: list, api_url: str, poll_interval: float, keep_results: bool) -> list:
+    """Upload every PDF at once and follow each job through /status"""
+    jobs = {}
+    with httpx.Client(base_url=api_url, timeout=120.0) as client:
+        for pdf_path in pdfs:
+            started = time.perf_counter()
+            with open(pdf_path, "rb") as f:
+                response = client.post(
+                    "/upload", params={"force": "true"},
+                    files={"file": (pdf_path.name, f, "application/pdf")},
+                )
+            response.raise_for_status()
+            upload_id = response.json()["upload_id"]
+            timeline = _Timeline()
+            timeline.entries.append(("queued", started))
+            jobs[upload_id] = {"file": pdf_path.name, "started": started, "timeline": timeline, "result": None}
+
+        pending = set(jobs)
+        while pending:
+            time.sleep(poll_interval)
+            for upload_id in list(pending):
+                status = client.get(f"/status/{upload_id}").json()
+                job = jobs[upload_id]
+                if status.get("status") in ("completed", "error"):
+                    finished = time.perf_counter()
+                    job["result"] = {
+                        "file": job["file"],
+                        "upload_id": upload_id,
+                        "status": status["status"],
+                        "records": status.get("records_extracted", 0),
+                        "llm_usage": status.get("llm_usage"),
+                        "total_seconds": finished - job["started"],
+                        "stages": _stage_durations(job["timeline"].entries, finished),
+                    }
+                    if status["status"] == "error":
+                        job["result"]["error"] = status.get("message")
+                    pending.discard(upload_id)
+                elif status.get("stage"):
+                    job["timeline"].mark(status["stage"])
+
+        if not keep_results:
+            for upload_id in jobs:
+                client.delete(f"/cleanup/{upload_id}")
+
+    return [job["result"] for job in jobs.values()]
+
+
+def build_report(results: list, wall_seconds: float, peak_memory_mb, llm_metrics: dict, config: dict) -> dict:
+    completed = [result for result in results if result["status"] == "completed"]
+    stages = {}
+    for stage in STAGE_ORDER:
+        values = [result["stages"][stage] for result in completed if stage in result["stages"]]
+        if values:
+            stages[stage] = dict(timing_summary(values), count=len(values))
+
+    return {
+        "config": config,
+        "jobs": len(results),
+        "failed": len(results) - len(completed),
+        "wall_seconds": round(wall_seconds, 2),
+        "jobs_per_minute": round(len(completed) / wall_seconds * 60, 2) if wall_seconds else 0.0,
+        "records": sum(result.get("records", 0) for result in completed),
+        "total_seconds": timing_summary([result["total_seconds"] for result in completed]),
+        "stages": stages,
+        "peak_memory_mb": peak_memory_mb,
+        "llm_metrics": llm_metrics,
+        "results": results,
+    }
+
+
+def print_report(report: dict):
+    print("\n📊 Benchmark results")
+    print(f"   Jobs: {report['jobs']} ({report['failed']} failed) in {report['wall_seconds']}s "
+          f"→ {report['jobs_per_minute']} jobs/minute, {report['records']} records")
+    print(f"   Peak memory: {report['peak_memory_mb']} MB")
+    print(f"   {'stage':<12} {'p50':>8} {'p95':>8} {'max':>8}")
+    for stage, summary in list(report["stages"].items()) + [("total", report["total_seconds"])]:
+        print(f"   {stage:<12} {summary['p50']:>8.2f} {summary['p95']:>8.2f} {summary['max']:>8.2f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="End-to-end pipeline benchmark against the mock OpenAI API")
+    parser.add_argument("--target", choices=("processor", "http"), default="processor")
+    parser.add_argument("--corpus", default="bench/corpus", help="Directory of PDFs (generated if empty)")
+    parser.add_argument("--repeat", type=int, default=1, help="Times each corpus file is processed")
+    parser.add_argument("--concurrency", type=int, default=4, help="Concurrent jobs (processor target)")
+    parser.add_argument("--api-url", default="http://127.0.0.1:8000", help="Server under test (http target)")
+    parser.add_argument("--start-server", action="store_true", help="Start main.py on --api-url's port")
+    parser.add_argument("--poll-interval", type=float, default=0.2)
+    parser.add_argument("--mock-port", type=int, default=8100)
+    parser.add_argument("--no-mock", action="store_true", help="Use OPENAI_BASE_URL as-is instead of the mock")
+    parser.add_argument("--mock-latency-ms", type=float, default=None)
+    parser.add_argument("--mock-tokens-per-sec", type=float, default=None)
+    parser.add_argument("--mock-error-rate", type=float, default=None)
+    parser.add_argument("--mock-429-rate", type=float, default=None)
+    parser.add_argument("--mock-rpm", type=int, default=None)
+    parser.add_argument("--use-caches", action="store_true", help="Keep OCR/LLM caches enabled")
+    parser.add_argument("--keep-results", action="store_true")
+    parser.add_argument("--output", help="Write the JSON report here")
+    args = parser.parse_args()
+
+    corpus_dir = Path(args.corpus)
+    pdfs = sorted(corpus_dir.glob("*.pdf")) or build_corpus(args.corpus)
+    pdfs = pdfs * max(1, args.repeat)
+
+    env = dict(os.environ)
+    if not args.use_caches:
+        env.update({"OCR_CACHE": "0", "LLM_CACHE": "0"})
+
+    processes = []
+    try:
+        if not args.no_mock:
+            mock_env = dict(env)
+            for flag, name in [("mock_latency_ms", "MOCK_LATENCY_MS"), ("mock_tokens_per_sec", "MOCK_TOKENS_PER_SEC"),
+                               ("mock_error_rate", "MOCK_ERROR_RATE"), ("mock_429_rate", "MOCK_429_RATE"),
+                               ("mock_rpm", "MOCK_RPM")]:
+                if getattr(args, flag) is not None:
+                    mock_env[name] = str(getattr(args, flag))
+            processes.append(subprocess.Popen(
+                [sys.executable, "-m", "bench.mock_openai", "--port", str(args.mock_port)], env=mock_env
+            ))
+            _wait_for(f"http://127.0.0.1:{args.mock_port}/mock/stats")
+            env["OPENAI_BASE_URL"] = f"http://127.0.0.1:{args.mock_port}/v1"
+            env.setdefault("OPENAI_API_KEY", "mock")
+
+        server = None
+        if args.target == "http" and args.start_server:
+            port = httpx.URL(args.api_url).port or 8000
+            server = subprocess.Popen(
+                [sys.executable, "-m", "uvicorn", "main:app", "--port", str(port), "--log-level", "warning"], env=env
+            )
+            processes.append(server)
+            _wait_for(f"{args.api_url}/health", timeout=300)
+
+        print(f"🏁 Benchmarking {len(pdfs)} job(s) via {args.target}")
+        started = time.perf_counter()
+        if args.target == "processor":
+            os.environ.update(env)
+            results = run_processor(pdfs, args.concurrency, args.keep_results)
+            wall_seconds = time.perf_counter() - started
+            from services.llm_metrics import snapshot
+            llm_metrics = snapshot()
+            usage = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss + resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss
+            peak_memory_mb = round(usage / 1024, 1)
+        else:
+            results = run_http(pdfs, args.api_url, args.poll_interval, args.keep_results)
+            wall_seconds = time.perf_counter() - started
+            llm_metrics = httpx.get(f"{args.api_url}/llm/metrics", timeout=10).json()
+            peak_memory_mb = _peak_rss_mb(server.pid) if server else None
+    finally:
+        for process in reversed(processes):
+            process.terminate()
+            process.wait(timeout=30)
+
+    config = {
+        "target": args.target,
+        "corpus": [pdf.name for pdf in sorted(set(pdfs))],
+        "repeat": args.repeat,
+        "concurrency": args.concurrency if args.target == "processor" else None,
+        "caches": args.use_caches,
+        "mock": not args.no_mock,
+    }
+    report = build_report(results, wall_seconds, peak_memory_mb, llm_metrics, config)
+    print_report(report)
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"💾 Report written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
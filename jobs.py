@@ -0,0 +1,225 @@
+"""
+Background Job Queue
+
+Uploads are enqueued here and processed by a bounded pool of asyncio workers.
+Each job runs PDFProcessor.process_pdf in a worker thread so the event loop
+stays free for /status, /health and every other request.
+"""
+
+import asyncio
+import os
+import time
+from collections import OrderedDict
+from typing import Dict, Any, Optional
+
+from logic import PDFProcessor
+from services import events
+from services.openai_loop import LLM_EXTRACTION_MODE
+from services.record_writer import parse_formats
+
+# Number of jobs that may be in flight at once (OCR/LLM stages are further
+# limited by the processor's per-stage semaphores)
+JOB_WORKERS = int(os.getenv("JOB_WORKERS", "4"))
+
+
+def dedup_key(content_hash: str, options: Dict[str, Any] = None) -> tuple:
+    """Identity of a job's results: the PDF content plus the options that change them"""
+    options = options or {}
+    return (
+        content_hash,
+        options.get("extraction_mode") or LLM_EXTRACTION_MODE,
+        tuple(sorted(parse_formats(options.get("formats")))),
+    )
+
+
+class Job:
+    """In-memory record of a queued or running upload"""
+
+    def __init__(self, upload_id: str, pdf_path: str, original_filename: str = None, content_hash: str = None,
+                 options: Dict[str, Any] = None):
+        self.upload_id = upload_id
+        self.pdf_path = pdf_path
+        self.original_filename = original_filename
+        self.content_hash = content_hash
+        self.options = options or {}
+        self.dedup_key = dedup_key(content_hash, self.options) if content_hash else None
+        self.state = "queued"
+        self.stage = "queued"
+        self.progress = 0.0
+        self.records = 0
+        self.pages_done = 0
+        self.pages_total = None
+        self.enqueued_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+        self.error = None
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "upload_id": self.upload_id,
+            "state": self.state,
+            "stage": self.stage,
+            "progress": round(self.progress, 3),
+            "records": self.records,
+            "pages_done": self.pages_done,
+            "pages_total": self.pages_total,
+            "enqueued_at": self.enqueued_at,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+            "error": self.error,
+        }
+
+
+class JobManager:
+    """Bounded worker pool that drains a FIFO queue of upload jobs"""
+
+    def __init__(self, processor: PDFProcessor, workers: int = JOB_WORKERS):
+        self.processor = processor
+        self.workers = max(1, workers)
+        self.jobs: "OrderedDict[str, Job]" = OrderedDict()
+        self.by_hash: Dict[tuple, str] = {}
+        self._queue: Optional[asyncio.Queue] = None
+        self._tasks = []
+
+    def start(self):
+        """Start worker tasks (must be called from the running event loop)"""
+        self._queue = asyncio.Queue()
+        self._tasks = [asyncio.create_task(self._worker(i)) for i in range(self.workers)]
+        print(f"🧵 Started {self.workers} job workers")
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        for task in self._tasks:
+            try:
+                await task
+            except asyncio.CancelledError:
+                pass
+        self._tasks = []
+
+    def submit(self, upload_id: str, pdf_path: str, original_filename: str = None, content_hash: str = None,
+               options: Dict[str, Any] = None) -> Job:
+        """Enqueue a PDF for processing and return its job record"""
+        job = Job(upload_id, pdf_path, original_filename, content_hash, options)
+        self.jobs[upload_id] = job
+        if job.dedup_key:
+            self.by_hash[job.dedup_key] = upload_id
+        self.processor.mark_queued(upload_id, original_filename)
+        events.publish(upload_id, "stage", {"stage": "queued", "progress": 0.0})
+        self._queue.put_nowait(job)
+        return job
+
+    def get(self, upload_id: str) -> Optional[Job]:
+        return self.jobs.get(upload_id)
+
+    def find_by_hash(self, content_hash: str, options: Dict[str, Any] = None) -> Optional[Job]:
+        """Return the queued, running or completed job for identical content and options"""
+        job = self.jobs.get(self.by_hash.get(dedup_key(content_hash, options)))
+        if job is None or job.state == "error":
+            return None
+        # Results may have been removed by cleanup since the job finished
+        if job.state == "completed" and not (self.processor.results_dir / job.upload_id).exists():
+            return None
+        return job
+
+    def queue_position(self, upload_id: str) -> Optional[int]:
+        """1-based position among jobs still waiting, or None if not queued"""
+        position = 0
+        for job in self.jobs.values():
+            if job.state == "queued":
+                position += 1
+                if job.upload_id == upload_id:
+                    return position
+        return None
+
+    def status(self, upload_id: str) -> Optional[Dict[str, Any]]:
+        job = self.jobs.get(upload_id)
+        if job is None:
+            return None
+        data = job.to_dict()
+        data["queue_position"] = self.queue_position(upload_id)
+        return data
+
+    def stats(self) -> Dict[str, Any]:
+        states = {}
+        for job in self.jobs.values():
+            states[job.state] = states.get(job.state, 0) + 1
+        return {
+            "workers": self.workers,
+            "queued": self._queue.qsize() if self._queue else 0,
+            "jobs": states,
+        }
+
+    def forget(self, upload_id: str):
+        """Drop a finished job's in-memory record (used by cleanup)"""
+        job = self.jobs.get(upload_id)
+        if job and job.state in ("completed", "error"):
+            self._remove(job)
+
+    def prune(self, max_age_seconds: float):
+        """Forget finished jobs older than max_age_seconds"""
+        cutoff = time.time() - max_age_seconds
+        for upload_id, job in list(self.jobs.items()):
+            if job.finished_at and job.finished_at < cutoff:
+                self._remove(job)
+
+    def _remove(self, job: Job):
+        del self.jobs[job.upload_id]
+        events.get_bus().forget(job.upload_id)
+        if job.dedup_key and self.by_hash.get(job.dedup_key) == job.upload_id:
+            del self.by_hash[job.dedup_key]
+
+    async def _worker(self, index: int):
+        while True:
+            job = await self._queue.get()
+            job.state = "running"
+            job.started_at = time.time()
+
+            def on_progress(stage: str, progress: float, records: int = None, pages: tuple = None, job=job):
+                # Progress goes to the event bus; status.json is only rewritten per stage
+                if stage != job.stage:
+                    events.publish(job.upload_id, "stage", {"stage": stage, "progress": round(progress, 3)})
+                job.stage = stage
+                job.progress = progress
+                if pages is not None:
+                    job.pages_done, job.pages_total = pages
+                    events.publish(job.upload_id, "ocr_pages", {
+                        "pages_done": job.pages_done,
+                        "pages_total": job.pages_total,
+                        "progress": round(progress, 3),
+                    })
+                if records is not None:
+                    job.records = records
+                    events.get_bus().publish_records(job.upload_id, records)
+
+            try:
+                await asyncio.to_thread(
+                    self.processor.process_pdf,
+                    job.pdf_path,
+                    job.upload_id,
+                    job.original_filename,
+                    on_progress,
+                    job.content_hash,
+                    job.options,
+                )
+                job.state = "completed"
+                job.stage = "completed"
+                job.progress = 1.0
+            except Exception as e:
+                job.state = "error"
+                job.stage = "error"
+                job.error = str(e)
+                print(f"❌ Job {job.upload_id} failed in worker {index}: {e}")
+            finally:
+                job.finished_at = time.time()
+                self._queue.task_done()
+
+            if job.state == "completed":
+                events.get_bus().publish_records(job.upload_id, job.records, force=True)
+                events.publish(job.upload_id, "completed", {
+                    "records": job.records,
+                    "processing_time": round(job.finished_at - job.started_at, 2),
+                    "results_url": f"/results/{job.upload_id}",
+                })
+            else:
+                events.publish(job.upload_id, "error", {"error": job.error})
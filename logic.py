@@ -10,20 +10,44 @@ This module contains the PDFProcessor class that orchestrates:
 import os
 import json
 import time
+import threading
 from pathlib import Path
-from typing import Dict, List, Any, Optional
+from typing import Callable, Dict, List, Any, Optional
 
 from services.pdfToText import extract_text_from_pdf
 from services.fulltest import process_extracted_text
+from services.openai_loop import new_job_stats, summarize_job_stats
+from services import llm_cache, openai_scheduler, outputs
+
+# Per-stage concurrency limits shared by all jobs in this process
+OCR_CONCURRENCY = int(os.getenv("OCR_CONCURRENCY", "1"))
+LLM_CONCURRENCY = int(os.getenv("LLM_CONCURRENCY", "4"))
 
 class PDFProcessor:
     """Enhanced PDF processor with OCR and AI capabilities"""
     
-    def __init__(self):
+    def __init__(self, ocr_concurrency: int = OCR_CONCURRENCY, llm_concurrency: int = LLM_CONCURRENCY):
         self.results_dir = Path("results")
         self.results_dir.mkdir(exist_ok=True)
+        
+        # Bound how many jobs may be inside each stage at once
+        self.ocr_slots = threading.BoundedSemaphore(max(1, ocr_concurrency))
+        self.llm_slots = threading.BoundedSemaphore(max(1, llm_concurrency))
     
-    def process_pdf(self, pdf_path: str, upload_id: str, original_filename: str = None) -> Dict[str, Any]:
+    def mark_queued(self, upload_id: str, original_filename: str = None):
+        """Create the result directory and a 'queued' status for a new job"""
+        upload_result_dir = self.results_dir / upload_id
+        upload_result_dir.mkdir(exist_ok=True)
+        self._update_status(
+            upload_result_dir / "status.json",
+            "queued",
+            "Waiting for a free worker...",
+            {"upload_id": upload_id, "original_filename": original_filename, "stage": "queued", "progress": 0.0}
+        )
+    
+    def process_pdf(self, pdf_path: str, upload_id: str, original_filename: str = None,
+                    on_progress: Optional[Callable[..., None]] = None,
+                    content_hash: str = None, options: Dict[str, Any] = None) -> Dict[str, Any]:
         """
         Process PDF through the complete pipeline
         
@@ -31,11 +55,17 @@ class PDFProcessor:
             pdf_path: Path to the PDF file
             upload_id: Unique identifier for this processing session
             original_filename: Original filename for better naming
+            on_progress: Optional callback receiving (stage, progress, records=None,
+                pages=None) updates; records is the number of part records
+                extracted so far, pages is (pages_done, pages_total) during OCR
+            content_hash: SHA-256 of the PDF, if already computed
+            options: Per-request settings (e.g. "extraction_mode", "formats")
             
         Returns:
             Dictionary with processing results and file information
         """
         start_time = time.time()
+        options = options or {}
         
         # Create result directory for this upload
         upload_result_dir = self.results_dir / upload_id
@@ -43,26 +73,67 @@ class PDFProcessor:
         
         # Create status file
         status_file = upload_result_dir / "status.json"
-        self._update_status(status_file, "processing", "Starting OCR extraction...")
+        
+        def set_stage(stage: str, progress: float, message: str):
+            if on_progress:
+                on_progress(stage, progress)
+            self._update_status(status_file, "processing", message, {"stage": stage, "progress": progress})
         
         try:
             # Step 1: OCR Text Extraction
-            print(f"🔍 Starting OCR extraction for {original_filename or 'uploaded file'}")
-            self._update_status(status_file, "processing", "Extracting text from PDF...")
-            
-            text_output, json_output, txt_path, md_path = extract_text_from_pdf(
-                pdf_path, 
-                str(upload_result_dir)
-            )
+            set_stage("waiting_ocr", 0.0, "Waiting for a free OCR slot...")
+            with self.ocr_slots:
+                print(f"🔍 Starting OCR extraction for {original_filename or 'uploaded file'}")
+                set_stage("ocr", 0.1, "Extracting text from PDF...")
+                
+                ocr_start = time.time()
+                page_timings = []
+                
+                def on_pages(pages_done, pages_total):
+                    if on_progress:
+                        progress = 0.1 + 0.4 * pages_done / max(pages_total, 1)
+                        on_progress("ocr", progress, pages=(pages_done, pages_total))
+                
+                text_output, json_output, txt_path, md_path = extract_text_from_pdf(
+                    pdf_path, 
+                    str(upload_result_dir),
+                    page_timings=page_timings,
+                    content_hash=content_hash,
+                    on_pages=on_pages
+                )
+                ocr_time = time.time() - ocr_start
+                
+                # Canonical data the downloadable outputs are generated from
+                base_name = Path(pdf_path).stem
+                outputs.write_canonical_ocr(upload_result_dir, json_output)
+                outputs.register(upload_result_dir, base_name, options.get("formats"))
             
             # Step 2: AI Part Record Extraction
-            print(f"🤖 Starting AI processing...")
-            self._update_status(status_file, "processing", "Extracting part records with AI...")
-            
-            records, excel_path = process_extracted_text(
-                txt_path, 
-                str(upload_result_dir)
-            )
+            set_stage("waiting_llm", 0.5, "Waiting for a free AI slot...")
+            with self.llm_slots, openai_scheduler.job(upload_id):
+                print(f"🤖 Starting AI processing...")
+                set_stage("llm", 0.6, "Extracting part records with AI...")
+                
+                llm_stats = new_job_stats()
+                records_so_far = 0
+                
+                def on_record(record):
+                    nonlocal records_so_far
+                    records_so_far += 1
+                    if on_progress:
+                        on_progress("llm", 0.6, records=records_so_far)
+                
+                records, excel_path = process_extracted_text(
+                    txt_path or str(upload_result_dir / f"{base_name}_extracted.txt"), 
+                    str(upload_result_dir),
+                    mode=options.get("extraction_mode"),
+                    stats=llm_stats,
+                    on_record=on_record,
+                    formats=options.get("formats"),
+                    drawing_text=text_output,
+                    records_path=str(outputs.records_source(upload_result_dir)),
+                    lazy=outputs.LAZY_OUTPUTS
+                )
             
             # Calculate processing metrics
             end_time = time.time()
@@ -76,6 +147,10 @@ class PDFProcessor:
                 "extracted_text_length": len(text_output),
                 "pages_processed": len(json_output.get('pages', [])),
                 "records_extracted": len(records),
+                "ocr_time": round(ocr_time, 2),
+                "page_timings": page_timings,
+                "page_sources": self._count_page_sources(json_output),
+                "llm_usage": summarize_job_stats(llm_stats),
                 "files_generated": self._get_file_info(upload_result_dir),
                 "sample_records": records[:3] if records else [],  # First 3 records as preview
                 "fields_extracted": list(records[0].keys()) if records else []
@@ -87,8 +162,14 @@ class PDFProcessor:
                 "completed", 
                 f"Successfully extracted {len(records)} part records",
                 {
+                    "stage": "completed",
+                    "progress": 1.0,
                     "records_extracted": len(records),
                     "processing_time": round(processing_time, 2),
+                    "ocr_time": round(ocr_time, 2),
+                    "page_timings": page_timings,
+                    "page_sources": self._count_page_sources(json_output),
+                    "llm_usage": summarize_job_stats(llm_stats),
                     "sample_records": records[:3] if records else [],
                     "files_generated": self._get_file_info(upload_result_dir),
                     "data": result_data
@@ -108,7 +189,7 @@ class PDFProcessor:
                 status_file, 
                 "error", 
                 error_message,
-                {"error_details": str(e)}
+                {"stage": "error", "error_details": str(e)}
             )
             
             raise e
@@ -135,10 +216,22 @@ class PDFProcessor:
             
             # Apply settings to the AI processing (this could be extended)
             # For now, we'll just rerun the AI extraction
-            records, excel_path = process_extracted_text(
-                text_file_path, 
-                str(upload_result_dir)
-            )
+            # "bypass_cache": true forces fresh LLM responses instead of replaying cached ones
+            llm_stats = new_job_stats()
+            base_name = Path(text_file_path).stem
+            if base_name.endswith("_extracted"):
+                base_name = base_name[:-len("_extracted")]
+            outputs.register(upload_result_dir, base_name, settings.get("formats"))
+            with self.llm_slots, llm_cache.bypass(settings.get("bypass_cache", False)), openai_scheduler.job(upload_id):
+                records, excel_path = process_extracted_text(
+                    text_file_path, 
+                    str(upload_result_dir),
+                    mode=settings.get("extraction_mode"),
+                    stats=llm_stats,
+                    formats=settings.get("formats"),
+                    records_path=str(outputs.records_source(upload_result_dir)),
+                    lazy=outputs.LAZY_OUTPUTS
+                )
             
             end_time = time.time()
             processing_time = end_time - start_time
@@ -150,6 +243,7 @@ class PDFProcessor:
                 "files_updated": self._get_file_info(upload_result_dir),
                 "sample_records": records[:3] if records else [],
                 "fields_extracted": list(records[0].keys()) if records else [],
+                "llm_usage": summarize_job_stats(llm_stats),
                 "settings_applied": settings
             }
             
@@ -160,6 +254,7 @@ class PDFProcessor:
                 {
                     "records_extracted": len(records),
                     "reprocessing_time": round(processing_time, 2),
+                    "llm_usage": summarize_job_stats(llm_stats),
                     "sample_records": records[:3] if records else [],
                     "files_updated": self._get_file_info(upload_result_dir),
                     "data": result_data
@@ -195,30 +290,62 @@ class PDFProcessor:
         if data:
             status_data.update(data)
         
-        with open(status_file, 'w') as f:
-            json.dump(status_data, f, indent=2)
+        # Compact: this is rewritten on every stage change. Readers (/status,
+        # /results, the event streams) never see a half-written file because
+        # the new contents are swapped in with os.replace.
+        tmp_file = status_file.with_name(f".{status_file.name}.{threading.get_ident()}.tmp")
+        try:
+            with open(tmp_file, 'w') as f:
+                json.dump(status_data, f)
+            os.replace(tmp_file, status_file)
+        finally:
+            if tmp_file.exists():
+                tmp_file.unlink()
+    
+    def _count_page_sources(self, json_output: dict) -> Dict[str, int]:
+        """Count pages read from the native text layer vs. OCR'd"""
+        counts = {"text_layer": 0, "ocr": 0}
+        for page in json_output.get('pages', []):
+            source = page.get('source', 'ocr')
+            counts[source] = counts.get(source, 0) + 1
+        return counts
     
     def _get_file_info(self, directory: Path) -> List[Dict[str, Any]]:
         """Get information about files in the result directory"""
         files_info = []
         
         for file_path in directory.iterdir():
-            if file_path.is_file() and file_path.name != "status.json":
+            if file_path.is_file() and file_path.name != "status.json" and not file_path.name.startswith("."):
                 file_size = file_path.stat().st_size
                 files_info.append({
                     "filename": file_path.name,
                     "size_bytes": file_size,
                     "size_kb": round(file_size / 1024, 1),
                     "type": self._get_file_type(file_path.suffix),
-                    "description": self._get_file_description(file_path.name)
+                    "description": self._get_file_description(file_path.name),
+                    "materialized": True
                 })
         
+        # Outputs that are generated on first download
+        for filename in outputs.pending_outputs(directory):
+            files_info.append({
+                "filename": filename,
+                "size_bytes": 0,
+                "size_kb": 0,
+                "type": self._get_file_type(Path(filename).suffix),
+                "description": self._get_file_description(filename),
+                "materialized": False
+            })
+        
         return files_info
     
     def _get_file_type(self, extension: str) -> str:
         """Get file type description based on extension"""
         type_map = {
             ".xlsx": "Excel Spreadsheet",
+            ".csv": "CSV Data",
+            ".ndjson": "NDJSON Data",
+            ".parquet": "Parquet Data",
             ".txt": "Text File", 
             ".md": "Markdown Document",
             ".json": "JSON Data",
@@ -230,6 +357,8 @@ class PDFProcessor:
         """Get user-friendly description of the file"""
         if "_parts.xlsx" in filename:
             return "Extracted part records (main output)"
+        elif "_parts.csv" in filename or "_parts.ndjson" in filename or "_parts.parquet" in filename:
+            return "Extracted part records (bulk-load export)"
         elif "_extracted.txt" in filename:
             return "Plain text extracted from PDF"
         elif "_extracted.md" in filename:
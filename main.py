@@ -15,26 +15,26 @@ Example:
     python main.py AN929.pdf --output-dir results
 """
 
-from fastapi import FastAPI, File, UploadFile, HTTPException
-from fastapi.responses import HTMLResponse, FileResponse
+from fastapi import FastAPI, HTTPException, Request, WebSocket, WebSocketDisconnect
+from fastapi.responses import HTMLResponse, FileResponse, Response, StreamingResponse
 from fastapi.staticfiles import StaticFiles
 from fastapi.middleware.cors import CORSMiddleware
 import shutil
-import os
 from pathlib import Path
 import uuid
-from typing import List, Dict
+from typing import List, Dict, Optional
 import json
+import time
 import asyncio
 from contextlib import asynccontextmanager
 
-# OCR imports
-from doctr.io import DocumentFile
-from doctr.models import ocr_predictor
-import matplotlib.pyplot as plt
-
 from logic import PDFProcessor
-from utils import cleanup_old_files, get_file_info, cleanup_upload_and_results
+from jobs import JobManager
+from services.ocr_pool import get_pool, pool_stats
+from services import archive, events, ocr_workers, ocr_cache, llm_cache, llm_metrics, openai_scheduler, outputs, page_images
+from services.openai_loop import EXTRACTION_MODES
+from services.record_writer import parse_formats
+from utils import cleanup_old_files, get_file_info, cleanup_upload_and_results, save_upload_stream, UploadError
 
 # Configuration
 UPLOAD_DIR = Path("uploads")
@@ -43,6 +43,12 @@ STATIC_DIR = Path("static")
 TEMP_DIR = Path("temp")
 TEMPLATES_DIR = Path("templates")
 
+# Seconds between keep-alive comments on idle progress streams
+EVENT_KEEPALIVE_SECONDS = 15
+
+# Browser cache lifetime of OCR viewer images (they never change for an upload)
+VIEWER_CACHE_SECONDS = 24 * 60 * 60
+
 # File cleanup settings
 CLEANUP_HOURS = 1  # Clean files older than 1 hour
 CLEANUP_INTERVAL = 300  # Run cleanup every 5 minutes (300 seconds)
@@ -55,6 +61,10 @@ async def periodic_cleanup():
     while True:
         try:
             cleanup_upload_and_results(UPLOAD_DIR, RESULTS_DIR, STATIC_DIR, TEMP_DIR, CLEANUP_HOURS)
+            job_manager.prune(CLEANUP_HOURS * 60 * 60)
+            for content_hash, upload_id in list(ocr_viewer_uploads.items()):
+                if not (UPLOAD_DIR / f"{upload_id}.pdf").exists():
+                    del ocr_viewer_uploads[content_hash]
         except Exception as e:
             print(f"⚠️ Cleanup task error: {e}")
         
@@ -77,6 +87,9 @@ async def lifespan(app: FastAPI):
     cleanup_upload_and_results(UPLOAD_DIR, RESULTS_DIR, STATIC_DIR, TEMP_DIR, CLEANUP_HOURS)
     print("✅ Initial cleanup completed")
     
+    # Start background job workers
+    job_manager.start()
+    
     # Start periodic cleanup task
     cleanup_task = asyncio.create_task(periodic_cleanup())
     print(f"🕒 Started periodic cleanup (every {CLEANUP_INTERVAL // 60} minutes, files older than {CLEANUP_HOURS} hour)")
@@ -84,6 +97,8 @@ async def lifespan(app: FastAPI):
     yield
     
     # Shutdown
+    await job_manager.stop()
+    ocr_workers.shutdown()
     if cleanup_task:
         cleanup_task.cancel()
         try:
@@ -107,13 +122,17 @@ app.add_middleware(
 app.mount("/static", StaticFiles(directory="static"), name="static")
 app.mount("/files", StaticFiles(directory="results"), name="files")
 
-# Initialize processor
+# Initialize processor and background job queue
 processor = PDFProcessor()
+job_manager = JobManager(processor)
+
+# Content hash -> upload_id for OCR viewer uploads (deduplication)
+ocr_viewer_uploads: Dict[str, str] = {}
 
-# Initialize OCR model (load once at startup)
-print("🔍 Loading OCR model...")
-ocr_model = ocr_predictor(pretrained=True)
-print("✅ OCR model loaded successfully")
+# Preload the shared OCR predictor pool (used by /upload and the OCR viewer)
+# unless OCR runs in dedicated worker processes, which load their own copy
+if ocr_workers.OCR_WORKERS <= 0:
+    get_pool().preload()
 
 @app.get("/", response_class=HTMLResponse)
 async def read_root():
@@ -124,53 +143,204 @@ async def read_root():
     except FileNotFoundError:
         raise HTTPException(status_code=404, detail="Template not found")
 
-@app.post("/upload")
-async def upload_pdf(file: UploadFile = File(...)):
-    """Upload and process PDF file with enhanced OCR and AI extraction"""
-    if not file.filename.lower().endswith('.pdf'):
-        raise HTTPException(status_code=400, detail="Only PDF files are allowed")
+@app.post("/upload", status_code=202)
+async def upload_pdf(request: Request, force: bool = False, extraction_mode: Optional[str] = None,
+                     formats: Optional[str] = None):
+    """
+    Upload a PDF and enqueue it for OCR and AI extraction
+    
+    Byte-identical PDFs uploaded with the same extraction_mode and formats
+    attach to the existing queued, running or completed job instead of
+    starting a new one; pass force=true to reprocess anyway.
+    extraction_mode selects "batches" or "rules" AI extraction; formats is a
+    comma-separated list of record exports (xlsx, csv, ndjson, parquet).
+    
+    The PDF is sent as the multipart "file" field (or as a raw application/pdf
+    body) and streamed to disk; non-PDFs and uploads over MAX_UPLOAD_MB are
+    rejected as soon as that is known.
+    """
+    if extraction_mode and extraction_mode not in EXTRACTION_MODES:
+        raise HTTPException(status_code=400, detail=f"extraction_mode must be one of {', '.join(EXTRACTION_MODES)}")
+    try:
+        export_formats = parse_formats(formats)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     
     # Generate unique ID for this upload
     upload_id = str(uuid.uuid4())
     
-    # Save uploaded file
+    # Stream the upload to disk, hashing and validating it as it arrives
     upload_path = UPLOAD_DIR / f"{upload_id}.pdf"
-    with open(upload_path, "wb") as buffer:
-        shutil.copyfileobj(file.file, buffer)
-    
     try:
-        # Process PDF with enhanced pipeline
-        result_data = processor.process_pdf(str(upload_path), upload_id, original_filename=file.filename)
-        
-        # Note: Don't delete upload immediately - let periodic cleanup handle it
-        # This allows for potential reprocessing or debugging
-        
+        upload = await save_upload_stream(request, upload_path)
+    except UploadError as e:
+        raise HTTPException(status_code=e.status_code, detail=e.detail)
+    content_hash = upload["content_hash"]
+    filename = upload["filename"]
+    
+    # Attach to an existing job for the same content and options
+    options = {"extraction_mode": extraction_mode, "formats": export_formats}
+    existing_job = None if force else job_manager.find_by_hash(content_hash, options)
+    if existing_job:
+        upload_path.unlink()
+        print(f"♻️ Duplicate upload of {filename}, attaching to {existing_job.upload_id}")
         return {
-            "upload_id": upload_id,
-            "status": "success",
-            "data": result_data,
-            "message": f"Successfully processed {file.filename}. Files will be automatically cleaned up after {CLEANUP_HOURS} hour."
+            "upload_id": existing_job.upload_id,
+            "status": existing_job.state,
+            "deduplicated": True,
+            "queue_position": job_manager.queue_position(existing_job.upload_id),
+            "status_url": f"/status/{existing_job.upload_id}",
+            "events_url": f"/events/{existing_job.upload_id}",
+            "message": f"Identical file already processed or in progress as {existing_job.upload_id}. Use force=true to reprocess."
         }
-    except Exception as e:
-        # Cleanup on error
-        if upload_path.exists():
-            upload_path.unlink()
-        raise HTTPException(status_code=500, detail=f"Processing failed: {str(e)}")
+    
+    # Enqueue for background processing; progress is pushed via /events (or /ws)
+    # and can also be polled from /status
+    # Note: Don't delete upload after processing - let periodic cleanup handle it
+    # This allows for potential reprocessing or debugging
+    job_manager.submit(
+        upload_id,
+        str(upload_path),
+        original_filename=filename,
+        content_hash=content_hash,
+        options=options
+    )
+    
+    return {
+        "upload_id": upload_id,
+        "status": "queued",
+        "queue_position": job_manager.queue_position(upload_id),
+        "status_url": f"/status/{upload_id}",
+        "events_url": f"/events/{upload_id}",
+        "message": f"Queued {filename} for processing. Files will be automatically cleaned up after {CLEANUP_HOURS} hour."
+    }
 
-@app.get("/status/{upload_id}")
-async def get_processing_status(upload_id: str):
-    """Get processing status for a specific upload"""
+def _status_snapshot(upload_id: str) -> dict:
+    """Current status of an upload: status.json overlaid with live job state"""
     result_dir = RESULTS_DIR / upload_id
     if not result_dir.exists():
         return {"status": "not_found", "message": "Upload ID not found"}
     
+    status_data = {"status": "processing", "message": "Still processing..."}
+    
     # Check for completion markers
     status_file = result_dir / "status.json"
     if status_file.exists():
         with open(status_file, 'r') as f:
-            return json.load(f)
+            status_data = json.load(f)
+    
+    # Overlay live queue information for jobs this process knows about
+    job_status = job_manager.status(upload_id)
+    if job_status:
+        status_data["queue_position"] = job_status["queue_position"]
+        status_data["stage"] = job_status["stage"]
+        status_data["progress"] = job_status["progress"]
+        status_data["records_so_far"] = job_status["records"]
+        status_data["pages_done"] = job_status["pages_done"]
+        status_data["pages_total"] = job_status["pages_total"]
     
-    return {"status": "processing", "message": "Still processing..."}
+    return status_data
+
+@app.get("/status/{upload_id}")
+async def get_processing_status(upload_id: str):
+    """Get processing status for a specific upload (polling fallback for /events)"""
+    return _status_snapshot(upload_id)
+
+async def _job_events(upload_id: str, last_event_id: int = 0):
+    """
+    Yield a job's progress events until it completes or fails
+    
+    A fresh subscriber first gets a "snapshot" event with the current status,
+    which already reflects the stored history, so only a terminal event is
+    replayed after it; a reconnecting one (last_event_id > 0) gets the events
+    it missed instead. None is yielded when the stream has been idle for
+    EVENT_KEEPALIVE_SECONDS.
+    """
+    bus = events.get_bus()
+    queue, backlog = bus.subscribe(upload_id, last_event_id)
+    seen_id = last_event_id
+    try:
+        if not last_event_id:
+            # Taken after subscribing, so it is at least as new as the backlog
+            snapshot = await asyncio.to_thread(_status_snapshot, upload_id)
+            snapshot_id = backlog[-1]["id"] if backlog else None
+            seen_id = snapshot_id or 0
+            yield {"id": snapshot_id, "type": "snapshot", "time": time.time(), "data": snapshot}
+            backlog = [event for event in backlog if event["type"] in events.TERMINAL_EVENTS]
+        for event in backlog:
+            yield event
+            seen_id = event["id"]
+            if event["type"] in events.TERMINAL_EVENTS:
+                return
+        
+        # Nothing more will be published for jobs this process is not running
+        job = job_manager.get(upload_id)
+        if job is None or job.state in ("completed", "error"):
+            # The job may have finished since we subscribed; its terminal event
+            # is then in the history even if it has not reached the queue yet
+            for event in bus.history_since(upload_id, seen_id):
+                yield event
+                if event["type"] in events.TERMINAL_EVENTS:
+                    return
+            return
+        
+        while True:
+            try:
+                event = await asyncio.wait_for(queue.get(), EVENT_KEEPALIVE_SECONDS)
+            except asyncio.TimeoutError:
+                yield None
+                continue
+            yield event
+            if event["type"] in events.TERMINAL_EVENTS:
+                return
+    finally:
+        bus.unsubscribe(upload_id, queue)
+
+@app.get("/events/{upload_id}")
+async def stream_events(upload_id: str, request: Request):
+    """Server-sent events stream of a job's progress (stage, OCR pages, record counts)"""
+    if not (RESULTS_DIR / upload_id).exists():
+        raise HTTPException(status_code=404, detail="Upload ID not found")
+    
+    try:
+        last_event_id = int(request.headers.get("last-event-id") or request.query_params.get("last_event_id") or 0)
+    except ValueError:
+        last_event_id = 0
+    
+    async def sse():
+        async for event in _job_events(upload_id, last_event_id):
+            if event is None:
+                yield ": keep-alive\n\n"
+                continue
+            event_id = f"id: {event['id']}\n" if event["id"] else ""
+            yield f"{event_id}event: {event['type']}\ndata: {json.dumps(event)}\n\n"
+    
+    return StreamingResponse(
+        sse(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+@app.websocket("/ws/{upload_id}")
+async def job_events_socket(websocket: WebSocket, upload_id: str):
+    """WebSocket variant of /events: one JSON message per progress event"""
+    await websocket.accept()
+    if not (RESULTS_DIR / upload_id).exists():
+        await websocket.close(code=4404, reason="Upload ID not found")
+        return
+    
+    try:
+        last_event_id = int(websocket.query_params.get("last_event_id") or 0)
+    except ValueError:
+        last_event_id = 0
+    
+    try:
+        async for event in _job_events(upload_id, last_event_id):
+            if event is not None:
+                await websocket.send_json(event)
+        await websocket.close()
+    except WebSocketDisconnect:
+        pass
 
 @app.get("/results/{upload_id}")
 async def get_results_info(upload_id: str):
@@ -201,10 +371,16 @@ async def get_results_info(upload_id: str):
 
 @app.get("/download/{upload_id}/{file_type}/{filename}")
 async def download_file(upload_id: str, file_type: str, filename: str):
-    """Download specific file"""
-    file_path = RESULTS_DIR / upload_id / filename
+    """Download specific file (generated on first request when outputs are lazy)"""
+    if Path(filename).name != filename or Path(upload_id).name != upload_id:
+        raise HTTPException(status_code=400, detail="Invalid file name")
+    
+    try:
+        file_path = await asyncio.to_thread(outputs.materialize, RESULTS_DIR / upload_id, filename)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     
-    if not file_path.exists():
+    if file_path is None:
         raise HTTPException(status_code=404, detail="File not found")
     
     # Determine media type based on file extension
@@ -216,7 +392,9 @@ async def download_file(upload_id: str, file_type: str, filename: str):
         '.json': 'application/json',
         '.zip': 'application/zip',
         '.pdf': 'application/pdf',
-        '.csv': 'text/csv'
+        '.csv': 'text/csv',
+        '.ndjson': 'application/x-ndjson',
+        '.parquet': 'application/vnd.apache.parquet'
     }
     
     file_ext = Path(filename).suffix.lower()
@@ -234,29 +412,30 @@ async def download_file(upload_id: str, file_type: str, filename: str):
 
 @app.get("/download-all/{upload_id}")
 async def download_all(upload_id: str):
-    """Download all results as ZIP"""
-    import zipfile
+    """Download all results as ZIP (streamed while it is built, then cached)"""
+    if Path(upload_id).name != upload_id:
+        raise HTTPException(status_code=400, detail="Invalid upload ID")
     
     result_dir = RESULTS_DIR / upload_id
     if not result_dir.exists():
         raise HTTPException(status_code=404, detail="Results not found")
     
-    # Create ZIP file
-    zip_path = TEMP_DIR / f"results_{upload_id}.zip"
+    # Generate any outputs that have not been downloaded yet
+    await asyncio.to_thread(outputs.materialize_all, result_dir)
     
-    with zipfile.ZipFile(zip_path, 'w', zipfile.ZIP_DEFLATED) as zipf:
-        for root, dirs, files in os.walk(result_dir):
-            for file in files:
-                if file == 'status.json':  # Skip internal status files
-                    continue
-                file_path = Path(root) / file
-                arcname = str(file_path.relative_to(result_dir))
-                zipf.write(file_path, arcname)
+    members = await asyncio.to_thread(archive.archive_members, result_dir)
+    download_filename = f"results_{upload_id}.zip"
     
-    return FileResponse(
-        path=zip_path,
-        filename=f"results_{upload_id}.zip",
-        media_type='application/zip'
+    # Serve the archive built by an earlier download if nothing changed since
+    cached = await asyncio.to_thread(archive.cached_archive, result_dir, members)
+    if cached:
+        return FileResponse(path=cached, filename=download_filename, media_type='application/zip')
+    
+    # The sync generator is iterated in the threadpool, off the event loop
+    return StreamingResponse(
+        archive.stream_archive(result_dir, members),
+        media_type='application/zip',
+        headers={"Content-Disposition": f"attachment; filename={download_filename}"}
     )
 
 @app.post("/reprocess/{upload_id}")
@@ -266,14 +445,29 @@ async def reprocess_with_different_settings(upload_id: str, settings: dict):
     if not result_dir.exists():
         raise HTTPException(status_code=404, detail="Original results not found")
     
+    extraction_mode = settings.get("extraction_mode")
+    if extraction_mode and extraction_mode not in EXTRACTION_MODES:
+        raise HTTPException(status_code=400, detail=f"extraction_mode must be one of {', '.join(EXTRACTION_MODES)}")
+    if settings.get("formats"):
+        try:
+            settings["formats"] = parse_formats(settings["formats"])
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+    
     try:
-        # Find the extracted text file
+        # Find the extracted text file (generating it from the OCR data if needed)
         text_files = list(result_dir.glob("*_extracted.txt"))
         if not text_files:
-            raise HTTPException(status_code=404, detail="Extracted text not found")
+            base_name = outputs.read_manifest(result_dir).get("base_name")
+            text_path = base_name and await asyncio.to_thread(
+                outputs.materialize, result_dir, f"{base_name}_extracted.txt"
+            )
+            if not text_path:
+                raise HTTPException(status_code=404, detail="Extracted text not found")
+            text_files = [text_path]
         
-        # Reprocess with new settings
-        new_results = processor.reprocess_text(str(text_files[0]), upload_id, settings)
+        # Reprocess with new settings (off the event loop)
+        new_results = await asyncio.to_thread(processor.reprocess_text, str(text_files[0]), upload_id, settings)
         
         return {
             "upload_id": upload_id,
@@ -281,99 +475,165 @@ async def reprocess_with_different_settings(upload_id: str, settings: dict):
             "data": new_results,
             "message": "Successfully reprocessed with new settings"
         }
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Reprocessing failed: {str(e)}")
 
-@app.get("/ocr-viewer/{upload_id}", response_class=HTMLResponse)
-async def ocr_viewer(upload_id: str):
-    """Interactive OCR viewer with multi-page overlay (no .show(), true overlay)"""
-    import matplotlib.pyplot as plt
-    import matplotlib.patches as patches
-
+def _viewer_pdf(upload_id: str) -> Path:
+    """Locate the PDF behind an upload for the OCR viewer"""
+    if Path(upload_id).name != upload_id:
+        raise HTTPException(status_code=400, detail="Invalid upload ID")
     result_dir = RESULTS_DIR / upload_id
     if not result_dir.exists():
         raise HTTPException(status_code=404, detail="Upload not found")
-
-    # Try to locate the PDF
+    
     pdf_files = list(result_dir.glob("*.pdf"))
-    upload_pdf = UPLOAD_DIR / f"{upload_id}.pdf"
-
-    pdf_path = pdf_files[0] if pdf_files else upload_pdf
+    pdf_path = pdf_files[0] if pdf_files else UPLOAD_DIR / f"{upload_id}.pdf"
     if not pdf_path.exists():
         raise HTTPException(status_code=404, detail="PDF file not found")
+    return pdf_path
 
+@app.get("/ocr-viewer/{upload_id}", response_class=HTMLResponse)
+async def ocr_viewer(upload_id: str):
+    """Interactive OCR viewer; pages and their OCR words are fetched on demand"""
+    _viewer_pdf(upload_id)
+    
+    # Load template from templates directory
     try:
-        print(f"📄 OCR Viewer: Processing PDF {pdf_path}")
-        doc = DocumentFile.from_pdf(str(pdf_path))
-        result = ocr_model(doc)
-        ocr_data = result.export()
-        num_pages = len(ocr_data["pages"])
-
-        # Convert PDF pages to images
-        import fitz  # PyMuPDF
-        pdf_doc = fitz.open(str(pdf_path))
-        
-        for i in range(num_pages):
-            page = ocr_data["pages"][i]
-            width, height = page["dimensions"]
-            
-            # Render PDF page as background image
-            pdf_page = pdf_doc[i]
-            mat = fitz.Matrix(2.0, 2.0)  # 2x zoom for better quality
-            pix = pdf_page.get_pixmap(matrix=mat)
-            pdf_img_path = STATIC_DIR / f"{upload_id}_pdf_page_{i}.png"
-            pix.save(str(pdf_img_path))
-            
-            # Create completely transparent overlay (no red boxes)
-            fig, ax = plt.subplots(figsize=(10, 14))
-            fig.patch.set_alpha(0)  # Transparent figure background
-            ax.set_xlim(0, width)
-            ax.set_ylim(height, 0)
-            ax.axis("off")
-            ax.patch.set_alpha(0)  # Transparent axes background
-
-            # No visual elements - just transparent overlay for proper sizing
-            # Save completely transparent overlay
-            fig.savefig(STATIC_DIR / f"{upload_id}_ocr_overlay_{i}.png", 
-                       bbox_inches="tight", dpi=150, transparent=True)
-            plt.close(fig)
-        
-        pdf_doc.close()
-
-        # Save OCR JSON
-        ocr_data_path = STATIC_DIR / f"{upload_id}_ocr_data.json"
-        with open(ocr_data_path, "w") as f:
-            json.dump(ocr_data, f, indent=2)
-
-        # Load template from templates directory
-        try:
-            with open(TEMPLATES_DIR / "ocr_viewer.html", "r", encoding="utf-8") as f:
-                html_template = f.read()
-        except FileNotFoundError:
-            raise HTTPException(status_code=404, detail="OCR viewer template not found")
-
-        # Replace the template placeholder with actual upload_id
-        html_filled = html_template.replace("{{UPLOAD_ID}}", upload_id)
+        with open(TEMPLATES_DIR / "ocr_viewer.html", "r", encoding="utf-8") as f:
+            html_template = f.read()
+    except FileNotFoundError:
+        raise HTTPException(status_code=404, detail="OCR viewer template not found")
+    
+    # Replace the template placeholder with actual upload_id
+    html_filled = html_template.replace("{{UPLOAD_ID}}", upload_id)
+    
+    return HTMLResponse(content=html_filled, status_code=200)
 
-        return HTMLResponse(content=html_filled, status_code=200)
+@app.get("/ocr-viewer/{upload_id}/document")
+async def ocr_viewer_document(upload_id: str):
+    """Page count, page sizes and tile pyramid layout of the viewed PDF"""
+    pdf_path = _viewer_pdf(upload_id)
+    info = await asyncio.to_thread(page_images.document_info, pdf_path, RESULTS_DIR / upload_id)
+    return {
+        "upload_id": upload_id,
+        "pages": info["pages"],
+        "page_sizes": info["page_sizes"],
+        "tile_size": page_images.VIEWER_TILE_SIZE,
+        "tile_zooms": list(page_images.TILE_ZOOMS),
+        "thumbnail_px": page_images.THUMBNAIL_PX,
+        "image_formats": list(page_images.IMAGE_FORMATS),
+    }
 
+def _viewer_page_index(pdf_path: Path, upload_id: str, page: int) -> int:
+    info = page_images.document_info(pdf_path, RESULTS_DIR / upload_id)
+    if not 0 <= page < info["pages"]:
+        raise HTTPException(status_code=404, detail="Page not found")
+    return page
+
+def _negotiate_image_format(request: Request, fmt: Optional[str]) -> str:
+    """Requested image format, else WebP when the browser accepts it, else JPEG"""
+    if fmt:
+        fmt = "jpeg" if fmt.lower() == "jpg" else fmt.lower()
+        if fmt not in page_images.IMAGE_FORMATS:
+            raise HTTPException(status_code=400, detail=f"format must be one of {', '.join(page_images.IMAGE_FORMATS)}")
+        return fmt
+    return "webp" if "image/webp" in request.headers.get("accept", "") else "jpeg"
+
+async def _viewer_image(request: Request, upload_id: str, fmt: str, etag_parts: tuple, render, *render_args):
+    """
+    Serve a viewer image with ETag/Cache-Control headers
+    
+    A matching If-None-Match is answered with 304 before anything is rendered;
+    otherwise render(pdf_path, result_dir, *render_args) produces the cached file.
+    """
+    pdf_path = _viewer_pdf(upload_id)
+    result_dir = RESULTS_DIR / upload_id
+    etag = await asyncio.to_thread(page_images.image_etag, pdf_path, result_dir, fmt, *etag_parts)
+    headers = {
+        "ETag": etag,
+        "Cache-Control": f"public, max-age={VIEWER_CACHE_SECONDS}, immutable",
+        "Vary": "Accept",
+    }
+    
+    if_none_match = request.headers.get("if-none-match", "")
+    if etag in [tag.strip().removeprefix("W/") for tag in if_none_match.split(",")]:
+        return Response(status_code=304, headers=headers)
+    
+    image_path = await asyncio.to_thread(render, pdf_path, result_dir, *render_args)
+    return FileResponse(path=image_path, media_type=page_images.IMAGE_FORMATS[fmt][1], headers=headers)
+
+@app.get("/ocr-viewer/{upload_id}/pages/{page}/image")
+async def ocr_viewer_page_image(request: Request, upload_id: str, page: int, zoom: float = 1.0,
+                                format: Optional[str] = "png"):
+    """One whole page rendered at the requested zoom (cached after the first request)"""
+    fmt = _negotiate_image_format(request, format)
+    page = await asyncio.to_thread(_viewer_page_index, _viewer_pdf(upload_id), upload_id, page)
+    zoom = page_images.normalize_zoom(zoom)
+    return await _viewer_image(request, upload_id, fmt, ("page", page, zoom),
+                               page_images.render_page_image, page, zoom, fmt)
+
+@app.get("/ocr-viewer/{upload_id}/pages/{page}/thumbnail")
+async def ocr_viewer_page_thumbnail(request: Request, upload_id: str, page: int, format: Optional[str] = None):
+    """Small page image for navigation and as a placeholder while tiles load"""
+    fmt = _negotiate_image_format(request, format)
+    page = await asyncio.to_thread(_viewer_page_index, _viewer_pdf(upload_id), upload_id, page)
+    return await _viewer_image(request, upload_id, fmt, ("thumbnail", page, page_images.THUMBNAIL_PX),
+                               page_images.render_thumbnail, page, fmt)
+
+@app.get("/ocr-viewer/{upload_id}/pages/{page}/tiles/{level}/{column}/{row}")
+async def ocr_viewer_page_tile(request: Request, upload_id: str, page: int, level: int, column: int, row: int,
+                               format: Optional[str] = None):
+    """One tile of a page's image pyramid (level indexes tile_zooms from /document)"""
+    fmt = _negotiate_image_format(request, format)
+    pdf_path = _viewer_pdf(upload_id)
+    info = await asyncio.to_thread(page_images.document_info, pdf_path, RESULTS_DIR / upload_id)
+    if not 0 <= page < info["pages"] or not 0 <= level < len(page_images.TILE_ZOOMS):
+        raise HTTPException(status_code=404, detail="Tile not found")
+    columns, rows = page_images.tile_grid(info["page_sizes"][page], level)
+    if not (0 <= column < columns and 0 <= row < rows):
+        raise HTTPException(status_code=404, detail="Tile not found")
+    return await _viewer_image(request, upload_id, fmt, ("tile", page, level, column, row),
+                               page_images.render_tile, page, level, column, row, fmt)
+
+@app.get("/ocr-viewer/{upload_id}/pages/{page}/ocr")
+async def ocr_viewer_page_ocr(upload_id: str, page: int):
+    """OCR words of one page; stored OCR is reused, otherwise only this page is OCR'd"""
+    pdf_path = _viewer_pdf(upload_id)
+    page = await asyncio.to_thread(_viewer_page_index, pdf_path, upload_id, page)
+    try:
+        return await asyncio.to_thread(page_images.page_ocr, pdf_path, RESULTS_DIR / upload_id, page)
     except Exception as e:
         print(f"❌ OCR Viewer Error: {str(e)}")
         raise HTTPException(status_code=500, detail=f"OCR processing failed: {str(e)}")
 
 @app.post("/process-pdf-ocr")
-async def process_pdf_for_ocr(file: UploadFile = File(...)):
-    """Upload and process PDF specifically for OCR viewing"""
-    if not file.filename.lower().endswith('.pdf'):
-        raise HTTPException(status_code=400, detail="Only PDF files are allowed")
-    
+async def process_pdf_for_ocr(request: Request, force: bool = False):
+    """Upload and process PDF specifically for OCR viewing (streamed like /upload)"""
     # Generate unique ID for this upload
     upload_id = str(uuid.uuid4())
     
-    # Save uploaded file
+    # Stream the upload to disk, hashing and validating it as it arrives
     upload_path = UPLOAD_DIR / f"{upload_id}.pdf"
-    with open(upload_path, "wb") as buffer:
-        shutil.copyfileobj(file.file, buffer)
+    try:
+        upload = await save_upload_stream(request, upload_path)
+    except UploadError as e:
+        raise HTTPException(status_code=e.status_code, detail=e.detail)
+    content_hash = upload["content_hash"]
+    
+    # Reuse an earlier upload of the same content if its files still exist
+    existing_id = None if force else ocr_viewer_uploads.get(content_hash)
+    if existing_id and (UPLOAD_DIR / f"{existing_id}.pdf").exists() and (RESULTS_DIR / existing_id).exists():
+        upload_path.unlink()
+        return {
+            "upload_id": existing_id,
+            "status": "success",
+            "deduplicated": True,
+            "message": f"Identical PDF already uploaded as {existing_id}.",
+            "ocr_viewer_url": f"/ocr-viewer/{existing_id}"
+        }
+    ocr_viewer_uploads[content_hash] = upload_id
     
     # Create result directory and save status
     result_dir = RESULTS_DIR / upload_id
@@ -382,7 +642,7 @@ async def process_pdf_for_ocr(file: UploadFile = File(...)):
     status_data = {
         "status": "ocr_ready",
         "upload_id": upload_id,
-        "original_filename": file.filename,
+        "original_filename": upload["filename"],
         "created_at": str(Path(upload_path).stat().st_mtime)
     }
     
@@ -402,6 +662,7 @@ async def cleanup_results(upload_id: str):
     result_dir = RESULTS_DIR / upload_id
     if result_dir.exists():
         shutil.rmtree(result_dir)
+    job_manager.forget(upload_id)
     
     # Clean up upload file
     upload_file = UPLOAD_DIR / f"{upload_id}.pdf"
@@ -439,6 +700,22 @@ async def get_cleanup_status():
         }
     }
 
+@app.get("/cache/stats")
+async def get_cache_stats():
+    """Get OCR and LLM response cache, lazy output, archive and viewer page statistics"""
+    return {"ocr": ocr_cache.stats(), "llm": llm_cache.stats(), "outputs": outputs.stats(), "archives": archive.stats(),
+            "viewer_pages": page_images.stats()}
+
+@app.get("/llm/queue")
+async def get_llm_queue():
+    """Get OpenAI rate-limit scheduler queue depth and budget"""
+    return openai_scheduler.scheduler_stats()
+
+@app.get("/llm/metrics")
+async def get_llm_metrics():
+    """Get per-call LLM latency, token, retry and parse metrics for this process"""
+    return llm_metrics.snapshot()
+
 @app.get("/health")
 async def health_check():
     """Health check endpoint"""
@@ -447,7 +724,12 @@ async def health_check():
         "service": "PDF Part Extraction API",
         "version": "2.0.1",
         "cleanup_enabled": True,
-        "auto_cleanup_hours": CLEANUP_HOURS
+        "auto_cleanup_hours": CLEANUP_HOURS,
+        "ocr_pools": pool_stats(),
+        "ocr_workers": ocr_workers.worker_stats(),
+        "jobs": job_manager.stats(),
+        "llm_queue": openai_scheduler.scheduler_stats(),
+        "events": events.get_bus().stats()
     }
 
 if __name__ == "__main__":
@@ -0,0 +1,166 @@
+"""
+Streaming ZIP archives of job results
+
+/download-all streams the archive while it is being built: members are read
+in chunks and each compressed chunk is handed to the response as soon as
+zipfile produces it, so memory stays flat and nothing is staged in temp/.
+Formats that are already compressed (.xlsx, .png, ...) are stored as-is
+instead of being deflated again.
+
+The first download also tees the bytes into results/<id>/.archive/; later
+downloads serve that file directly for as long as the set of members (names,
+sizes and modification times) is unchanged. The cache goes away with the
+result directory.
+"""
+
+import hashlib
+import os
+import tempfile
+import threading
+import zipfile
+from pathlib import Path
+
+# Reuse a job's archive until its files change (0 streams a fresh one every time)
+ARCHIVE_CACHE = os.getenv("ARCHIVE_CACHE", "1") not in ("0", "false", "False")
+
+ARCHIVE_DIR = ".archive"
+# Members stored without recompression (already compressed formats)
+STORED_SUFFIXES = {".xlsx", ".png", ".jpg", ".jpeg", ".webp", ".zip", ".gz", ".parquet", ".pdf"}
+# Bytes read from a member per write into the archive
+ZIP_CHUNK_BYTES = 1024 * 1024
+# Internal files never included in an archive; hidden files and directories
+# (.canonical/, .archive/, .viewer/, temp files) are always skipped
+EXCLUDED_NAMES = {"status.json"}
+
+_stats = {"streamed": 0, "cache_hits": 0}
+_stats_lock = threading.Lock()
+
+
+class _ChunkBuffer:
+    """Unseekable write target that hands out whatever zipfile has written so far"""
+
+    def __init__(self):
+        self._chunks = []
+        self._offset = 0
+
+    def write(self, data) -> int:
+        self._chunks.append(bytes(data))
+        self._offset += len(data)
+        return len(data)
+
+    def tell(self) -> int:
+        return self._offset
+
+    def seekable(self) -> bool:
+        return False
+
+    def flush(self):
+        pass
+
+    def drain(self) -> bytes:
+        data = b"".join(self._chunks)
+        self._chunks = []
+        return data
+
+
+def archive_members(result_dir) -> list:
+    """(path, arcname) of every user-facing file in a job's result directory"""
+    result_dir = Path(result_dir)
+    members = []
+    for root, dirs, files in os.walk(result_dir):
+        dirs[:] = sorted(d for d in dirs if not d.startswith("."))
+        for name in sorted(files):
+            if name in EXCLUDED_NAMES or name.startswith(".") or name.endswith(".tmp"):
+                continue
+            path = Path(root) / name
+            members.append((path, str(path.relative_to(result_dir))))
+    return members
+
+
+def fingerprint(members: list) -> str:
+    """Digest of member names, sizes and modification times"""
+    digest = hashlib.sha256()
+    for path, arcname in members:
+        stat = path.stat()
+        digest.update(f"{arcname}\0{stat.st_size}\0{stat.st_mtime_ns}\n".encode("utf-8"))
+    return digest.hexdigest()[:32]
+
+
+def cached_archive(result_dir, members: list):
+    """Path of a cached archive matching the current members, else None"""
+    if not ARCHIVE_CACHE:
+        return None
+    path = Path(result_dir) / ARCHIVE_DIR / f"{fingerprint(members)}.zip"
+    if path.is_file():
+        with _stats_lock:
+            _stats["cache_hits"] += 1
+        return path
+    return None
+
+
+def iter_zip(members: list):
+    """
+    Yield a ZIP archive of members chunk by chunk
+
+    Args:
+        members: List of (path, arcname) pairs
+
+    Yields:
+        bytes: consecutive pieces of the archive
+    """
+    buffer = _ChunkBuffer()
+    with zipfile.ZipFile(buffer, "w", compression=zipfile.ZIP_DEFLATED) as archive:
+        for path, arcname in members:
+            info = zipfile.ZipInfo.from_file(path, arcname)
+            info.compress_type = (
+                zipfile.ZIP_STORED if path.suffix.lower() in STORED_SUFFIXES else zipfile.ZIP_DEFLATED
+            )
+            with open(path, "rb") as source, archive.open(info, "w") as member:
+                for chunk in iter(lambda: source.read(ZIP_CHUNK_BYTES), b""):
+                    member.write(chunk)
+                    data = buffer.drain()
+                    if data:
+                        yield data
+            data = buffer.drain()
+            if data:
+                yield data
+    yield buffer.drain()
+
+
+def stream_archive(result_dir, members: list):
+    """
+    Stream a job's archive, caching it for later downloads when it completes
+
+    A download that is interrupted leaves no cache entry behind.
+    """
+    with _stats_lock:
+        _stats["streamed"] += 1
+    if not ARCHIVE_CACHE:
+        yield from iter_zip(members)
+        return
+
+    cache_dir = Path(result_dir) / ARCHIVE_DIR
+    cache_dir.mkdir(exist_ok=True)
+    target = cache_dir / f"{fingerprint(members)}.zip"
+    # Unique per stream: Starlette may step concurrent generators on the same thread
+    fd, tmp_name = tempfile.mkstemp(dir=cache_dir, prefix=f".{target.name}.", suffix=".tmp")
+    tmp_path = Path(tmp_name)
+    try:
+        with os.fdopen(fd, "wb") as cache_file:
+            for data in iter_zip(members):
+                cache_file.write(data)
+                yield data
+        os.replace(tmp_path, target)
+        # Archives of earlier versions of the outputs are no longer needed
+        for old in cache_dir.glob("*.zip"):
+            if old != target:
+                old.unlink(missing_ok=True)
+    finally:
+        tmp_path.unlink(missing_ok=True)
+
+
+def stats() -> dict:
+    with _stats_lock:
+        counters = dict(_stats)
+    counters["cache"] = ARCHIVE_CACHE
+    return counters
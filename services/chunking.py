@@ -0,0 +1,104 @@
+"""
+Document chunking for map-reduce extraction
+
+Splits reconstructed drawing text into chunks that fit a token budget.
+Pages (joined with blank lines by reconstruct_text) are packed together in
+order; a page that is too large on its own is split at section headings
+(ALL-CAPS lines, the same heuristic json_to_markdown uses for headers) and,
+failing that, at line boundaries.
+"""
+
+import re
+
+# Rough characters-per-token ratio for English/technical text
+CHARS_PER_TOKEN = 4
+
+_HEADING = re.compile(r"^[^a-z]*[A-Z][^a-z]*$")
+
+
+def estimate_tokens(text: str) -> int:
+    return len(text) // CHARS_PER_TOKEN + 1
+
+
+def _is_heading(line: str) -> bool:
+    stripped = line.strip()
+    return len(stripped) > 10 and bool(_HEADING.match(stripped))
+
+
+def _split_sections(page_text: str) -> list:
+    """Split a page before each heading line"""
+    sections = []
+    current = []
+    for line in page_text.split("\n"):
+        if current and _is_heading(line):
+            sections.append("\n".join(current))
+            current = []
+        current.append(line)
+    if current:
+        sections.append("\n".join(current))
+    return sections
+
+
+def _split_lines(text: str, max_tokens: int) -> list:
+    """Last resort: pack lines into pieces under the budget"""
+    pieces = []
+    current = []
+    size = 0
+    for line in text.split("\n"):
+        line_tokens = estimate_tokens(line)
+        if current and size + line_tokens > max_tokens:
+            pieces.append("\n".join(current))
+            current, size = [], 0
+        current.append(line)
+        size += line_tokens
+    if current:
+        pieces.append("\n".join(current))
+    return pieces
+
+
+def split_into_chunks(drawing_text: str, max_tokens: int) -> list:
+    """
+    Split drawing text into chunks of at most ~max_tokens
+
+    Returns:
+        List of dicts with "index", "pages" (1-based first/last page),
+        "text" and "est_tokens", in document order
+    """
+    # Break oversized pages into (page_number, piece) units first
+    units = []
+    for page_number, page_text in enumerate(drawing_text.split("\n\n"), start=1):
+        if not page_text.strip():
+            continue
+        if estimate_tokens(page_text) <= max_tokens:
+            units.append((page_number, page_text))
+            continue
+        for section in _split_sections(page_text):
+            if estimate_tokens(section) <= max_tokens:
+                units.append((page_number, section))
+            else:
+                units.extend((page_number, piece) for piece in _split_lines(section, max_tokens))
+
+    # Pack consecutive units into chunks
+    chunks = []
+    current = []
+    size = 0
+    for page_number, text in units:
+        unit_tokens = estimate_tokens(text)
+        if current and size + unit_tokens > max_tokens:
+            chunks.append(current)
+            current, size = [], 0
+        current.append((page_number, text))
+        size += unit_tokens
+    if current:
+        chunks.append(current)
+
+    result = []
+    for index, units_in_chunk in enumerate(chunks):
+        text = "\n\n".join(text for _, text in units_in_chunk)
+        result.append({
+            "index": index,
+            "pages": [units_in_chunk[0][0], units_in_chunk[-1][0]],
+            "text": text,
+            "est_tokens": estimate_tokens(text),
+        })
+    return result
@@ -0,0 +1,127 @@
+"""
+In-memory job progress event bus
+
+Pipeline code publishes events for a job from any thread; the /events (SSE)
+and /ws (WebSocket) endpoints subscribe from the event loop and push them to
+the browser. Each job keeps a short history so a client that connects late,
+or reconnects with Last-Event-ID, replays what it missed.
+
+Event types:
+- stage: stage transition ({"stage", "progress"})
+- ocr_pages: OCR progress ({"pages_done", "pages_total", "progress"})
+- batch: an LLM batch landed ({"returned", "new"})
+- records: accepted record count ({"records"}), coalesced to at most one
+  per EVENT_RECORDS_INTERVAL seconds
+- completed / error: terminal events; streams close after them
+
+The bus only lives in this process; /status polling stays available for
+clients that cannot hold a stream open.
+"""
+
+import asyncio
+import os
+import threading
+import time
+from collections import deque
+
+# Events kept per job for late subscribers and Last-Event-ID replay
+EVENT_HISTORY = int(os.getenv("EVENT_HISTORY", "200"))
+# Minimum seconds between "records" events of one job
+EVENT_RECORDS_INTERVAL = float(os.getenv("EVENT_RECORDS_INTERVAL", "0.5"))
+
+TERMINAL_EVENTS = ("completed", "error")
+
+
+class EventBus:
+    """Per-job event history plus fan-out to asyncio subscribers"""
+
+    def __init__(self, history: int = EVENT_HISTORY):
+        self.history = history
+        self._lock = threading.Lock()
+        self._events = {}
+        self._subscribers = {}
+        self._next_id = {}
+        self._last_records = {}
+        self._published = 0
+
+    def publish(self, upload_id: str, event_type: str, data: dict = None) -> dict:
+        """Record an event for a job and hand it to every subscriber (thread-safe)"""
+        if not upload_id:
+            return None
+        with self._lock:
+            event_id = self._next_id.get(upload_id, 0) + 1
+            self._next_id[upload_id] = event_id
+            event = {"id": event_id, "type": event_type, "time": time.time(), "data": data or {}}
+            self._events.setdefault(upload_id, deque(maxlen=self.history)).append(event)
+            subscribers = list(self._subscribers.get(upload_id, ()))
+            self._published += 1
+
+        for loop, queue in subscribers:
+            try:
+                loop.call_soon_threadsafe(queue.put_nowait, event)
+            except RuntimeError:
+                # The subscriber's loop has closed
+                pass
+        return event
+
+    def publish_records(self, upload_id: str, records: int, force: bool = False):
+        """Publish a record count, skipping updates closer than EVENT_RECORDS_INTERVAL"""
+        now = time.monotonic()
+        with self._lock:
+            last = self._last_records.get(upload_id)
+            if not force and last is not None and now - last < EVENT_RECORDS_INTERVAL:
+                return None
+            self._last_records[upload_id] = now
+        return self.publish(upload_id, "records", {"records": records})
+
+    def history_since(self, upload_id: str, last_event_id: int = 0) -> list:
+        with self._lock:
+            return [event for event in self._events.get(upload_id, ()) if event["id"] > last_event_id]
+
+    def subscribe(self, upload_id: str, last_event_id: int = 0):
+        """
+        Register a subscriber on the running event loop
+
+        Returns:
+            tuple: (queue, backlog) where backlog holds the stored events newer
+            than last_event_id and queue receives every later event; pass
+            the queue to unsubscribe when done
+        """
+        queue = asyncio.Queue()
+        with self._lock:
+            backlog = [event for event in self._events.get(upload_id, ()) if event["id"] > last_event_id]
+            self._subscribers.setdefault(upload_id, set()).add((asyncio.get_running_loop(), queue))
+        return queue, backlog
+
+    def unsubscribe(self, upload_id: str, queue: asyncio.Queue):
+        with self._lock:
+            subscribers = self._subscribers.get(upload_id, set())
+            subscribers.difference_update({entry for entry in subscribers if entry[1] is queue})
+            if not subscribers:
+                self._subscribers.pop(upload_id, None)
+
+    def forget(self, upload_id: str):
+        """Drop a job's history (used when its results are cleaned up)"""
+        with self._lock:
+            self._events.pop(upload_id, None)
+            self._next_id.pop(upload_id, None)
+            self._last_records.pop(upload_id, None)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "jobs": len(self._events),
+                "subscribers": sum(len(subscribers) for subscribers in self._subscribers.values()),
+                "events_published": self._published,
+            }
+
+
+_bus = EventBus()
+
+
+def get_bus() -> EventBus:
+    return _bus
+
+
+def publish(upload_id: str, event_type: str, data: dict = None):
+    return _bus.publish(upload_id, event_type, data)
@@ -1,48 +1,60 @@
-import pandas as pd
 import os
 from .openai_loop import generate_all_records
+from .record_writer import RecordWriter
 
-def save_to_excel(records, output_path):
-    """Save records to Excel file"""
-    df = pd.DataFrame(records)
-    df.to_excel(output_path, index=False)
-    print(f"✅ Excel saved to: {output_path}")
-
-def process_extracted_text(text_file_path, output_dir="outputs"):
+def process_extracted_text(text_file_path, output_dir="outputs", mode=None, stats=None, on_record=None,
+                           formats=None, drawing_text=None, records_path=None, lazy=False):
     """
-    Process extracted text to generate part records and save to Excel
+    Process extracted text to generate part records and export them
+    
+    Records are written out as they are accepted: NDJSON per record, and a
+    partial .xlsx refreshed every EXCEL_SNAPSHOT_SECONDS; CSV and Parquet
+    are produced when extraction finishes.
     
     Args:
         text_file_path (str): Path to the extracted text file
         output_dir (str): Directory to save output files
+        mode (str): Extraction mode, "batches" or "rules" (see generate_all_records)
+        stats (dict): Optional dict (from new_job_stats) that receives LLM usage counts
+        on_record (callable): Optional callback receiving each record as it is extracted
+        formats: Export formats, e.g. "xlsx,ndjson" or ["csv", "parquet"]
+            (defaults to EXPORT_FORMATS)
+        drawing_text (str): The extracted text, if already in memory (the
+            file at text_file_path is then only used for its name)
+        records_path (str): Also keep the accepted records as NDJSON here
+        lazy (bool): Only store the records at records_path; the exports are
+            generated on first download (see services.outputs)
     
     Returns:
-        tuple: (records, excel_output_path)
+        tuple: (records, main_output_path); the spreadsheet if xlsx was
+        requested, otherwise the first requested format
     """
     # Create output directory if it doesn't exist
     os.makedirs(output_dir, exist_ok=True)
     
     # Read the extracted text
-    print(f"📖 Reading extracted text from: {text_file_path}")
-    with open(text_file_path, "r", encoding="utf-8") as f:
-        drawing_text = f.read()
-    
-    # Generate records using AI
-    print("🤖 Processing text with AI to extract part records...")
-    records = generate_all_records(drawing_text)
+    if drawing_text is None:
+        print(f"📖 Reading extracted text from: {text_file_path}")
+        with open(text_file_path, "r", encoding="utf-8") as f:
+            drawing_text = f.read()
     
-    # Generate output path
+    # Generate output file stem
     base_name = os.path.splitext(os.path.basename(text_file_path))[0]
     # Remove '_extracted' suffix if present
     if base_name.endswith('_extracted'):
         base_name = base_name[:-10]
     
-    excel_output_path = os.path.join(output_dir, f"{base_name}_parts.xlsx")
-    
-    # Save to Excel
-    save_to_excel(records, excel_output_path)
-    
-    return records, excel_output_path
+    # Generate records using AI, exporting each one as it arrives
+    print("🤖 Processing text with AI to extract part records...")
+    with RecordWriter(output_dir, base_name, formats, spool_path=records_path, write_exports=not lazy) as writer:
+        def accept(record):
+            writer.add(record)
+            if on_record:
+                on_record(record)
+        
+        records = generate_all_records(drawing_text, mode=mode, stats=stats, on_record=accept)
+    
+    return records, writer.primary_path
 
 if __name__ == "__main__":
     # For backward compatibility
@@ -0,0 +1,79 @@
+"""
+Incremental JSON record parser
+
+Feeds on a streamed model response chunk by chunk and emits each top-level
+JSON object as soon as its closing brace arrives. Text outside objects
+(markdown fences, the enclosing array brackets, commas, prose) is ignored,
+and an object that fails to parse is skipped without affecting the records
+before or after it.
+"""
+
+import json
+
+
+class IncrementalRecordParser:
+    """Extract complete top-level {...} objects from a growing text stream"""
+
+    def __init__(self):
+        self._buffer = []
+        self._depth = 0
+        self._in_string = False
+        self._escape = False
+        self.records_parsed = 0
+        self.errors = 0
+
+    def feed(self, chunk: str) -> list:
+        """
+        Consume the next piece of text
+
+        Returns:
+            List of objects completed within this chunk, in order
+        """
+        completed = []
+        for char in chunk:
+            if self._depth == 0:
+                # Outside any object: wait for the next one to start
+                if char == "{":
+                    self._buffer = [char]
+                    self._depth = 1
+                    self._in_string = False
+                    self._escape = False
+                continue
+
+            self._buffer.append(char)
+
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif char == "\\":
+                    self._escape = True
+                elif char == '"':
+                    self._in_string = False
+                continue
+
+            if char == '"':
+                self._in_string = True
+            elif char == "{":
+                self._depth += 1
+            elif char == "}":
+                self._depth -= 1
+                if self._depth == 0:
+                    record = self._parse("".join(self._buffer))
+                    self._buffer = []
+                    if record is not None:
+                        completed.append(record)
+        return completed
+
+    def _parse(self, text: str):
+        try:
+            record = json.loads(text)
+        except json.JSONDecodeError:
+            self.errors += 1
+            return None
+        self.records_parsed += 1
+        return record
+
+    @property
+    def truncated(self) -> bool:
+        """True if the stream ended in the middle of an object"""
+        return self._depth > 0
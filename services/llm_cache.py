@@ -0,0 +1,151 @@
+"""
+Persistent LLM response cache
+
+Chat completions are stored on disk under a hash of the model, temperature
+and full message payload, so /reprocess and re-uploads of the same drawing
+replay identical prompts in milliseconds. Entries expire after a TTL and the
+cache is bounded in size (least-recently-used entries are evicted first).
+
+Caching can be disabled globally (LLM_CACHE=0) or for the current job with
+the bypass() context manager.
+"""
+
+import hashlib
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from pathlib import Path
+
+# Cache configuration (overridable from the environment)
+LLM_CACHE_ENABLED = os.getenv("LLM_CACHE", "1") not in ("0", "false", "False")
+LLM_CACHE_DIR = Path(os.getenv("LLM_CACHE_DIR", "cache/llm"))
+LLM_CACHE_TTL_HOURS = float(os.getenv("LLM_CACHE_TTL_HOURS", "168"))
+LLM_CACHE_MAX_MB = int(os.getenv("LLM_CACHE_MAX_MB", "256"))
+
+_bypass = ContextVar("llm_cache_bypass", default=False)
+_lock = threading.Lock()
+_stats = {"hits": 0, "misses": 0, "stores": 0, "evictions": 0, "bypassed": 0}
+
+
+@contextmanager
+def bypass(enabled: bool = True):
+    """Skip cache reads (responses are still stored) inside a `with` block"""
+    token = _bypass.set(bool(enabled))
+    try:
+        yield
+    finally:
+        _bypass.reset(token)
+
+
+def cache_key(model: str, temperature: float, messages: list) -> str:
+    payload = {"model": model, "temperature": temperature, "messages": messages}
+    return hashlib.sha256(json.dumps(payload, sort_keys=True, ensure_ascii=False).encode("utf-8")).hexdigest()
+
+
+def _entry_path(key: str) -> Path:
+    return LLM_CACHE_DIR / f"{key}.json"
+
+
+def get(model: str, temperature: float, messages: list):
+    """Return the cached response text, or None on a miss/bypass/expiry"""
+    if not LLM_CACHE_ENABLED:
+        return None
+    if _bypass.get():
+        with _lock:
+            _stats["bypassed"] += 1
+        return None
+
+    entry = _entry_path(cache_key(model, temperature, messages))
+    try:
+        with open(entry, "r", encoding="utf-8") as f:
+            data = json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        with _lock:
+            _stats["misses"] += 1
+        return None
+
+    if time.time() - data.get("created_at", 0) > LLM_CACHE_TTL_HOURS * 3600:
+        try:
+            entry.unlink()
+        except FileNotFoundError:
+            pass
+        with _lock:
+            _stats["misses"] += 1
+            _stats["evictions"] += 1
+        return None
+
+    # Touch the entry so LRU eviction sees it as recently used
+    try:
+        os.utime(entry)
+    except OSError:
+        pass
+
+    with _lock:
+        _stats["hits"] += 1
+    return data["response"]
+
+
+def put(model: str, temperature: float, messages: list, response: str):
+    """Store a response and evict old entries if the cache is over budget"""
+    if not LLM_CACHE_ENABLED or response is None:
+        return
+
+    LLM_CACHE_DIR.mkdir(parents=True, exist_ok=True)
+    entry = _entry_path(cache_key(model, temperature, messages))
+    data = {"created_at": time.time(), "model": model, "temperature": temperature, "response": response}
+
+    # Write to a temp file first so readers never see a partial entry
+    tmp_path = entry.with_suffix(f".{threading.get_ident()}.tmp")
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(data, f, ensure_ascii=False)
+    os.replace(tmp_path, entry)
+
+    with _lock:
+        _stats["stores"] += 1
+        _evict()
+
+
+def _evict():
+    """Remove least-recently-used entries until the cache fits LLM_CACHE_MAX_MB"""
+    max_bytes = LLM_CACHE_MAX_MB * 1024 * 1024
+    entries = []
+    total = 0
+    for path in LLM_CACHE_DIR.glob("*.json"):
+        try:
+            stat = path.stat()
+        except FileNotFoundError:
+            continue
+        entries.append((stat.st_mtime, stat.st_size, path))
+        total += stat.st_size
+
+    entries.sort()
+    for _, size, path in entries:
+        if total <= max_bytes:
+            break
+        try:
+            path.unlink()
+            total -= size
+            _stats["evictions"] += 1
+        except FileNotFoundError:
+            pass
+
+
+def stats() -> dict:
+    """Hit/miss counters and current cache size"""
+    entries = list(LLM_CACHE_DIR.glob("*.json")) if LLM_CACHE_DIR.exists() else []
+    size = sum(path.stat().st_size for path in entries if path.exists())
+    with _lock:
+        counters = dict(_stats)
+    lookups = counters["hits"] + counters["misses"]
+    counters.update({
+        "enabled": LLM_CACHE_ENABLED,
+        "entries": len(entries),
+        "size_mb": round(size / (1024 * 1024), 2),
+        "max_size_mb": LLM_CACHE_MAX_MB,
+        "ttl_hours": LLM_CACHE_TTL_HOURS,
+        "hit_rate": round(counters["hits"] / lookups, 3) if lookups else 0.0,
+    })
+    return counters
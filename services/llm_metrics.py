@@ -0,0 +1,118 @@
+"""
+Process-wide LLM call metrics
+
+Every OpenAI call (including cache hits) is recorded here with its latency,
+time to first token, scheduler queue time, tokens, retries and parse
+outcome. Counters are kept per call kind (extraction batch, partition plan,
+rules) together with a rolling window of recent timings for percentiles and
+the slowest recent calls, so slow prompts and regressions stand out.
+"""
+
+import os
+import threading
+import time
+from collections import deque
+
+# Number of recent calls kept for percentiles and the slow-call list
+LLM_METRICS_WINDOW = int(os.getenv("LLM_METRICS_WINDOW", "1000"))
+SLOWEST_CALLS = 10
+
+_lock = threading.Lock()
+_started_at = time.time()
+_kinds = {}
+_recent = deque(maxlen=LLM_METRICS_WINDOW)
+
+
+def _new_counters():
+    return {
+        "calls": 0,
+        "cache_hits": 0,
+        "errors": 0,
+        "retries": 0,
+        "prompt_tokens": 0,
+        "completion_tokens": 0,
+        "cached_prompt_tokens": 0,
+        "records_parsed": 0,
+        "parse_errors": 0,
+        "records_returned": 0,
+        "duplicates": 0,
+    }
+
+
+def percentile(values, fraction):
+    """Nearest-rank percentile of a list of numbers (0.0 if empty)"""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, int(round(fraction * len(ordered))) - 1))
+    return round(ordered[index], 3)
+
+
+def timing_summary(values) -> dict:
+    values = [value for value in values if value is not None]
+    return {
+        "avg": round(sum(values) / len(values), 3) if values else 0.0,
+        "p50": percentile(values, 0.5),
+        "p95": percentile(values, 0.95),
+        "max": round(max(values), 3) if values else 0.0,
+    }
+
+
+def record_call(call: dict):
+    """Add one finished call (see openai_loop._new_call) to the process metrics"""
+    with _lock:
+        counters = _kinds.setdefault(call["kind"], _new_counters())
+        counters["calls"] += 1
+        counters["cache_hits"] += 1 if call["cache_hit"] else 0
+        counters["errors"] += 1 if call.get("error") else 0
+        for key in ("retries", "prompt_tokens", "completion_tokens", "cached_prompt_tokens",
+                    "records_parsed", "parse_errors"):
+            counters[key] += call.get(key) or 0
+        _recent.append(call)
+
+
+def record_batch(kind: str, returned: int, duplicates: int):
+    """Count records a call returned and how many were dropped as duplicates"""
+    with _lock:
+        counters = _kinds.setdefault(kind, _new_counters())
+        counters["records_returned"] += returned
+        counters["duplicates"] += duplicates
+
+
+def snapshot() -> dict:
+    """Counters per call kind plus timings and slowest calls from the recent window"""
+    with _lock:
+        kinds = {kind: dict(counters) for kind, counters in _kinds.items()}
+        recent = list(_recent)
+
+    api_calls = [call for call in recent if not call["cache_hit"] and not call.get("error")]
+    for kind, counters in kinds.items():
+        kind_calls = [call for call in api_calls if call["kind"] == kind]
+        counters["latency_seconds"] = timing_summary([call["latency_seconds"] for call in kind_calls])
+        counters["ttft_seconds"] = timing_summary([call["ttft_seconds"] for call in kind_calls])
+        counters["queue_seconds"] = timing_summary([call["queue_seconds"] for call in kind_calls])
+        counters["duplicate_rate"] = (
+            round(counters["duplicates"] / counters["records_returned"], 3) if counters["records_returned"] else 0.0
+        )
+
+    slowest = sorted(api_calls, key=lambda call: call["latency_seconds"] or 0, reverse=True)[:SLOWEST_CALLS]
+    return {
+        "uptime_seconds": round(time.time() - _started_at),
+        "window": len(recent),
+        "by_kind": kinds,
+        "slowest_calls": slowest,
+    }
+
+
+def summarize_calls(calls: list) -> dict:
+    """Timing totals and percentiles for one job's call log"""
+    api_calls = [call for call in calls if not call["cache_hit"] and not call.get("error")]
+    return {
+        "queue_seconds": round(sum(call["queue_seconds"] for call in calls), 3),
+        "llm_seconds": round(sum(call["latency_seconds"] or 0 for call in calls), 3),
+        "retries": sum(call["retries"] for call in calls),
+        "errors": sum(1 for call in calls if call.get("error")),
+        "parse_errors": sum(call["parse_errors"] for call in calls),
+        "latency_seconds": timing_summary([call["latency_seconds"] for call in api_calls]),
+        "ttft_seconds": timing_summary([call["ttft_seconds"] for call in api_calls]),
+    }
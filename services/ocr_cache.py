@@ -0,0 +1,151 @@
+"""
+Content-addressed OCR result cache
+
+OCR exports are stored on disk under a key made from the PDF's SHA-256 and
+the OCR configuration, so re-uploads of the same document and the OCR viewer
+reuse earlier results instead of running inference again. The cache is
+bounded in size and evicts least-recently-used entries (by file mtime).
+"""
+
+import hashlib
+import json
+import os
+import threading
+from pathlib import Path
+
+from .ocr_pool import OCR_DET_ARCH, OCR_RECO_ARCH
+from .pdf_pages import RENDER_SCALE
+from .text_layer import TEXT_LAYER_ENABLED, TEXT_LAYER_MIN_WORDS
+
+# Cache configuration (overridable from the environment)
+OCR_CACHE_ENABLED = os.getenv("OCR_CACHE", "1") not in ("0", "false", "False")
+OCR_CACHE_DIR = Path(os.getenv("OCR_CACHE_DIR", "cache/ocr"))
+OCR_CACHE_MAX_MB = int(os.getenv("OCR_CACHE_MAX_MB", "512"))
+
+_lock = threading.Lock()
+_stats = {"hits": 0, "misses": 0, "stores": 0, "evictions": 0}
+
+
+def hash_file(path: str, chunk_size: int = 1024 * 1024) -> str:
+    """SHA-256 of a file, read in chunks"""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def config_fingerprint() -> str:
+    """Short hash of every setting that changes OCR output"""
+    config = {
+        "det_arch": OCR_DET_ARCH,
+        "reco_arch": OCR_RECO_ARCH,
+        "render_scale": RENDER_SCALE,
+        "text_layer": TEXT_LAYER_ENABLED,
+        "text_layer_min_words": TEXT_LAYER_MIN_WORDS,
+    }
+    return hashlib.sha256(json.dumps(config, sort_keys=True).encode()).hexdigest()[:16]
+
+
+def cache_key(pdf_path: str, content_hash: str = None) -> str:
+    return f"{content_hash or hash_file(pdf_path)}_{config_fingerprint()}"
+
+
+def _entry_path(key: str) -> Path:
+    return OCR_CACHE_DIR / f"{key}.json"
+
+
+def get(pdf_path: str, content_hash: str = None):
+    """
+    Look up the OCR export for a PDF
+
+    Args:
+        pdf_path: Path to the PDF file
+        content_hash: Precomputed SHA-256 of the file (hashed here if None)
+
+    Returns:
+        Cached result.export() dict, or None on a miss
+    """
+    if not OCR_CACHE_ENABLED:
+        return None
+
+    entry = _entry_path(cache_key(pdf_path, content_hash))
+    try:
+        with open(entry, "r", encoding="utf-8") as f:
+            json_output = json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        with _lock:
+            _stats["misses"] += 1
+        return None
+
+    # Touch the entry so LRU eviction sees it as recently used
+    try:
+        os.utime(entry)
+    except OSError:
+        pass
+
+    with _lock:
+        _stats["hits"] += 1
+    print(f"♻️ OCR cache hit for {pdf_path}")
+    return json_output
+
+
+def put(pdf_path: str, json_output: dict, content_hash: str = None):
+    """Store an OCR export and evict old entries if the cache is over budget"""
+    if not OCR_CACHE_ENABLED:
+        return
+
+    OCR_CACHE_DIR.mkdir(parents=True, exist_ok=True)
+    entry = _entry_path(cache_key(pdf_path, content_hash))
+
+    # Write to a temp file first so readers never see a partial entry
+    tmp_path = entry.with_suffix(f".{threading.get_ident()}.tmp")
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(json_output, f)
+    os.replace(tmp_path, entry)
+
+    with _lock:
+        _stats["stores"] += 1
+        _evict()
+
+
+def _evict():
+    """Remove least-recently-used entries until the cache fits OCR_CACHE_MAX_MB"""
+    max_bytes = OCR_CACHE_MAX_MB * 1024 * 1024
+    entries = []
+    total = 0
+    for path in OCR_CACHE_DIR.glob("*.json"):
+        try:
+            stat = path.stat()
+        except FileNotFoundError:
+            continue
+        entries.append((stat.st_mtime, stat.st_size, path))
+        total += stat.st_size
+
+    entries.sort()
+    for _, size, path in entries:
+        if total <= max_bytes:
+            break
+        try:
+            path.unlink()
+            total -= size
+            _stats["evictions"] += 1
+        except FileNotFoundError:
+            pass
+
+
+def stats() -> dict:
+    """Hit/miss counters and current cache size"""
+    entries = list(OCR_CACHE_DIR.glob("*.json")) if OCR_CACHE_DIR.exists() else []
+    size = sum(path.stat().st_size for path in entries if path.exists())
+    with _lock:
+        counters = dict(_stats)
+    lookups = counters["hits"] + counters["misses"]
+    counters.update({
+        "enabled": OCR_CACHE_ENABLED,
+        "entries": len(entries),
+        "size_mb": round(size / (1024 * 1024), 2),
+        "max_size_mb": OCR_CACHE_MAX_MB,
+        "hit_rate": round(counters["hits"] / lookups, 3) if lookups else 0.0,
+    })
+    return counters
@@ -0,0 +1,146 @@
+"""
+Process-wide OCR predictor registry
+
+Loading doctr weights is expensive, so every code path (the /upload pipeline,
+the OCR viewer and the CLI) borrows predictors from a shared pool instead of
+calling ocr_predictor() itself. Pools are keyed by detection/recognition
+architecture and predictor options; each pool lazily loads up to `size`
+predictors so several jobs can run inference at the same time.
+"""
+
+import os
+import queue
+import threading
+from contextlib import contextmanager
+
+from doctr.models import ocr_predictor
+
+# Pool configuration (overridable from the environment)
+OCR_DET_ARCH = os.getenv("OCR_DET_ARCH", "db_resnet50")
+OCR_RECO_ARCH = os.getenv("OCR_RECO_ARCH", "crnn_vgg16_bn")
+OCR_POOL_SIZE = int(os.getenv("OCR_POOL_SIZE", "1"))
+
+
+class PredictorPool:
+    """Fixed-size pool of identical, lazily loaded OCR predictors"""
+
+    def __init__(self, det_arch: str, reco_arch: str, size: int = 1, **options):
+        self.det_arch = det_arch
+        self.reco_arch = reco_arch
+        self.size = max(1, size)
+        self.options = options
+        self._idle = queue.LifoQueue()
+        self._loaded = 0
+        self._lock = threading.Lock()
+
+    def _load(self):
+        print(f"🔍 Loading OCR model ({self.det_arch} + {self.reco_arch})...")
+        model = ocr_predictor(
+            det_arch=self.det_arch,
+            reco_arch=self.reco_arch,
+            pretrained=True,
+            **self.options
+        )
+        print("✅ OCR model loaded successfully")
+        return model
+
+    def preload(self, count: int = 1):
+        """Load up to `count` predictors ahead of the first request"""
+        while True:
+            with self._lock:
+                if self._loaded >= min(count, self.size):
+                    return
+                self._loaded += 1
+            self._idle.put(self._load())
+
+    def acquire(self, timeout: float = None):
+        """Take an idle predictor, loading a new one if the pool is not full yet"""
+        try:
+            return self._idle.get_nowait()
+        except queue.Empty:
+            pass
+
+        with self._lock:
+            can_load = self._loaded < self.size
+            if can_load:
+                self._loaded += 1
+
+        if can_load:
+            try:
+                return self._load()
+            except Exception:
+                with self._lock:
+                    self._loaded -= 1
+                raise
+
+        return self._idle.get(timeout=timeout)
+
+    def release(self, model):
+        """Return a predictor to the pool"""
+        self._idle.put(model)
+
+    @contextmanager
+    def borrow(self, timeout: float = None):
+        model = self.acquire(timeout=timeout)
+        try:
+            yield model
+        finally:
+            self.release(model)
+
+    def stats(self) -> dict:
+        return {
+            "det_arch": self.det_arch,
+            "reco_arch": self.reco_arch,
+            "options": self.options,
+            "size": self.size,
+            "loaded": self._loaded,
+            "idle": self._idle.qsize(),
+        }
+
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+def _pool_key(det_arch, reco_arch, options):
+    return (det_arch, reco_arch, tuple(sorted(options.items())))
+
+
+def get_pool(det_arch: str = None, reco_arch: str = None, size: int = None, **options) -> PredictorPool:
+    """
+    Get (or create) the shared pool for a predictor configuration
+
+    Args:
+        det_arch: Detection architecture (defaults to OCR_DET_ARCH)
+        reco_arch: Recognition architecture (defaults to OCR_RECO_ARCH)
+        size: Maximum number of loaded predictors (defaults to OCR_POOL_SIZE)
+        **options: Extra keyword arguments forwarded to ocr_predictor()
+
+    Returns:
+        PredictorPool shared by every caller with the same configuration
+    """
+    det_arch = det_arch or OCR_DET_ARCH
+    reco_arch = reco_arch or OCR_RECO_ARCH
+    key = _pool_key(det_arch, reco_arch, options)
+
+    with _pools_lock:
+        pool = _pools.get(key)
+        if pool is None:
+            pool = PredictorPool(det_arch, reco_arch, size or OCR_POOL_SIZE, **options)
+            _pools[key] = pool
+        return pool
+
+
+@contextmanager
+def borrow_predictor(det_arch: str = None, reco_arch: str = None, timeout: float = None, **options):
+    """Borrow a predictor from the shared pool for the duration of a `with` block"""
+    pool = get_pool(det_arch, reco_arch, **options)
+    with pool.borrow(timeout=timeout) as model:
+        yield model
+
+
+def pool_stats() -> list:
+    """Snapshot of every registered pool"""
+    with _pools_lock:
+        pools = list(_pools.values())
+    return [pool.stats() for pool in pools]
@@ -0,0 +1,288 @@
+"""
+Multi-process OCR workers
+
+A pool of worker processes, each holding its own doctr predictor (loaded once
+in the process initializer), so OCR inference can use every CPU core instead
+of saturating the single uvicorn process. Documents are dispatched whole or
+split into page batches that run concurrently; results are merged back in
+page order into the usual result.export() dict.
+
+Set OCR_WORKERS=0 (the default) to run OCR in-process through the shared
+predictor pool instead.
+"""
+
+import multiprocessing
+import os
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+from doctr.io import DocumentFile
+
+from . import ocr_cache
+from .ocr_pool import borrow_predictor, get_pool
+from .pdf_pages import count_pdf_pages, render_pdf_pages
+from .text_layer import TEXT_LAYER_ENABLED, split_text_layer_pages
+
+# Worker configuration (overridable from the environment)
+OCR_WORKERS = int(os.getenv("OCR_WORKERS", "0"))
+OCR_TORCH_THREADS = int(os.getenv("OCR_TORCH_THREADS", "0"))
+OCR_PAGES_PER_TASK = int(os.getenv("OCR_PAGES_PER_TASK", "0"))
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def _init_worker(torch_threads: int):
+    """Process initializer: pin torch threads and load the predictor once"""
+    if torch_threads > 0:
+        import torch
+        torch.set_num_threads(torch_threads)
+    get_pool(size=1).preload()
+
+
+def _run_ocr(pdf_path: str, page_indices=None):
+    """Rasterize pages and run the OCR model on them (see ocr_pages)"""
+    render_start = time.time()
+    if page_indices is None:
+        doc = DocumentFile.from_pdf(pdf_path)
+        page_indices = list(range(len(doc)))
+    else:
+        page_indices = list(page_indices)
+        doc = render_pdf_pages(pdf_path, page_indices)
+    render_time = time.time() - render_start
+
+    ocr_start = time.time()
+    with borrow_predictor() as model:
+        result = model(doc)
+    ocr_time = time.time() - ocr_start
+    json_output = result.export()
+
+    for page, page_idx in zip(json_output["pages"], page_indices):
+        page["page_idx"] = page_idx
+        page["source"] = "ocr"
+
+    batch_size = max(1, len(page_indices))
+    timings = [
+        {
+            "page": page_idx,
+            "path": "ocr",
+            "batch_start": page_indices[0],
+            "batch_size": batch_size,
+            "render_seconds": round(render_time / batch_size, 3),
+            "ocr_seconds": round(ocr_time / batch_size, 3),
+        }
+        for page_idx in page_indices
+    ]
+    return json_output, timings
+
+
+def ocr_pages(pdf_path: str, page_indices=None):
+    """
+    OCR a whole PDF or a subset of its pages with a pooled predictor
+
+    Pages with a usable native text layer are read directly from the PDF and
+    skip the OCR model entirely; each page's "source" records which path it
+    took ("text_layer" or "ocr").
+
+    Args:
+        pdf_path: Path to the PDF file
+        page_indices: 0-based page numbers to OCR (whole document if None)
+
+    Returns:
+        tuple: (json_output, timings) where json_output is a result.export()
+        dict whose page_idx values refer to the source PDF, and timings has
+        one entry per page with its path, render time and share of the
+        batch's inference time
+    """
+    if not TEXT_LAYER_ENABLED:
+        return _run_ocr(pdf_path, page_indices)
+
+    extract_start = time.time()
+    native_pages, remaining = split_text_layer_pages(pdf_path, page_indices)
+    extract_time = time.time() - extract_start
+
+    if not native_pages:
+        return _run_ocr(pdf_path, page_indices)
+
+    exports = [{"pages": list(native_pages.values())}]
+    timings = [
+        {
+            "page": page_idx,
+            "path": "text_layer",
+            "render_seconds": 0.0,
+            "ocr_seconds": round(extract_time / len(native_pages), 3),
+        }
+        for page_idx in native_pages
+    ]
+
+    if remaining:
+        ocr_output, ocr_timings = _run_ocr(pdf_path, remaining)
+        exports.append(ocr_output)
+        timings.extend(ocr_timings)
+
+    timings.sort(key=lambda timing: timing["page"])
+    return merge_exports(exports), timings
+
+
+def merge_exports(exports: list) -> dict:
+    """Concatenate several result.export() dicts, ordering pages by page_idx"""
+    if not exports:
+        return {"pages": []}
+
+    # Text-layer-only exports carry no metadata; prefer an OCR export's keys
+    base = next((export for export in exports if len(export) > 1), exports[0])
+    merged = {key: value for key, value in base.items() if key != "pages"}
+    pages = [page for export in exports for page in export["pages"]]
+    pages.sort(key=lambda page: page.get("page_idx", 0))
+    merged["pages"] = pages
+    return merged
+
+
+def get_executor():
+    """Lazily start the OCR worker processes (None when OCR_WORKERS is 0)"""
+    global _executor
+
+    if OCR_WORKERS <= 0:
+        return None
+
+    with _executor_lock:
+        if _executor is None:
+            print(f"🧵 Starting {OCR_WORKERS} OCR worker processes "
+                  f"({OCR_TORCH_THREADS or 'default'} torch threads each)...")
+            # spawn avoids inheriting torch/OpenMP state from the server process
+            _executor = ProcessPoolExecutor(
+                max_workers=OCR_WORKERS,
+                mp_context=multiprocessing.get_context("spawn"),
+                initializer=_init_worker,
+                initargs=(OCR_TORCH_THREADS,),
+            )
+        return _executor
+
+
+def ocr_document(pdf_path: str, pages_per_task: int = None, timings: list = None,
+                 content_hash: str = None, use_cache: bool = True, on_pages=None) -> dict:
+    """
+    OCR a PDF, splitting it into page batches that run concurrently
+
+    Results are looked up in (and stored to) the content-addressed OCR cache
+    first. On a miss, batches go to the worker processes when OCR_WORKERS is
+    set, otherwise to threads sharing the in-process predictor pool (one
+    thread per predictor).
+
+    Args:
+        pdf_path: Path to the PDF file
+        pages_per_task: Split the document into batches of this many pages
+            (defaults to OCR_PAGES_PER_TASK; 0 processes the whole document
+            as a single batch)
+        timings: Optional list that receives per-page timing entries
+        content_hash: Precomputed SHA-256 of the PDF, if known
+        use_cache: Set to False to always run inference
+        on_pages: Optional callback receiving (pages_done, pages_total) as
+            page batches finish
+
+    Returns:
+        result.export() dict covering every page in order
+    """
+    if use_cache and ocr_cache.OCR_CACHE_ENABLED:
+        content_hash = content_hash or ocr_cache.hash_file(pdf_path)
+        cached = ocr_cache.get(pdf_path, content_hash)
+        if cached is not None:
+            if on_pages:
+                on_pages(len(cached["pages"]), len(cached["pages"]))
+            return cached
+
+    json_output = _ocr_document(pdf_path, pages_per_task, timings, on_pages)
+
+    if use_cache:
+        ocr_cache.put(pdf_path, json_output, content_hash)
+    return json_output
+
+
+def _ocr_document(pdf_path: str, pages_per_task: int = None, timings: list = None, on_pages=None) -> dict:
+    """Run OCR on a PDF without consulting the cache (see ocr_document)"""
+    pages_per_task = OCR_PAGES_PER_TASK if pages_per_task is None else pages_per_task
+    executor = get_executor()
+
+    if pages_per_task <= 0:
+        if executor is None:
+            json_output, page_timings = ocr_pages(pdf_path)
+        else:
+            json_output, page_timings = executor.submit(ocr_pages, pdf_path).result()
+        if timings is not None:
+            timings.extend(page_timings)
+        if on_pages:
+            on_pages(len(json_output["pages"]), len(json_output["pages"]))
+        return json_output
+
+    num_pages = count_pdf_pages(pdf_path)
+    batches = [
+        range(start, min(start + pages_per_task, num_pages))
+        for start in range(0, num_pages, pages_per_task)
+    ]
+    print(f"📑 OCR: {num_pages} pages in {len(batches)} batches of up to {pages_per_task}")
+
+    def collect(futures):
+        # In page order, reporting progress as each batch is picked up
+        results = []
+        pages_done = 0
+        for batch, future in zip(batches, futures):
+            results.append(future.result())
+            pages_done += len(batch)
+            if on_pages:
+                on_pages(pages_done, num_pages)
+        return results
+
+    if executor is None:
+        with ThreadPoolExecutor(max_workers=get_pool().size) as thread_pool:
+            results = collect([thread_pool.submit(ocr_pages, pdf_path, batch) for batch in batches])
+    else:
+        results = collect([executor.submit(ocr_pages, pdf_path, batch) for batch in batches])
+
+    if timings is not None:
+        for _, page_timings in results:
+            timings.extend(page_timings)
+
+    return merge_exports([json_output for json_output, _ in results])
+
+
+def iter_ocr_windows(pdf_path: str, window: int = 1):
+    """
+    OCR a PDF a few pages at a time, yielding each window as soon as it is done
+
+    Only one window of page images is alive at once (rendered inside
+    ocr_pages and released when it returns), so memory stays flat however
+    long the document is.
+
+    Yields:
+        tuple: (json_output, timings) for each window, in page order
+    """
+    window = max(1, window)
+    num_pages = count_pdf_pages(pdf_path)
+    executor = get_executor()
+
+    for start in range(0, num_pages, window):
+        pages = range(start, min(start + window, num_pages))
+        if executor is None:
+            yield ocr_pages(pdf_path, pages)
+        else:
+            yield executor.submit(ocr_pages, pdf_path, pages).result()
+
+
+def shutdown():
+    """Stop the worker processes (called on application shutdown)"""
+    global _executor
+
+    with _executor_lock:
+        if _executor is not None:
+            _executor.shutdown(wait=True, cancel_futures=True)
+            _executor = None
+
+
+def worker_stats() -> dict:
+    return {
+        "workers": OCR_WORKERS,
+        "torch_threads": OCR_TORCH_THREADS,
+        "pages_per_task": OCR_PAGES_PER_TASK,
+        "running": _executor is not None,
+    }
@@ -1,94 +1,755 @@
-from openai import OpenAI
+from openai import OpenAI, AsyncOpenAI, APIConnectionError, InternalServerError, RateLimitError
+import asyncio
 import time
 import os
-from .prompts import generate_initial_prompt, generate_continuation_prompt
+from contextvars import ContextVar
+from .prompts import (
+    build_extraction_messages,
+    generate_partition_prompt,
+    generate_rules_prompt,
+)
+from . import events, llm_cache, llm_metrics, openai_scheduler
+from .json_stream import IncrementalRecordParser
+from .chunking import estimate_tokens, split_into_chunks
+from .openai_scheduler import OPENAI_MAX_RETRIES, backoff_delay, get_scheduler, retry_after_seconds
+from .rule_expansion import RuleError, count_combinations, expand_rules
 import re
 import json
 
 # Initialize OpenAI client with API key from environment variable
-client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
+# (SDK retries are off: openai_scheduler owns rate limiting and backoff).
+# OPENAI_BASE_URL points the client at another server, e.g. bench/mock_openai.py
+OPENAI_BASE_URL = os.getenv("OPENAI_BASE_URL") or None
+client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"), base_url=OPENAI_BASE_URL, max_retries=0)
 MAX_ROWS = 25
+MODEL = "gpt-4o"
+TEMPERATURE = 0.2
+# Completion budget reserved per request until the real usage is known
+COMPLETION_TOKEN_ESTIMATE = MAX_ROWS * 80
 
-def call_openai(prompt, max_retries=3):
+# Concurrent extraction: max simultaneous requests per job, and max number of
+# disjoint record subsets planned up front (LLM_PARALLELISM=1 disables it)
+LLM_PARALLELISM = int(os.getenv("LLM_PARALLELISM", "4"))
+LLM_MAX_PARTITIONS = int(os.getenv("LLM_MAX_PARTITIONS", "8"))
+
+# Documents estimated above this many tokens are split by page/section and
+# the chunks extracted concurrently (0 disables chunking)
+LLM_CHUNK_TOKENS = int(os.getenv("LLM_CHUNK_TOKENS", "12000"))
+
+# Stream completions and hand each record on as soon as it is complete
+LLM_STREAMING = os.getenv("LLM_STREAMING", "1") not in ("0", "false", "False")
+
+# "batches" pages records out of the model; "rules" extracts the construction
+# rules in one call and expands them locally
+LLM_EXTRACTION_MODE = os.getenv("LLM_EXTRACTION_MODE", "batches")
+EXTRACTION_MODES = ("batches", "rules")
+
+# Usage counters for the job currently extracting records (see new_job_stats)
+_job_stats = ContextVar("openai_job_stats", default=None)
+# Callback receiving each accepted record of the current job as it arrives
+_record_sink = ContextVar("openai_record_sink", default=None)
+# Telemetry record of the most recent call made in this context
+_last_call = ContextVar("openai_last_call", default=None)
+
+
+def new_job_stats():
+    """Empty per-job usage counters, filled by call_openai/call_openai_async"""
+    return {
+        "calls": 0,
+        "cache_hits": 0,
+        "prompt_tokens": 0,
+        "completion_tokens": 0,
+        "cached_prompt_tokens": 0,
+        "records_returned": 0,
+        "duplicates": 0,
+        "chunks": [],
+        "call_log": [],
+    }
+
+
+def _new_call(kind, messages):
+    """Telemetry record for one logical call (all retries included)"""
+    return {
+        "kind": kind,
+        "job": openai_scheduler.current_job(),
+        "started_at": time.time(),
+        "prompt_chars": sum(len(message["content"]) for message in messages),
+        "cache_hit": False,
+        "queue_seconds": 0.0,
+        "ttft_seconds": None,
+        "latency_seconds": None,
+        "total_seconds": None,
+        "retries": 0,
+        "prompt_tokens": 0,
+        "completion_tokens": 0,
+        "cached_prompt_tokens": 0,
+        "records_parsed": 0,
+        "parse_errors": 0,
+        "records_returned": 0,
+        "duplicates": 0,
+        "error": None,
+    }
+
+
+def _apply_usage(call, usage):
+    if usage is None:
+        return
+    call["prompt_tokens"] = getattr(usage, "prompt_tokens", 0) or 0
+    call["completion_tokens"] = getattr(usage, "completion_tokens", 0) or 0
+    details = getattr(usage, "prompt_tokens_details", None)
+    call["cached_prompt_tokens"] = getattr(details, "cached_tokens", 0) or 0
+
+
+def _apply_parser(call, parser):
+    call["records_parsed"] = parser.records_parsed
+    call["parse_errors"] = parser.errors + (1 if parser.truncated else 0)
+
+
+def _log_call(call, started):
+    """Finish a call record and add it to the job stats and process metrics"""
+    call["total_seconds"] = round(time.perf_counter() - started, 3)
+    call["queue_seconds"] = round(call["queue_seconds"], 3)
+    _last_call.set(call)
+    llm_metrics.record_call(call)
+
+    stats = _job_stats.get()
+    if stats is None:
+        return
+    stats["call_log"].append(call)
+    if call["error"]:
+        return
+    stats["calls"] += 1
+    if call["cache_hit"]:
+        stats["cache_hits"] += 1
+    stats["prompt_tokens"] += call["prompt_tokens"]
+    stats["completion_tokens"] += call["completion_tokens"]
+    stats["cached_prompt_tokens"] += call["cached_prompt_tokens"]
+
+
+def _record_batch(returned, new):
+    """Count records the model returned and how many were duplicates"""
+    call = _last_call.get()
+    if call is not None:
+        call["records_returned"] = returned
+        call["duplicates"] = returned - new
+        llm_metrics.record_batch(call["kind"], returned, returned - new)
+
+    job_id = openai_scheduler.current_job()
+    if job_id != "default":
+        events.publish(job_id, "batch", {"returned": returned, "new": new})
+
+    stats = _job_stats.get()
+    if stats is None:
+        return
+    stats["records_returned"] += returned
+    stats["duplicates"] += returned - new
+
+
+def summarize_job_stats(stats):
+    """Add derived per-call, timing and duplicate-rate figures to job usage counters"""
+    summary = dict(stats)
+    api_calls = stats["calls"] - stats["cache_hits"]
+    total_tokens = stats["prompt_tokens"] + stats["completion_tokens"]
+    summary["total_tokens"] = total_tokens
+    summary["tokens_per_call"] = round(total_tokens / api_calls) if api_calls else 0
+    summary["duplicate_rate"] = round(stats["duplicates"] / stats["records_returned"], 3) if stats["records_returned"] else 0.0
+    summary.update(llm_metrics.summarize_calls(stats["call_log"]))
+    return summary
+
+
+def _emit_record(record):
+    sink = _record_sink.get()
+    if sink is not None:
+        sink(record)
+
+
+def _emit_parsed(content, on_record):
+    """Deliver every record in a complete (non-streamed or cached) response"""
+    parser = IncrementalRecordParser()
+    for record in parser.feed(content or ""):
+        on_record(record)
+    return parser
+
+
+def _report_parser(parser):
+    if parser.errors or parser.truncated:
+        print(f"⚠️ Stream parsing: {parser.records_parsed} records kept, "
+              f"{parser.errors} malformed{', last record truncated' if parser.truncated else ''}")
+
+
+def _stream_completion(messages, on_record, call):
+    """Stream a completion, passing each record to on_record as it closes"""
+    parser = IncrementalRecordParser()
+    parts = []
+    usage = None
+    sent = time.perf_counter()
+    stream = client.chat.completions.create(
+        model=MODEL,
+        messages=messages,
+        temperature=TEMPERATURE,
+        stream=True,
+        stream_options={"include_usage": True},
+    )
+    for chunk in stream:
+        if getattr(chunk, "usage", None):
+            usage = chunk.usage
+        if not chunk.choices:
+            continue
+        delta = chunk.choices[0].delta.content
+        if delta:
+            if call["ttft_seconds"] is None:
+                call["ttft_seconds"] = round(time.perf_counter() - sent, 3)
+            parts.append(delta)
+            for record in parser.feed(delta):
+                on_record(record)
+    _report_parser(parser)
+    _apply_parser(call, parser)
+    return "".join(parts), usage
+
+
+async def _stream_completion_async(async_client, messages, on_record, call):
+    """Async variant of _stream_completion"""
+    parser = IncrementalRecordParser()
+    parts = []
+    usage = None
+    sent = time.perf_counter()
+    stream = await async_client.chat.completions.create(
+        model=MODEL,
+        messages=messages,
+        temperature=TEMPERATURE,
+        stream=True,
+        stream_options={"include_usage": True},
+    )
+    async for chunk in stream:
+        if getattr(chunk, "usage", None):
+            usage = chunk.usage
+        if not chunk.choices:
+            continue
+        delta = chunk.choices[0].delta.content
+        if delta:
+            if call["ttft_seconds"] is None:
+                call["ttft_seconds"] = round(time.perf_counter() - sent, 3)
+            parts.append(delta)
+            for record in parser.feed(delta):
+                on_record(record)
+    _report_parser(parser)
+    _apply_parser(call, parser)
+    return "".join(parts), usage
+
+
+def _complete(messages, on_record, call):
+    """Send one completion request and return (content, usage)"""
+    if on_record is not None and LLM_STREAMING:
+        return _stream_completion(messages, on_record, call)
+    sent = time.perf_counter()
+    response = client.chat.completions.create(
+        model=MODEL,
+        messages=messages,
+        temperature=TEMPERATURE,
+    )
+    call["ttft_seconds"] = round(time.perf_counter() - sent, 3)
+    content = response.choices[0].message.content
+    if on_record is not None:
+        _apply_parser(call, _emit_parsed(content, on_record))
+    return content, getattr(response, "usage", None)
+
+
+async def _complete_async(async_client, messages, on_record, call):
+    """Async variant of _complete"""
+    if on_record is not None and LLM_STREAMING:
+        return await _stream_completion_async(async_client, messages, on_record, call)
+    sent = time.perf_counter()
+    response = await async_client.chat.completions.create(
+        model=MODEL,
+        messages=messages,
+        temperature=TEMPERATURE,
+    )
+    call["ttft_seconds"] = round(time.perf_counter() - sent, 3)
+    content = response.choices[0].message.content
+    if on_record is not None:
+        _apply_parser(call, _emit_parsed(content, on_record))
+    return content, getattr(response, "usage", None)
+
+
+def _as_messages(prompt):
+    """Accept a plain prompt string or a prepared list of chat messages"""
+    if isinstance(prompt, str):
+        return [{"role": "user", "content": prompt}]
+    return prompt
+
+
+def _estimate_request_tokens(messages):
+    """Prompt estimate plus room for a full batch of records, for rate limiting"""
+    prompt = sum(estimate_tokens(message["content"]) for message in messages)
+    return prompt + COMPLETION_TOKEN_ESTIMATE
+
+
+def _cached_response(messages, on_record, call, started):
+    cached = llm_cache.get(MODEL, TEMPERATURE, messages)
+    if cached is not None:
+        print("♻️ LLM cache hit")
+        call["cache_hit"] = True
+        call["latency_seconds"] = 0.0
+        if on_record is not None:
+            _apply_parser(call, _emit_parsed(cached, on_record))
+        _log_call(call, started)
+    return cached
+
+
+def _finish_call(messages, content, usage, estimated, call, started):
+    _apply_usage(call, usage)
+    get_scheduler().settle(estimated, getattr(usage, "total_tokens", 0) or 0)
+    llm_cache.put(MODEL, TEMPERATURE, messages, content)
+    _log_call(call, started)
+
+
+def _retry_delay(error, attempt):
+    """Seconds to wait before retrying after `error`, or None if it is not retryable"""
+    if isinstance(error, RateLimitError):
+        hint = retry_after_seconds(error)
+        delay = hint if hint is not None else backoff_delay(attempt)
+        # Rate limits are per API key, so hold every job, not just this call
+        get_scheduler().pause(delay)
+        print(f"⚠️ Rate limited (429). Retrying in {delay:.1f}s...")
+        return delay
+    if isinstance(error, (APIConnectionError, InternalServerError)):
+        hint = retry_after_seconds(error)
+        delay = hint if hint is not None else backoff_delay(attempt)
+        print(f"⚠️ {type(error).__name__}: {error}. Retrying in {delay:.1f}s...")
+        return delay
+    return None
+
+
+class _AttemptRecords:
+    """
+    on_record wrapper for a call that may be retried
+
+    A streamed attempt that fails partway has already delivered some records;
+    the retry's response repeats them. Those repeats are dropped (once per
+    earlier delivery) so the caller does not count them as returned twice.
+    """
+
+    def __init__(self, on_record):
+        self.on_record = on_record
+        self._earlier = {}
+        self._current = []
+
+    def __call__(self, record):
+        name = record.get("Name") if isinstance(record, dict) else None
+        if name is not None and self._earlier.get(name):
+            self._earlier[name] -= 1
+            self._current.append(name)
+            return
+        if name is not None:
+            self._current.append(name)
+        self.on_record(record)
+
+    def next_attempt(self):
+        for name in self._current:
+            self._earlier[name] = self._earlier.get(name, 0) + 1
+        self._current = []
+
+
+def _fail_call(call, started, error):
+    call["error"] = f"{type(error).__name__}: {error}" if isinstance(error, Exception) else str(error)
+    _log_call(call, started)
+
+
+def call_openai(prompt, max_retries=None, on_record=None, kind="extraction"):
+    """
+    Send a prompt (string or chat messages) and return the response text
+
+    Requests go through the process-wide rate-limit scheduler; 429s, timeouts,
+    connection and server errors are retried with backoff (honoring any
+    retry-after hint). If on_record is given, every JSON record in the
+    response is passed to it; with LLM_STREAMING on, records are delivered
+    while the response streams. Each call is logged under `kind` in the job
+    stats and llm_metrics.
+    """
+    messages = _as_messages(prompt)
+    call = _new_call(kind, messages)
+    started = time.perf_counter()
+    cached = _cached_response(messages, on_record, call, started)
+    if cached is not None:
+        return cached
+
+    scheduler = get_scheduler()
+    estimated = _estimate_request_tokens(messages)
+    max_retries = max_retries or OPENAI_MAX_RETRIES
+    if on_record is not None:
+        on_record = _AttemptRecords(on_record)
     for attempt in range(max_retries):
+        waited = time.perf_counter()
+        scheduler.acquire(estimated)
+        sent = time.perf_counter()
+        call["queue_seconds"] += sent - waited
         try:
-            response = client.chat.completions.create(
-                model="gpt-4o",
-                messages=[{"role": "user", "content": prompt}],
-                temperature=0.2,
-            )
-            return response.choices[0].message.content
+            content, usage = _complete(messages, on_record, call)
         except Exception as e:
-            if "APIConnectionError" in str(type(e)):
-                print(f"⚠️ Connection error: {e}. Retrying in 5s...")
-                time.sleep(5)
-            else:
+            delay = _retry_delay(e, attempt)
+            if delay is None:
                 print(f"❌ Unexpected error: {e}")
+                _fail_call(call, started, e)
                 raise
+            call["retries"] += 1
+            scheduler.note_retry()
+            if on_record is not None:
+                on_record.next_attempt()
+            time.sleep(delay)
+            continue
+        finally:
+            scheduler.release()
+        call["latency_seconds"] = round(time.perf_counter() - sent, 3)
+        _finish_call(messages, content, usage, estimated, call, started)
+        return content
+    _fail_call(call, started, "failed after multiple retries")
     raise Exception("❌ Failed after multiple retries.")
 
-def extract_json_from_gpt_response(response_text):
-    try:
-        # Try loading directly if it's a clean list
-        if response_text.strip().startswith('['):
-            return json.loads(response_text)
 
-        # Try to extract a JSON block inside markdown or text
-        match = re.search(r'```json\s*(\[.*?\])\s*```', response_text, re.DOTALL)
-        if match:
-            return json.loads(match.group(1))
-
-        # Try to find a fallback list of dicts
-        match = re.search(r'(\[\s*{.*?}\s*\])', response_text, re.DOTALL)
-        if match:
-            return json.loads(match.group(1))
-
-        print("⚠️ JSON not found in response")
-        return []
-    except Exception as e:
-        print("⚠️ JSON parsing error:", e)
-        return []
+async def call_openai_async(async_client, prompt, max_retries=None, on_record=None, kind="extraction"):
+    """Async variant of call_openai"""
+    messages = _as_messages(prompt)
+    call = _new_call(kind, messages)
+    started = time.perf_counter()
+    cached = _cached_response(messages, on_record, call, started)
+    if cached is not None:
+        return cached
 
+    scheduler = get_scheduler()
+    estimated = _estimate_request_tokens(messages)
+    max_retries = max_retries or OPENAI_MAX_RETRIES
+    if on_record is not None:
+        on_record = _AttemptRecords(on_record)
+    for attempt in range(max_retries):
+        waited = time.perf_counter()
+        await scheduler.acquire_async(estimated)
+        sent = time.perf_counter()
+        call["queue_seconds"] += sent - waited
+        try:
+            content, usage = await _complete_async(async_client, messages, on_record, call)
+        except Exception as e:
+            delay = _retry_delay(e, attempt)
+            if delay is None:
+                print(f"❌ Unexpected error: {e}")
+                _fail_call(call, started, e)
+                raise
+            call["retries"] += 1
+            scheduler.note_retry()
+            if on_record is not None:
+                on_record.next_attempt()
+            await asyncio.sleep(delay)
+            continue
+        finally:
+            scheduler.release()
+        call["latency_seconds"] = round(time.perf_counter() - sent, 3)
+        _finish_call(messages, content, usage, estimated, call, started)
+        return content
+    _fail_call(call, started, "failed after multiple retries")
+    raise Exception("❌ Failed after multiple retries.")
 
-def generate_all_records(drawing_text):
+def generate_records_sequential(drawing_text):
     all_records = []
     seen_names = set()
     iteration = 0
 
     while True:
-        if iteration == 0:
-            prompt = generate_initial_prompt(drawing_text, max_rows=MAX_ROWS)
-        else:
-            prompt = generate_continuation_prompt(drawing_text, list(seen_names), max_rows=MAX_ROWS)
+        prompt = build_extraction_messages(drawing_text, list(seen_names), max_rows=MAX_ROWS)
+        batch = {"returned": 0, "new": 0}
+
+        def accept(record):
+            # Validate, deduplicate and hand on each record as soon as it arrives
+            if not isinstance(record, dict) or "Name" not in record:
+                return
+            batch["returned"] += 1
+            if record["Name"] in seen_names:
+                return
+            seen_names.add(record["Name"])
+            all_records.append(record)
+            batch["new"] += 1
+            _emit_record(record)
 
         print(f"\n📤 Calling GPT for batch {iteration + 1}...")
         try:
-            response = call_openai(prompt)
+            call_openai(prompt, on_record=accept)
         except Exception as e:
             print(f"❌ Error during GPT call: {e}")
             break
 
-        raw_text = response
-        print("📥 Raw GPT response:")
-        print(raw_text)
+        _record_batch(batch["returned"], batch["new"])
 
-        # Try parsing using the existing extraction function
-        records = extract_json_from_gpt_response(raw_text)
-        if not records:
+        if not batch["returned"]:
             print("❌ Failed to parse GPT output.")
             break
 
-        # Validate and filter
-        valid_batch = [r for r in records if isinstance(r, dict) and "Name" in r]
-        new_names = [r["Name"] for r in valid_batch if r["Name"] not in seen_names]
-
-        if not new_names:
+        if not batch["new"]:
             print("✅ No new valid records. Finishing.")
             break
 
-        seen_names.update(new_names)
-        all_records.extend(valid_batch)
-        print(f"✅ Added {len(new_names)} new records.")
+        print(f"✅ Added {batch['new']} new records.")
         iteration += 1
 
-    return all_records 
\ No newline at end of file
+    return all_records
+
+
+def parse_partitions(response_text):
+    """Parse the planner's JSON array of subset descriptions"""
+    text = response_text.strip()
+    match = re.search(r'```(?:json)?\s*(\[.*?\])\s*```', text, re.DOTALL)
+    if match:
+        text = match.group(1)
+    try:
+        partitions = json.loads(text)
+    except json.JSONDecodeError:
+        match = re.search(r'(\[.*\])', text, re.DOTALL)
+        if not match:
+            return []
+        try:
+            partitions = json.loads(match.group(1))
+        except json.JSONDecodeError:
+            return []
+    if not isinstance(partitions, list):
+        return []
+    return [p.strip() for p in partitions if isinstance(p, str) and p.strip()]
+
+
+async def _extract_partition(async_client, drawing_text, partition, semaphore, merged, seen_names, label=None):
+    """
+    Page through one subset of the record space, merging records as they arrive
+
+    Returns:
+        Dict with the number of batches requested and records returned/added
+    """
+    partition_names = set()
+    iteration = 0
+    coverage = {"batches": 0, "records_returned": 0, "records_added": 0}
+    label = label or partition or "all records"
+
+    while True:
+        prompt = build_extraction_messages(drawing_text, list(partition_names), max_rows=MAX_ROWS, partition=partition)
+        batch = {"returned": 0, "new": 0, "added": 0}
+
+        def accept(record):
+            if not isinstance(record, dict) or "Name" not in record:
+                return
+            batch["returned"] += 1
+            if record["Name"] in partition_names:
+                return
+            partition_names.add(record["Name"])
+            batch["new"] += 1
+
+            # Merge into the shared result, dropping names another subset produced
+            if record["Name"] not in seen_names:
+                seen_names.add(record["Name"])
+                merged.append(record)
+                batch["added"] += 1
+                _emit_record(record)
+
+        print(f"\n📤 Calling GPT for batch {iteration + 1} of [{label}]...")
+        try:
+            async with semaphore:
+                await call_openai_async(async_client, prompt, on_record=accept)
+        except Exception as e:
+            print(f"❌ Error during GPT call for [{label}]: {e}")
+            break
+
+        _record_batch(batch["returned"], batch["added"])
+        coverage["batches"] += 1
+        coverage["records_returned"] += batch["returned"]
+        coverage["records_added"] += batch["added"]
+
+        if not batch["returned"]:
+            print(f"❌ Failed to parse GPT output for [{label}].")
+            break
+
+        if not batch["new"]:
+            print(f"✅ No new valid records for [{label}]. Finishing.")
+            break
+
+        print(f"✅ Added {batch['added']} new records from [{label}] ({len(merged)} total).")
+        iteration += 1
+
+    return coverage
+
+
+async def generate_all_records_async(drawing_text, parallelism=None):
+    """
+    Extract records with concurrent, disjoint batch requests
+
+    One planning call splits the record space into disjoint subsets (e.g. by
+    dash size or material code); each subset is then paged through
+    independently, with at most `parallelism` requests in flight. Records are
+    merged and deduplicated by Name as they arrive.
+    """
+    parallelism = parallelism or LLM_PARALLELISM
+    semaphore = asyncio.Semaphore(parallelism)
+    merged = []
+    seen_names = set()
+
+    async with AsyncOpenAI(api_key=os.getenv("OPENAI_API_KEY"), base_url=OPENAI_BASE_URL, max_retries=0) as async_client:
+        print("\n🗺️ Planning record subsets...")
+        try:
+            plan_response = await call_openai_async(
+                async_client, generate_partition_prompt(drawing_text, max_partitions=LLM_MAX_PARTITIONS),
+                kind="partition_plan"
+            )
+            partitions = parse_partitions(plan_response)[:LLM_MAX_PARTITIONS]
+        except Exception as e:
+            print(f"⚠️ Planning failed ({e}); extracting without subsets.")
+            partitions = []
+
+        if len(partitions) <= 1:
+            partitions = [None]
+        print(f"🧩 Extracting {len(partitions)} subset(s) with up to {parallelism} concurrent requests")
+
+        await asyncio.gather(*[
+            _extract_partition(async_client, drawing_text, partition, semaphore, merged, seen_names)
+            for partition in partitions
+        ])
+
+    return merged
+
+
+async def generate_records_chunked_async(drawing_text, chunk_tokens=None, parallelism=None):
+    """
+    Map-reduce extraction for documents too long for a single prompt
+
+    The text is split along page boundaries (and section headings inside
+    oversized pages) into chunks of at most `chunk_tokens`; each chunk is
+    paged through independently with at most `parallelism` requests in
+    flight, and records are merged and deduplicated by Name. Per-chunk
+    coverage is appended to the job stats under "chunks".
+    """
+    chunk_tokens = chunk_tokens or LLM_CHUNK_TOKENS
+    parallelism = parallelism or max(1, LLM_PARALLELISM)
+    semaphore = asyncio.Semaphore(parallelism)
+    merged = []
+    seen_names = set()
+
+    chunks = split_into_chunks(drawing_text, chunk_tokens)
+    print(f"🧩 Extracting {len(chunks)} chunk(s) of up to ~{chunk_tokens} tokens with up to {parallelism} concurrent requests")
+
+    async def run_chunk(chunk):
+        label = f"chunk {chunk['index'] + 1}, pages {chunk['pages'][0]}-{chunk['pages'][1]}"
+        coverage = await _extract_partition(async_client, chunk["text"], None, semaphore, merged, seen_names, label=label)
+        coverage.update({
+            "chunk": chunk["index"],
+            "pages": chunk["pages"],
+            "chars": len(chunk["text"]),
+            "est_tokens": chunk["est_tokens"],
+        })
+        return coverage
+
+    async with AsyncOpenAI(api_key=os.getenv("OPENAI_API_KEY"), base_url=OPENAI_BASE_URL, max_retries=0) as async_client:
+        coverage = await asyncio.gather(*[run_chunk(chunk) for chunk in chunks])
+
+    stats = _job_stats.get()
+    if stats is not None:
+        stats["chunks"].extend(coverage)
+    for entry in coverage:
+        if not entry["records_added"]:
+            print(f"⚠️ Chunk {entry['chunk'] + 1} (pages {entry['pages'][0]}-{entry['pages'][1]}) contributed no new records")
+
+    return merged
+
+
+def extract_json_object_from_gpt_response(response_text):
+    """Parse a single JSON object from a response (bare, fenced or embedded)"""
+    text = response_text.strip()
+    match = re.search(r'```(?:json)?\s*(\{.*\})\s*```', text, re.DOTALL)
+    if match:
+        text = match.group(1)
+    try:
+        return json.loads(text)
+    except json.JSONDecodeError:
+        start, end = text.find('{'), text.rfind('}')
+        if start == -1 or end <= start:
+            return None
+        try:
+            return json.loads(text[start:end + 1])
+        except json.JSONDecodeError:
+            return None
+
+
+def generate_records_from_rules(drawing_text):
+    """
+    Two-phase extraction: one LLM call for the construction rules, then a
+    local combinatorial expansion into every record
+
+    Returns:
+        List of records, or None if the rules could not be extracted or
+        expanded (callers should fall back to batch extraction)
+    """
+    print("\n📤 Calling GPT for part-number construction rules...")
+    try:
+        response = call_openai(generate_rules_prompt(drawing_text), kind="rules")
+    except Exception as e:
+        print(f"❌ Error during GPT call: {e}")
+        return None
+
+    rules = extract_json_object_from_gpt_response(response)
+    if rules is None:
+        print("❌ Failed to parse construction rules.")
+        return None
+
+    try:
+        records = expand_rules(rules)
+        combinations = count_combinations(rules)
+    except RuleError as e:
+        print(f"❌ Invalid construction rules: {e}")
+        return None
+
+    print(f"✅ Expanded {combinations} combinations into {len(records)} records.")
+    return records or None
+
+
+def generate_all_records(drawing_text, mode=None, stats=None, on_record=None):
+    """
+    Extract all part records
+
+    Args:
+        drawing_text: Reconstructed drawing text
+        mode: "batches" (page records out of the model, concurrently when
+            LLM_PARALLELISM > 1, chunk by chunk when the text is longer than
+            LLM_CHUNK_TOKENS) or "rules" (extract rules once and expand
+            locally, falling back to batches on failure). Defaults to
+            LLM_EXTRACTION_MODE.
+        stats: Optional dict (from new_job_stats) that receives call, token
+            and duplicate counts for this extraction
+        on_record: Optional callback receiving each accepted (validated,
+            deduplicated) record as soon as it arrives
+    """
+    stats_token = _job_stats.set(stats)
+    sink_token = _record_sink.set(on_record)
+    try:
+        return _generate_all_records(drawing_text, mode)
+    finally:
+        _record_sink.reset(sink_token)
+        _job_stats.reset(stats_token)
+
+
+def _generate_all_records(drawing_text, mode=None):
+    mode = mode or LLM_EXTRACTION_MODE
+    if mode not in EXTRACTION_MODES:
+        raise ValueError(f"Unknown extraction mode {mode!r}; expected one of {EXTRACTION_MODES}")
+
+    if mode == "rules":
+        records = generate_records_from_rules(drawing_text)
+        if records is not None:
+            for record in records:
+                _emit_record(record)
+            return records
+        print("⚠️ Rule expansion failed; falling back to batch extraction.")
+
+    chunked = LLM_CHUNK_TOKENS > 0 and estimate_tokens(drawing_text) > LLM_CHUNK_TOKENS
+    if LLM_PARALLELISM <= 1 and not chunked:
+        return generate_records_sequential(drawing_text)
+
+    try:
+        asyncio.get_running_loop()
+    except RuntimeError:
+        if chunked:
+            return asyncio.run(generate_records_chunked_async(drawing_text))
+        return asyncio.run(generate_all_records_async(drawing_text))
+
+    # Called from inside an event loop; asyncio.run is not allowed here
+    return generate_records_sequential(drawing_text)
@@ -0,0 +1,276 @@
+"""
+Process-wide OpenAI request scheduler
+
+Every chat completion (from any job, thread or event loop) takes a slot
+from a shared scheduler before it is sent. The scheduler keeps two token
+buckets, one for requests per minute and one for tokens per minute, and
+serves waiting requests round-robin across jobs so one large document
+cannot starve the others. When the API answers 429, the retry hint pauses
+the whole scheduler, because rate limits apply to the API key, not to the
+individual job.
+"""
+
+import asyncio
+import os
+import random
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+from email.utils import parsedate_to_datetime
+
+# Rate limits for the API key (overridable from the environment)
+OPENAI_RPM = int(os.getenv("OPENAI_RPM", "500"))
+OPENAI_TPM = int(os.getenv("OPENAI_TPM", "30000"))
+# Retry policy: exponential backoff with full jitter, capped
+OPENAI_MAX_RETRIES = int(os.getenv("OPENAI_MAX_RETRIES", "6"))
+OPENAI_BACKOFF_BASE = float(os.getenv("OPENAI_BACKOFF_BASE", "1"))
+OPENAI_BACKOFF_MAX = float(os.getenv("OPENAI_BACKOFF_MAX", "60"))
+
+# Job the current context is extracting for (used for fairness)
+_current_job = ContextVar("openai_scheduler_job", default="default")
+
+
+@contextmanager
+def job(job_id: str):
+    """Attribute requests made inside a `with` block to job_id"""
+    token = _current_job.set(job_id or "default")
+    try:
+        yield
+    finally:
+        _current_job.reset(token)
+
+
+def current_job() -> str:
+    return _current_job.get()
+
+
+class _TokenBucket:
+    """Capacity refills continuously at capacity per minute"""
+
+    def __init__(self, per_minute: int):
+        self.capacity = float(max(1, per_minute))
+        self.level = self.capacity
+        self.rate = self.capacity / 60.0
+        self.updated = time.monotonic()
+
+    def refill(self, now: float):
+        self.level = min(self.capacity, self.level + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def seconds_until(self, amount: float) -> float:
+        missing = min(amount, self.capacity) - self.level
+        return max(0.0, missing / self.rate)
+
+
+class _Waiter:
+    __slots__ = ("job", "tokens", "granted", "enqueued")
+
+    def __init__(self, job_id, tokens):
+        self.job = job_id
+        self.tokens = tokens
+        self.granted = False
+        self.enqueued = time.monotonic()
+
+
+class RateLimitScheduler:
+    """
+    Token-bucket scheduler shared by every OpenAI call in the process
+
+    Args:
+        rpm: Requests per minute allowed for the API key
+        tpm: Tokens per minute allowed for the API key
+    """
+
+    def __init__(self, rpm: int = OPENAI_RPM, tpm: int = OPENAI_TPM):
+        self.requests = _TokenBucket(rpm)
+        self.tokens = _TokenBucket(tpm)
+        self._cond = threading.Condition()
+        self._queues = {}
+        self._order = deque()
+        self._paused_until = 0.0
+        self.in_flight = 0
+        self.stats_counters = {
+            "granted": 0,
+            "rate_limited": 0,
+            "retries": 0,
+            "wait_seconds": 0.0,
+        }
+
+    def _enqueue(self, tokens: int) -> _Waiter:
+        waiter = _Waiter(_current_job.get(), tokens)
+        with self._cond:
+            if waiter.job not in self._queues:
+                self._queues[waiter.job] = deque()
+                self._order.append(waiter.job)
+            self._queues[waiter.job].append(waiter)
+        return waiter
+
+    def _dispatch(self) -> float:
+        """Grant slots round-robin across jobs; return seconds until the next grant is possible"""
+        now = time.monotonic()
+        if now < self._paused_until:
+            return self._paused_until - now
+        self.requests.refill(now)
+        self.tokens.refill(now)
+
+        while self._order:
+            job_id = self._order[0]
+            head = self._queues[job_id][0]
+            cost = min(head.tokens, self.tokens.capacity)
+            delay = max(self.requests.seconds_until(1), self.tokens.seconds_until(cost))
+            if delay > 0:
+                return delay
+
+            self.requests.level -= 1
+            self.tokens.level -= cost
+            head.granted = True
+            self.in_flight += 1
+            self.stats_counters["granted"] += 1
+            self.stats_counters["wait_seconds"] += now - head.enqueued
+
+            # Move this job to the back of the rotation
+            self._queues[job_id].popleft()
+            self._order.popleft()
+            if self._queues[job_id]:
+                self._order.append(job_id)
+            else:
+                del self._queues[job_id]
+            self._cond.notify_all()
+        return 0.0
+
+    def _cancel(self, waiter: _Waiter):
+        with self._cond:
+            queue = self._queues.get(waiter.job)
+            if queue is not None and waiter in queue:
+                queue.remove(waiter)
+                if not queue:
+                    del self._queues[waiter.job]
+                    self._order.remove(waiter.job)
+            elif waiter.granted:
+                self.release()
+            self._cond.notify_all()
+
+    def acquire(self, tokens: int):
+        """Block until a request estimated at `tokens` may be sent"""
+        waiter = self._enqueue(tokens)
+        try:
+            with self._cond:
+                while not waiter.granted:
+                    delay = self._dispatch()
+                    if waiter.granted:
+                        break
+                    self._cond.wait(timeout=max(delay, 0.01) if self._order else None)
+        except BaseException:
+            self._cancel(waiter)
+            raise
+
+    async def acquire_async(self, tokens: int):
+        """Async variant of acquire that never blocks the event loop"""
+        waiter = self._enqueue(tokens)
+        try:
+            while True:
+                with self._cond:
+                    delay = self._dispatch()
+                    if waiter.granted:
+                        return
+                # Other threads may grant us a slot first, so poll at least every 100ms
+                await asyncio.sleep(min(max(delay, 0.01), 0.1))
+        except BaseException:
+            self._cancel(waiter)
+            raise
+
+    def release(self):
+        with self._cond:
+            self.in_flight = max(0, self.in_flight - 1)
+            self._cond.notify_all()
+
+    def settle(self, estimated: int, actual: int):
+        """Correct the token bucket once the real usage of a request is known"""
+        if not actual:
+            return
+        with self._cond:
+            self.tokens.level -= actual - min(estimated, self.tokens.capacity)
+
+    def pause(self, seconds: float):
+        """Hold every waiting request for `seconds` (e.g. after a 429)"""
+        with self._cond:
+            self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+            self.stats_counters["rate_limited"] += 1
+            self._cond.notify_all()
+
+    def note_retry(self):
+        with self._cond:
+            self.stats_counters["retries"] += 1
+
+    def stats(self) -> dict:
+        with self._cond:
+            now = time.monotonic()
+            self.requests.refill(now)
+            self.tokens.refill(now)
+            waiting = {job_id: len(queue) for job_id, queue in self._queues.items()}
+            counters = dict(self.stats_counters)
+            granted = counters["granted"]
+            return {
+                "queue_depth": sum(waiting.values()),
+                "waiting_by_job": waiting,
+                "in_flight": self.in_flight,
+                "paused_seconds": round(max(0.0, self._paused_until - now), 2),
+                "rpm_limit": int(self.requests.capacity),
+                "tpm_limit": int(self.tokens.capacity),
+                "requests_available": round(self.requests.level, 1),
+                "tokens_available": round(self.tokens.level),
+                "granted": granted,
+                "rate_limited": counters["rate_limited"],
+                "retries": counters["retries"],
+                "avg_wait_seconds": round(counters["wait_seconds"] / granted, 3) if granted else 0.0,
+            }
+
+
+def retry_after_seconds(error):
+    """Server retry hint from a rate-limit/overload error, or None"""
+    response = getattr(error, "response", None)
+    headers = getattr(response, "headers", None)
+    if not headers:
+        return None
+
+    value = headers.get("retry-after-ms")
+    if value:
+        try:
+            return float(value) / 1000
+        except ValueError:
+            pass
+
+    value = headers.get("retry-after")
+    if value:
+        try:
+            return float(value)
+        except ValueError:
+            try:
+                return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+            except (TypeError, ValueError):
+                pass
+    return None
+
+
+def backoff_delay(attempt: int) -> float:
+    """Exponential backoff with full jitter for the given (0-based) attempt"""
+    return random.uniform(0, min(OPENAI_BACKOFF_MAX, OPENAI_BACKOFF_BASE * 2 ** attempt))
+
+
+_scheduler = None
+_scheduler_lock = threading.Lock()
+
+
+def get_scheduler() -> RateLimitScheduler:
+    """Return the process-wide scheduler, creating it on first use"""
+    global _scheduler
+    with _scheduler_lock:
+        if _scheduler is None:
+            _scheduler = RateLimitScheduler()
+        return _scheduler
+
+
+def scheduler_stats() -> dict:
+    return get_scheduler().stats()
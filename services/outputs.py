@@ -0,0 +1,228 @@
+"""
+Lazily materialized job outputs
+
+A job's critical path only stores canonical data in its result directory:
+
+    results/<upload_id>/.canonical/ocr.json        compact OCR export
+    results/<upload_id>/.canonical/records.ndjson  accepted part records
+    results/<upload_id>/.canonical/manifest.json   base name and record formats
+
+The user-facing files (<base>_extracted.txt, <base>_extracted.md,
+pretty-printed <base>_ocr.json and <base>_parts.<format>) are generated from
+that data the first time they are requested and kept next to it as a cache.
+A cached file is regenerated when its source is newer (e.g. records still
+arriving, or a reprocess), and everything is removed with the result
+directory by the normal cleanup.
+
+LAZY_OUTPUTS=0 restores eager writing of every output during the job.
+"""
+
+import json
+import os
+import shutil
+import threading
+from pathlib import Path
+
+from .record_writer import EXPORT_FORMATS, WRITERS, iter_spool, order_columns, parse_formats
+from .text_constructor import reconstruct_text
+from .text_constructor_md import json_to_markdown
+
+LAZY_OUTPUTS = os.getenv("LAZY_OUTPUTS", "1") not in ("0", "false", "False")
+
+CANONICAL_DIR = ".canonical"
+OCR_FILE = "ocr.json"
+RECORDS_FILE = "records.ndjson"
+MANIFEST_FILE = "manifest.json"
+
+_locks = {}
+_locks_guard = threading.Lock()
+_stats = {"materialized": 0, "cache_hits": 0}
+
+
+def canonical_dir(result_dir) -> Path:
+    return Path(result_dir) / CANONICAL_DIR
+
+
+def ocr_source(result_dir) -> Path:
+    return canonical_dir(result_dir) / OCR_FILE
+
+
+def records_source(result_dir) -> Path:
+    return canonical_dir(result_dir) / RECORDS_FILE
+
+
+def _write_json_atomically(path: Path, data, **dump_options):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = path.with_suffix(f".{threading.get_ident()}.tmp")
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(data, f, **dump_options)
+    os.replace(tmp_path, path)
+
+
+def write_canonical_ocr(result_dir, json_output: dict):
+    """Store the OCR export compactly as the source of the text outputs"""
+    _write_json_atomically(ocr_source(result_dir), json_output, separators=(",", ":"))
+
+
+def read_manifest(result_dir) -> dict:
+    try:
+        with open(canonical_dir(result_dir) / MANIFEST_FILE, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return {}
+
+
+def register(result_dir, base_name: str, formats=None):
+    """Record the output file stem and the record formats the job advertises"""
+    manifest = read_manifest(result_dir)
+    manifest["base_name"] = base_name
+    manifest["record_formats"] = parse_formats(formats)
+    _write_json_atomically(canonical_dir(result_dir) / MANIFEST_FILE, manifest)
+
+
+def load_ocr(result_dir):
+    """Canonical OCR export of a job (or an eagerly written _ocr.json), else None"""
+    candidates = [ocr_source(result_dir)] + sorted(Path(result_dir).glob("*_ocr.json"))
+    for path in candidates:
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            continue
+    return None
+
+
+# ---------------------------------------------------------------------------
+# Generators
+# ---------------------------------------------------------------------------
+
+def _load_ocr_file(source: Path) -> dict:
+    with open(source, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def _write_text(source: Path, target: Path):
+    with open(target, "w", encoding="utf-8") as f:
+        f.write(reconstruct_text(_load_ocr_file(source)))
+
+
+def _write_markdown(source: Path, target: Path):
+    with open(target, "w", encoding="utf-8") as f:
+        f.write(json_to_markdown(_load_ocr_file(source)))
+
+
+def _write_pretty_json(source: Path, target: Path):
+    with open(target, "w", encoding="utf-8") as f:
+        json.dump(_load_ocr_file(source), f, indent=2)
+
+
+def _records_writer(fmt: str):
+    def write(source: Path, target: Path):
+        if fmt == "ndjson":
+            shutil.copyfile(source, target)
+            return
+        # First pass discovers the columns, second pass streams the rows
+        columns = []
+        known = set()
+        for record in iter_spool(str(source)):
+            for key in record:
+                if key not in known:
+                    known.add(key)
+                    columns.append(key)
+        WRITERS[fmt](iter_spool(str(source)), order_columns(columns), str(target))
+    return write
+
+
+def _generator(result_dir, filename: str):
+    """(source path, writer) for a derivable output name, else None"""
+    base_name = read_manifest(result_dir).get("base_name")
+    if not base_name or not filename.startswith(base_name):
+        return None
+    suffix = filename[len(base_name):]
+
+    if suffix == "_extracted.txt":
+        return ocr_source(result_dir), _write_text
+    if suffix == "_extracted.md":
+        return ocr_source(result_dir), _write_markdown
+    if suffix == "_ocr.json":
+        return ocr_source(result_dir), _write_pretty_json
+    for fmt in EXPORT_FORMATS:
+        if suffix == f"_parts.{fmt}":
+            return records_source(result_dir), _records_writer(fmt)
+    return None
+
+
+def output_names(result_dir) -> list:
+    """Every output file the job can provide, materialized or not"""
+    manifest = read_manifest(result_dir)
+    base_name = manifest.get("base_name")
+    if not base_name:
+        return []
+    names = []
+    if ocr_source(result_dir).exists():
+        names += [f"{base_name}_extracted.txt", f"{base_name}_extracted.md", f"{base_name}_ocr.json"]
+    if records_source(result_dir).exists():
+        names += [f"{base_name}_parts.{fmt}" for fmt in manifest.get("record_formats", ["xlsx"])]
+    return names
+
+
+def pending_outputs(result_dir) -> list:
+    """Advertised outputs that have not been generated yet"""
+    return [name for name in output_names(result_dir) if not (Path(result_dir) / name).exists()]
+
+
+def _lock_for(path: Path) -> threading.Lock:
+    with _locks_guard:
+        return _locks.setdefault(str(path), threading.Lock())
+
+
+def materialize(result_dir, filename: str):
+    """
+    Return the path of an output file, generating it first if needed
+
+    Args:
+        result_dir: Job result directory
+        filename: Output file name (no directories)
+
+    Returns:
+        Path to an up-to-date file, or None if it neither exists nor can be
+        generated from the job's canonical data
+    """
+    target = Path(result_dir) / filename
+    generator = _generator(result_dir, filename)
+    if generator is None or not generator[0].exists():
+        return target if target.is_file() else None
+
+    source, write = generator
+    with _lock_for(target):
+        if target.exists() and target.stat().st_mtime >= source.stat().st_mtime:
+            with _locks_guard:
+                _stats["cache_hits"] += 1
+            return target
+
+        tmp_path = target.with_name(f".{target.name}.{threading.get_ident()}.tmp")
+        try:
+            write(source, tmp_path)
+            os.replace(tmp_path, target)
+        finally:
+            if tmp_path.exists():
+                tmp_path.unlink()
+
+    with _locks_guard:
+        _stats["materialized"] += 1
+        # Forget the lock once the file exists so the table does not grow forever
+        _locks.pop(str(target), None)
+    print(f"🛠️ Generated {target.name} on demand")
+    return target
+
+
+def materialize_all(result_dir) -> list:
+    """Generate every advertised output (e.g. before archiving a job)"""
+    return [path for path in (materialize(result_dir, name) for name in output_names(result_dir)) if path]
+
+
+def stats() -> dict:
+    with _locks_guard:
+        counters = dict(_stats)
+    counters["lazy"] = LAZY_OUTPUTS
+    return counters
@@ -0,0 +1,286 @@
+"""
+On-demand page images and OCR for the OCR viewer
+
+The viewer page itself does no work; the browser asks for the page it is
+showing and this module produces just that:
+
+- a small thumbnail per page, for navigation and as a placeholder
+- square tiles of a multi-resolution pyramid (one level per TILE_ZOOMS
+  entry), each rasterized with fitz from just its clip of the page, so
+  zooming into a large drawing only renders the visible tiles
+- whole page images at a requested zoom (snapped to ZOOM_STEP)
+- that page's OCR words, taken from the job's stored OCR when there is one,
+  else from the OCR cache, else by OCR'ing only this page
+
+Images are encoded as WebP, JPEG or PNG. Everything is cached under
+results/<upload_id>/.viewer/ and removed with the result directory. Word
+boxes are drawn by the browser from the geometry.
+"""
+
+import hashlib
+import io
+import json
+import os
+import threading
+from pathlib import Path
+
+import fitz  # PyMuPDF
+
+from . import ocr_cache, outputs
+from .ocr_workers import get_executor, ocr_pages
+
+VIEWER_DIR = ".viewer"
+MIN_ZOOM = 0.25
+MAX_ZOOM = 4.0
+ZOOM_STEP = 0.25
+
+# Tile pyramid: edge length in pixels and the zoom (vs. 72 DPI) of each level
+VIEWER_TILE_SIZE = int(os.getenv("VIEWER_TILE_SIZE", "256"))
+TILE_ZOOMS = (0.5, 1.0, 2.0, 4.0)
+# Longest side of page thumbnails, in pixels
+THUMBNAIL_PX = 240
+# Lossy encoder quality for WebP/JPEG images
+VIEWER_IMAGE_QUALITY = int(os.getenv("VIEWER_IMAGE_QUALITY", "80"))
+# format -> (Pillow encoder, media type); PNG is encoded by fitz
+IMAGE_FORMATS = {
+    "webp": ("WEBP", "image/webp"),
+    "jpeg": ("JPEG", "image/jpeg"),
+    "png": (None, "image/png"),
+}
+
+_locks = {}
+_locks_guard = threading.Lock()
+_stats = {"rendered": 0, "tiles_rendered": 0, "cache_hits": 0, "pages_ocrd": 0}
+
+
+def viewer_dir(result_dir) -> Path:
+    return Path(result_dir) / VIEWER_DIR
+
+
+def normalize_zoom(zoom: float) -> float:
+    """Clamp a zoom factor to [MIN_ZOOM, MAX_ZOOM] and snap it to ZOOM_STEP"""
+    zoom = min(MAX_ZOOM, max(MIN_ZOOM, float(zoom)))
+    return round(zoom / ZOOM_STEP) * ZOOM_STEP
+
+
+def _lock_for(path: Path) -> threading.Lock:
+    with _locks_guard:
+        return _locks.setdefault(str(path), threading.Lock())
+
+
+def _release_lock(path: Path):
+    with _locks_guard:
+        _locks.pop(str(path), None)
+
+
+def _count(counter: str):
+    with _locks_guard:
+        _stats[counter] += 1
+
+
+def document_info(pdf_path, result_dir) -> dict:
+    """Page count, page sizes (PDF points) and content hash of the viewed document"""
+    cache_path = viewer_dir(result_dir) / "document.json"
+    try:
+        with open(cache_path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        pass
+
+    with fitz.open(str(pdf_path)) as pdf_doc:
+        info = {
+            "pages": pdf_doc.page_count,
+            "page_sizes": [[page.rect.width, page.rect.height] for page in pdf_doc],
+        }
+    info["content_hash"] = ocr_cache.hash_file(str(pdf_path))
+    cache_path.parent.mkdir(parents=True, exist_ok=True)
+    _write_atomically(cache_path, lambda f: json.dump(info, f), mode="w")
+    return info
+
+
+def _write_atomically(path: Path, write, mode: str = "wb"):
+    tmp_path = path.with_name(f".{path.name}.{threading.get_ident()}.tmp")
+    try:
+        with open(tmp_path, mode) as f:
+            write(f)
+        os.replace(tmp_path, path)
+    finally:
+        if tmp_path.exists():
+            tmp_path.unlink()
+
+
+def _encode(pix, fmt: str) -> bytes:
+    """Encode an RGB pixmap as webp, jpeg or png"""
+    encoder, _ = IMAGE_FORMATS[fmt]
+    if encoder is None:
+        return pix.tobytes("png")
+    from PIL import Image
+    image = Image.frombytes("RGB", (pix.width, pix.height), pix.samples)
+    buffer = io.BytesIO()
+    image.save(buffer, encoder, quality=VIEWER_IMAGE_QUALITY)
+    return buffer.getvalue()
+
+
+def _cached_image(target: Path, counter: str, render) -> Path:
+    """Return target, producing its bytes with render() first if it is missing"""
+    if target.exists():
+        _count("cache_hits")
+        return target
+
+    with _lock_for(target):
+        if not target.exists():
+            target.parent.mkdir(parents=True, exist_ok=True)
+            data = render()
+            _write_atomically(target, lambda f: f.write(data))
+            _count(counter)
+    _release_lock(target)
+    return target
+
+
+def _render(pdf_path, page_index: int, zoom: float, clip=None):
+    with fitz.open(str(pdf_path)) as pdf_doc:
+        return pdf_doc[page_index].get_pixmap(
+            matrix=fitz.Matrix(zoom, zoom), clip=clip, alpha=False, colorspace=fitz.csRGB
+        )
+
+
+def render_page_image(pdf_path, result_dir, page_index: int, zoom: float = 1.0, fmt: str = "png") -> Path:
+    """
+    Rasterize one page at a zoom factor, reusing an earlier rendering
+
+    Args:
+        pdf_path: Path to the PDF file
+        result_dir: Job result directory (holds the cache)
+        page_index: 0-based page number
+        zoom: Scale relative to the page's 72 DPI size (see normalize_zoom)
+        fmt: Image format (see IMAGE_FORMATS)
+
+    Returns:
+        Path of the cached image
+    """
+    zoom = normalize_zoom(zoom)
+    target = viewer_dir(result_dir) / f"page_{page_index}@{zoom:g}.{fmt}"
+    return _cached_image(target, "rendered", lambda: _encode(_render(pdf_path, page_index, zoom), fmt))
+
+
+def thumbnail_zoom(page_size) -> float:
+    return THUMBNAIL_PX / max(page_size)
+
+
+def render_thumbnail(pdf_path, result_dir, page_index: int, fmt: str = "jpeg") -> Path:
+    """Small whole-page image (longest side THUMBNAIL_PX)"""
+    info = document_info(pdf_path, result_dir)
+    zoom = thumbnail_zoom(info["page_sizes"][page_index])
+    target = viewer_dir(result_dir) / "thumbnails" / f"page_{page_index}.{fmt}"
+    return _cached_image(target, "rendered", lambda: _encode(_render(pdf_path, page_index, zoom), fmt))
+
+
+def tile_grid(page_size, level: int) -> tuple:
+    """(columns, rows) of tiles covering a page at a pyramid level"""
+    zoom = TILE_ZOOMS[level]
+    width, height = page_size
+    columns = max(1, -(-int(round(width * zoom)) // VIEWER_TILE_SIZE))
+    rows = max(1, -(-int(round(height * zoom)) // VIEWER_TILE_SIZE))
+    return columns, rows
+
+
+def render_tile(pdf_path, result_dir, page_index: int, level: int, column: int, row: int,
+                fmt: str = "webp") -> Path:
+    """
+    Rasterize one tile of a page's pyramid, reusing an earlier rendering
+
+    Only the tile's clip of the page is rendered, so tiles of deep zoom
+    levels stay cheap however large the page is.
+
+    Args:
+        pdf_path: Path to the PDF file
+        result_dir: Job result directory (holds the cache)
+        page_index: 0-based page number
+        level: Index into TILE_ZOOMS
+        column, row: Tile position (see tile_grid)
+        fmt: Image format (see IMAGE_FORMATS)
+
+    Returns:
+        Path of the cached tile; edge tiles are cropped to the page
+    """
+    zoom = TILE_ZOOMS[level]
+    target = viewer_dir(result_dir) / "tiles" / f"page_{page_index}" / str(level) / f"{column}_{row}.{fmt}"
+
+    def render():
+        # fitz page rectangles start at (0, 0) in points
+        width, height = document_info(pdf_path, result_dir)["page_sizes"][page_index]
+        span = VIEWER_TILE_SIZE / zoom
+        clip = fitz.Rect(column * span, row * span, min(width, (column + 1) * span), min(height, (row + 1) * span))
+        return _encode(_render(pdf_path, page_index, zoom, clip), fmt)
+
+    return _cached_image(target, "tiles_rendered", render)
+
+
+def image_etag(pdf_path, result_dir, *parts) -> str:
+    """
+    Strong ETag for a viewer image, computed without rendering it
+
+    Images are derived from the PDF content and the rendering settings only,
+    so the same request always yields the same bytes.
+    """
+    content_hash = document_info(pdf_path, result_dir)["content_hash"]
+    key = ":".join(str(part) for part in (content_hash, VIEWER_TILE_SIZE, VIEWER_IMAGE_QUALITY, *parts))
+    return '"' + hashlib.sha256(key.encode("utf-8")).hexdigest()[:32] + '"'
+
+
+def _stored_page(result_dir, pdf_path, page_index: int):
+    """A page from the job's stored OCR or the OCR cache, else None"""
+    ocr_data = outputs.load_ocr(result_dir)
+    if ocr_data is None and ocr_cache.OCR_CACHE_ENABLED:
+        content_hash = document_info(pdf_path, result_dir)["content_hash"]
+        ocr_data = ocr_cache.get(str(pdf_path), content_hash)
+    if ocr_data is None:
+        return None
+    for index, page in enumerate(ocr_data["pages"]):
+        if page.get("page_idx", index) == page_index:
+            return page
+    return None
+
+
+def page_ocr(pdf_path, result_dir, page_index: int) -> dict:
+    """
+    OCR words of one page (a result.export() page dict)
+
+    Reuses the job's stored OCR or the OCR cache; otherwise OCRs just this
+    page and keeps the result for the next request.
+    """
+    cache_path = viewer_dir(result_dir) / f"ocr_{page_index}.json"
+    try:
+        with open(cache_path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        pass
+
+    page = _stored_page(result_dir, pdf_path, page_index)
+    if page is not None:
+        # Keep the page on its own so the full OCR export is not reread next time
+        cache_path.parent.mkdir(parents=True, exist_ok=True)
+        _write_atomically(cache_path, lambda f: json.dump(page, f), mode="w")
+        return page
+
+    with _lock_for(cache_path):
+        if cache_path.exists():
+            with open(cache_path, "r", encoding="utf-8") as f:
+                page = json.load(f)
+        else:
+            executor = get_executor()
+            if executor is None:
+                json_output, _ = ocr_pages(str(pdf_path), [page_index])
+            else:
+                json_output, _ = executor.submit(ocr_pages, str(pdf_path), [page_index]).result()
+            page = json_output["pages"][0]
+            cache_path.parent.mkdir(parents=True, exist_ok=True)
+            _write_atomically(cache_path, lambda f: json.dump(page, f), mode="w")
+            _count("pages_ocrd")
+    _release_lock(cache_path)
+    return page
+
+
+def stats() -> dict:
+    with _locks_guard:
+        return dict(_stats)
@@ -1,42 +1,73 @@
+import gc
 import json
 import os
-from doctr.io import DocumentFile
-from doctr.models import ocr_predictor
+from contextlib import ExitStack
+from . import ocr_cache, outputs
+from .ocr_workers import ocr_document, iter_ocr_windows
+from .pdf_pages import count_pdf_pages
 from .text_constructor import reconstruct_text
 from .text_constructor_md import json_to_markdown
 
-def extract_text_from_pdf(pdf_path, output_dir="outputs"):
+# Documents with more pages than this are OCR'd in streaming mode
+OCR_STREAM_THRESHOLD = int(os.getenv("OCR_STREAM_THRESHOLD", "50"))
+# Number of pages rendered and OCR'd together in streaming mode
+OCR_STREAM_WINDOW = int(os.getenv("OCR_STREAM_WINDOW", "2"))
+
+def extract_text_from_pdf(pdf_path, output_dir="outputs", page_timings=None, streaming=None, content_hash=None,
+                          write_outputs=None, on_pages=None):
     """
     Extract text from PDF using OCR and save to both .txt and .md formats
     
     Args:
         pdf_path (str): Path to the input PDF file
         output_dir (str): Directory to save output files
+        page_timings (list): Optional list that receives per-page OCR timings
+        streaming (bool): Force streaming mode on/off (default: automatic,
+            based on OCR_STREAM_THRESHOLD)
+        content_hash (str): Precomputed SHA-256 of the PDF, if known
+        write_outputs (bool): Write the .txt/.md/.json files now (default:
+            only when LAZY_OUTPUTS is off; otherwise the paths are None and
+            services.outputs generates the files on demand)
+        on_pages (callable): Optional callback receiving (pages_done, pages_total)
+            as OCR progresses
     
     Returns:
         tuple: (text_output, json_output, output_txt_path, output_md_path)
     """
+    if write_outputs is None:
+        write_outputs = not outputs.LAZY_OUTPUTS
+    
     # Create output directory if it doesn't exist
     os.makedirs(output_dir, exist_ok=True)
     
     # Get base name for output files
     base_name = os.path.splitext(os.path.basename(pdf_path))[0]
     
-    # Initialize OCR model
-    print(f"🔍 Loading OCR model...")
-    model = ocr_predictor(pretrained=True)
+    # Reuse a cached OCR result for identical PDFs
+    json_output = None
+    if ocr_cache.OCR_CACHE_ENABLED:
+        content_hash = content_hash or ocr_cache.hash_file(pdf_path)
+        json_output = ocr_cache.get(pdf_path, content_hash)
+        if json_output is not None and on_pages:
+            on_pages(len(json_output["pages"]), len(json_output["pages"]))
     
-    # Load and process PDF
-    print(f"📄 Processing PDF: {pdf_path}")
-    doc = DocumentFile.from_pdf(pdf_path)
-    result = model(doc)
-    
-    # Export to JSON
-    json_output = result.export()
+    if json_output is None:
+        if streaming is None:
+            streaming = OCR_STREAM_THRESHOLD > 0 and count_pdf_pages(pdf_path) > OCR_STREAM_THRESHOLD
+        if streaming:
+            return extract_text_from_pdf_streaming(pdf_path, output_dir, page_timings, content_hash=content_hash,
+                                                   write_outputs=write_outputs, on_pages=on_pages)
+        
+        # Run OCR (in a worker process when OCR_WORKERS is set, else in-process)
+        print(f"📄 Processing PDF: {pdf_path}")
+        json_output = ocr_document(pdf_path, timings=page_timings, use_cache=False, on_pages=on_pages)
+        ocr_cache.put(pdf_path, json_output, content_hash)
     
     # Reconstruct text
     print("📝 Reconstructing text...")
     text_output = reconstruct_text(json_output)
+    if not write_outputs:
+        return text_output, json_output, None, None
     
     # Generate output paths
     output_txt_path = os.path.join(output_dir, f"{base_name}_extracted.txt")
@@ -61,6 +92,95 @@ def extract_text_from_pdf(pdf_path, output_dir="outputs"):
     
     return text_output, json_output, output_txt_path, output_md_path
 
+def extract_text_from_pdf_streaming(pdf_path, output_dir="outputs", page_timings=None, window=None, content_hash=None,
+                                    write_outputs=None, on_pages=None):
+    """
+    Extract text from PDF a few pages at a time with bounded memory
+    
+    Each window of pages is rendered, OCR'd and reconstructed, then appended
+    to the .txt/.md/.json outputs before the next window is rendered, so page
+    images never accumulate. Output files match the non-streaming mode.
+    
+    Args:
+        pdf_path (str): Path to the input PDF file
+        output_dir (str): Directory to save output files
+        page_timings (list): Optional list that receives per-page OCR timings
+        window (int): Pages per OCR window (defaults to OCR_STREAM_WINDOW)
+        content_hash (str): Precomputed SHA-256 of the PDF, if known
+        write_outputs (bool): Write the .txt/.md/.json files while streaming
+            (default: only when LAZY_OUTPUTS is off)
+        on_pages (callable): Optional callback receiving (pages_done, pages_total)
+            after each window
+    
+    Returns:
+        tuple: (text_output, json_output, output_txt_path, output_md_path)
+    """
+    if write_outputs is None:
+        write_outputs = not outputs.LAZY_OUTPUTS
+    os.makedirs(output_dir, exist_ok=True)
+    base_name = os.path.splitext(os.path.basename(pdf_path))[0]
+    window = window or OCR_STREAM_WINDOW
+    total_pages = count_pdf_pages(pdf_path)
+    
+    output_txt_path = os.path.join(output_dir, f"{base_name}_extracted.txt")
+    output_md_path = os.path.join(output_dir, f"{base_name}_extracted.md")
+    output_json_path = os.path.join(output_dir, f"{base_name}_ocr.json")
+    
+    print(f"📄 Streaming PDF: {pdf_path} ({window} page(s) at a time)")
+    
+    text_pages = []
+    all_pages = []
+    
+    with ExitStack() as files:
+        if write_outputs:
+            txt_file = files.enter_context(open(output_txt_path, "w", encoding="utf-8"))
+            md_file = files.enter_context(open(output_md_path, "w", encoding="utf-8"))
+            json_file = files.enter_context(open(output_json_path, "w", encoding="utf-8"))
+            json_file.write('{\n  "pages": [')
+        
+        for window_output, timings in iter_ocr_windows(pdf_path, window):
+            page_text = reconstruct_text(window_output)
+            if write_outputs:
+                separator = "\n\n" if all_pages else ""
+                md_separator = "\n\n---\n\n" if all_pages else ""
+                txt_file.write(separator + page_text)
+                md_file.write(md_separator + json_to_markdown(window_output, page_offset=len(all_pages)))
+                for index, page in enumerate(window_output["pages"]):
+                    json_file.write(",\n" if all_pages or index else "\n")
+                    json_file.write(json.dumps(page))
+                # Flush so partial outputs are readable while the job runs
+                txt_file.flush()
+                md_file.flush()
+            all_pages.extend(window_output["pages"])
+            
+            text_pages.append(page_text)
+            if page_timings is not None:
+                page_timings.extend(timings)
+            print(f"📝 Pages processed: {len(all_pages)}")
+            if on_pages:
+                on_pages(len(all_pages), total_pages)
+            
+            # Drop the window before rendering the next one
+            del window_output
+            gc.collect()
+        
+        if write_outputs:
+            json_file.write("\n  ]\n}\n")
+    
+    if write_outputs:
+        print(f"✅ Text saved to: {output_txt_path}")
+        print(f"✅ Markdown saved to: {output_md_path}")
+        print(f"✅ JSON saved to: {output_json_path}")
+    else:
+        output_txt_path = output_md_path = None
+    
+    # Word geometry is kept (it is small) so callers get the same return value
+    json_output = {"pages": all_pages}
+    ocr_cache.put(pdf_path, json_output, content_hash)
+    text_output = "\n\n".join(text_pages)
+    
+    return text_output, json_output, output_txt_path, output_md_path
+
 if __name__ == "__main__":
     # For backward compatibility
     extract_text_from_pdf("HL79.pdf")
@@ -0,0 +1,44 @@
+"""
+PDF page helpers
+
+Render individual PDF pages to the RGB numpy arrays doctr expects, so callers
+can OCR a subset of a document without rasterizing every page up front.
+"""
+
+import fitz  # PyMuPDF
+import numpy as np
+
+# doctr's DocumentFile.from_pdf renders at scale 2 (~144 DPI); match it so
+# per-page OCR produces the same geometry and accuracy as whole-document OCR
+RENDER_SCALE = 2.0
+
+
+def count_pdf_pages(pdf_path: str) -> int:
+    """Return the number of pages in a PDF without rendering anything"""
+    with fitz.open(pdf_path) as pdf_doc:
+        return pdf_doc.page_count
+
+
+def render_page(pdf_doc, page_index: int, scale: float = RENDER_SCALE) -> np.ndarray:
+    """Rasterize one page of an open fitz document to an HxWx3 uint8 array"""
+    page = pdf_doc[page_index]
+    pix = page.get_pixmap(matrix=fitz.Matrix(scale, scale), alpha=False, colorspace=fitz.csRGB)
+    return np.frombuffer(pix.samples, dtype=np.uint8).reshape(pix.height, pix.width, 3).copy()
+
+
+def render_pdf_pages(pdf_path: str, page_indices=None, scale: float = RENDER_SCALE) -> list:
+    """
+    Rasterize selected pages of a PDF
+
+    Args:
+        pdf_path: Path to the PDF file
+        page_indices: Iterable of 0-based page numbers (all pages if None)
+        scale: Zoom factor applied to the PDF's 72 DPI page size
+
+    Returns:
+        List of numpy arrays in the order of page_indices
+    """
+    with fitz.open(pdf_path) as pdf_doc:
+        if page_indices is None:
+            page_indices = range(pdf_doc.page_count)
+        return [render_page(pdf_doc, i, scale) for i in page_indices]
@@ -1,14 +1,129 @@
-def generate_initial_prompt(drawing_text, max_rows=25):
+import re
+
+
+def _partition_clause(partition):
+    if not partition:
+        return ""
+    return f"""
+Only generate records that belong to this subset of the part family (other subsets are handled separately):
+{partition}
+"""
+
+
+def generate_partition_prompt(drawing_text, max_partitions=8):
+    return f"""
+You are an AI agent planning the extraction of part data from a technical drawing. The drawing defines a **base part number** and **variation rules** (e.g., material, dash size, finish, etc.) in notes and tables.
+
+Split the full set of part numbers defined by the drawing into at most {max_partitions} **disjoint** subsets that together cover every valid part, using a single variation axis such as dash size range or material code. Each subset must be describable in one short sentence that another assistant can follow without seeing the others.
+
+Drawing text:
+\"\"\"
+{drawing_text}
+\"\"\"
+
+Return ONLY a JSON array of strings, one per subset, e.g. ["Material code D (2024-T6 aluminum), all dash sizes", "Material code C (corrosion resistant steel), all dash sizes"]. If the family cannot be split, return an array with a single string.
+"""
+
+
+def generate_rules_prompt(drawing_text):
     return f"""
 You are an AI agent helping to extract part data from a technical drawing. The drawing defines a **base part number** and **variation rules** (e.g., material, dash size, finish, etc.) in notes and tables.
 
+Do NOT list individual parts. Instead, extract the **logic of part number construction** as a single JSON object with this structure:
+{{
+  "base_part_number": "HL79",
+  "name_template": "{{base}}{{material}}{{dash}}",
+  "shared_attributes": {{
+    "Part Series": "HL",
+    "Lube Type": "Cetyl alcohol or Solid film lube",
+    "Self-Locking": "Yes"
+  }},
+  "variables": [
+    {{
+      "name": "material",
+      "options": [
+        {{"code": "D", "attributes": {{"Sales Description": "HI-LOK® COLLAR, 2024-T6 ALUMINUM ALLOY", "Part Material Detail": "2024 aluminum alloy per QQ-A-430 or QQ-A-225/6", "Part Finish 1": "Anodize per MIL-A-8625"}}}}
+      ]
+    }},
+    {{
+      "name": "dash",
+      "options": [
+        {{"code": "6", "attributes": {{"Thread": "3/8-24UNJF-3B"}}}}
+      ]
+    }}
+  ],
+  "exclusions": [{{"material": "C", "dash": "12"}}]
+}}
+
+Rules:
+- "name_template" builds the Name from {{base}} and one {{placeholder}} per variable name, including any literal dashes or letters.
+- List every option of every variable explicitly (no ranges), each with the attributes it determines.
+- "shared_attributes" holds fields that are identical for every part; use the NetSuite template fields (Thread, Material, Finish, etc). Use best guesses if something is implicit.
+- Attribute values may reference variable codes with the same {{placeholders}}.
+- "exclusions" lists combinations that are NOT valid parts (omit or leave empty if all combinations are valid).
+
+Drawing text:
+\"\"\"
+{drawing_text}
+\"\"\"
+Output ONLY the JSON object, no explanation, no markdown. Your output must start with `{{` and end with `}}`.
+"""
+
+
+def compress_names(names):
+    """
+    Encode a set of part names compactly for exclusion lists
+
+    Names sharing a prefix/suffix around a number are grouped, and runs of
+    consecutive numbers collapse into ranges, e.g. HL79D5 ... HL79D12 plus
+    HL79D16 become "HL79D{5–12,16}". Names without a number are listed as-is.
+    """
+    groups = {}
+    plain = []
+    for name in sorted(set(str(name) for name in names)):
+        match = re.match(r'^(.*?)(\d+)(\D*)$', name)
+        if not match:
+            plain.append(name)
+            continue
+        prefix, number, suffix = match.groups()
+        # Zero-padded numbers only group with numbers of the same width
+        width = len(number) if number.startswith("0") and len(number) > 1 else 0
+        groups.setdefault((prefix, suffix, width), []).append(int(number))
+
+    encoded = []
+    for (prefix, suffix, width), numbers in sorted(groups.items()):
+        numbers.sort()
+        fmt = f"{{:0{width}d}}" if width else "{}"
+        parts = []
+        start = prev = numbers[0]
+        for number in numbers[1:] + [None]:
+            if number is not None and number == prev + 1:
+                prev = number
+                continue
+            parts.append(fmt.format(start) if start == prev else f"{fmt.format(start)}–{fmt.format(prev)}")
+            if number is not None:
+                start = prev = number
+        if len(parts) == 1 and "–" not in parts[0]:
+            encoded.append(f"{prefix}{parts[0]}{suffix}")
+        else:
+            encoded.append(f"{prefix}{{{','.join(parts)}}}{suffix}")
+
+    return ", ".join(encoded + plain)
+
+
+# Static instructions shared by every extraction call. Together with the
+# drawing text they form an identical message prefix across all batches of a
+# job, which the API can serve from its prompt cache.
+EXTRACTION_SYSTEM_PROMPT = """
+You are an AI agent helping to extract part data from a technical drawing. The drawing defines a **base part number** and **variation rules** (e.g., material, dash size, finish, etc.) in notes and tables.
+
 Your goal is to:
 - Extract the **logic of part number construction**
-- Generate **structured records** for each valid part (up to {max_rows} in this batch)
+- Generate **structured records** for each valid part, in batches
 - Each record must match the format of this sample:
 
 Example output record (JSON object):
-{{
+{
   "Name": "HL79D6",
   "Base Part Number 1": "HL79",
   "Part Series": "HL",
@@ -16,47 +131,35 @@ Example output record (JSON object):
   "Part Material Detail": "2024 aluminum alloy per QQ-A-430 or QQ-A-225/6",
   "Part Finish 1": "Anodize per MIL-A-8625",
   "Lube Type": "Cetyl alcohol or Solid film lube",
-  "Self-Locking": "Yes"
+  "Self-Locking": "Yes",
+  "Thread": "10-32UNJF-3B"
   ...
-}}
+}
 
-You must return a JSON(as a Python list of dictionaries) array of up to {max_rows} part records, based on the text below. Include only the fields specified in the NetSuite template (Name, Thread, Material, Finish, etc). Use best guesses if something is implicit. Output ONLY the list, no explanation, no markdown. 
-
-Drawing text:
-\"\"\"
-{drawing_text}
-\"\"\"
-Your output must start with `[{{` and end with `}}]`.
+Include only the fields specified in the NetSuite template (Name, Thread, Material, Finish, etc). Use best guesses if something is implicit.
+Excluded names may be given in compressed form: "HL79D{5–12,16}" means HL79D5, HL79D6, ..., HL79D12 and HL79D16.
+Output ONLY a JSON array (a Python list of dictionaries), no explanation, no markdown. Your output must start with `[{` and end with `}]`.
 """
 
 
-def generate_continuation_prompt(text, existing_names, max_rows=25):
-    excluded = ", ".join(existing_names[-50:])  # последние 50 имён, чтобы не перегружать
-    return f"""
-You are an assistant extracting structured data about aerospace fasteners from engineering drawings.
-
-Below is the content of the drawing:
-{text[:10000]}
+def build_extraction_messages(drawing_text, existing_names=None, max_rows=25, partition=None):
+    """
+    Chat messages for one extraction batch
 
-Already extracted part names (exclude these): {excluded}
+    The system instructions and the drawing text come first and never change
+    between batches (or between partitions of the same job), so they form a
+    stable, cacheable prefix; only the final message varies.
+    """
+    if existing_names:
+        request = (
+            f"Already extracted part names (exclude all of these): {compress_names(existing_names)}\n\n"
+            f"Generate up to {max_rows} NEW part records as a JSON array. Do not repeat existing records."
+        )
+    else:
+        request = f"Generate up to {max_rows} part records as a JSON array."
 
-Now, generate the next {max_rows} part records in JSON format, matching the schema below.
-
-Schema example (each part must match):
-[
-  {{
-    "Name": "HL79-6",
-    "Base Part Number 1": "HL79",
-    "Part Series": "HL",
-    "Sales Description": "HI-LOK® COLLAR, 2024-T6 ALUMINUM ALLOY",
-    "Part Material Detail": "2024 aluminum alloy per QQ-A-430 or QQ-A-225/6",
-    "Part Finish 1": "Anodize per MIL-A-8625, dye color red, and cetyl alcohol lube per Hi-Shear Spec. 305",
-    "Lube Type": "Cetyl alcohol",
-    "Self-Locking": "Yes",
-    "Thread": "10-32UNJF-3B"
-  }},
-  ...
-]
-
-Do not repeat existing records. Output only the JSON array, without explanations.
-"""
+    return [
+        {"role": "system", "content": EXTRACTION_SYSTEM_PROMPT.strip()},
+        {"role": "user", "content": f'Drawing text:\n"""\n{drawing_text}\n"""'},
+        {"role": "user", "content": request + _partition_clause(partition)},
+    ]
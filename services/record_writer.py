@@ -0,0 +1,304 @@
+"""
+Streaming export writer for extracted part records
+
+Records are appended to an NDJSON spool as soon as the extraction loop
+accepts them, and every export is streamed from that spool, so writing the
+exports needs no memory beyond the column list. (The extraction loop itself
+still returns the full record list to its caller.) Columns are discovered
+on the fly (first-seen order, "Name" first). The requested export formats
+are produced from the spool:
+
+- ndjson: the spool itself, flushed per record (readable while the job runs)
+- xlsx: openpyxl write-only workbook, also refreshed periodically mid-job
+  from a background thread, so adding records never waits for it
+- csv: written once at the end, when the full header is known
+- parquet: written once at the end in row-group batches (needs pyarrow)
+"""
+
+import csv
+import importlib.util
+import itertools
+import json
+import os
+import shutil
+import tempfile
+import threading
+import time
+
+from openpyxl import Workbook
+from openpyxl.cell.cell import ILLEGAL_CHARACTERS_RE
+
+EXPORT_FORMATS = ("xlsx", "csv", "ndjson", "parquet")
+# Formats written when a request does not choose any (comma-separated)
+DEFAULT_EXPORT_FORMATS = os.getenv("EXPORT_FORMATS", "xlsx")
+# Seconds between partial .xlsx snapshots while records arrive (0 = only at the end)
+EXCEL_SNAPSHOT_SECONDS = float(os.getenv("EXCEL_SNAPSHOT_SECONDS", "15"))
+PARQUET_BATCH_ROWS = 5000
+
+
+def parse_formats(formats=None) -> list:
+    """
+    Normalize a format selection ("xlsx,csv" or a list) into a list
+
+    Raises:
+        ValueError: for unknown formats, or parquet without pyarrow installed
+    """
+    if not formats:
+        formats = DEFAULT_EXPORT_FORMATS
+    if isinstance(formats, str):
+        formats = formats.split(",")
+
+    selected = []
+    for fmt in formats:
+        fmt = fmt.strip().lower()
+        if not fmt or fmt in selected:
+            continue
+        if fmt not in EXPORT_FORMATS:
+            raise ValueError(f"Unknown export format {fmt!r}; expected any of {', '.join(EXPORT_FORMATS)}")
+        if fmt == "parquet" and importlib.util.find_spec("pyarrow") is None:
+            raise ValueError("Parquet export requires pyarrow to be installed")
+        selected.append(fmt)
+    return selected or ["xlsx"]
+
+
+def export_path(output_dir: str, base_name: str, fmt: str) -> str:
+    return os.path.join(output_dir, f"{base_name}_parts.{fmt}")
+
+
+def _cell_value(value):
+    """Convert a record value into something openpyxl can store"""
+    if value is None or isinstance(value, (bool, int, float)):
+        return value
+    if isinstance(value, (dict, list)):
+        value = json.dumps(value, ensure_ascii=False)
+    return ILLEGAL_CHARACTERS_RE.sub("", str(value))
+
+
+def _text_value(value):
+    """Convert a record value into a string (None stays None)"""
+    if value is None:
+        return None
+    if isinstance(value, (dict, list)):
+        return json.dumps(value, ensure_ascii=False)
+    return str(value)
+
+
+def order_columns(columns: list) -> list:
+    if "Name" in columns:
+        return ["Name"] + [column for column in columns if column != "Name"]
+    return list(columns)
+
+
+def iter_spool(spool_path: str):
+    """Yield the records of an NDJSON file one at a time"""
+    with open(spool_path, "r", encoding="utf-8") as spool:
+        for line in spool:
+            if line.strip():
+                yield json.loads(line)
+
+
+def _replace_atomically(write, path: str):
+    """Write to a temp file next to path with write(tmp_path), then swap it in"""
+    tmp_path = f"{path}.{threading.get_ident()}.tmp"
+    try:
+        write(tmp_path)
+        os.replace(tmp_path, path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+
+def write_xlsx(records, columns: list, path: str):
+    def write(tmp_path):
+        workbook = Workbook(write_only=True)
+        sheet = workbook.create_sheet("Parts")
+        sheet.append(columns)
+        for record in records:
+            sheet.append([_cell_value(record.get(column)) for column in columns])
+        workbook.save(tmp_path)
+
+    _replace_atomically(write, path)
+
+
+def write_csv(records, columns: list, path: str):
+    def write(tmp_path):
+        with open(tmp_path, "w", encoding="utf-8", newline="") as f:
+            writer = csv.writer(f)
+            writer.writerow(columns)
+            for record in records:
+                writer.writerow(["" if record.get(column) is None else _text_value(record.get(column))
+                                 for column in columns])
+
+    _replace_atomically(write, path)
+
+
+def write_parquet(records, columns: list, path: str):
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    # Records carry free-form values, so every column is stored as text
+    schema = pa.schema([(column, pa.string()) for column in columns])
+
+    def write(tmp_path):
+        with pq.ParquetWriter(tmp_path, schema) as writer:
+            batch = []
+            for record in records:
+                batch.append(record)
+                if len(batch) >= PARQUET_BATCH_ROWS:
+                    writer.write_table(_parquet_table(batch, columns, schema))
+                    batch = []
+            if batch or not columns:
+                writer.write_table(_parquet_table(batch, columns, schema))
+
+    _replace_atomically(write, path)
+
+
+def _parquet_table(batch, columns, schema):
+    import pyarrow as pa
+    data = {column: [_text_value(record.get(column)) for record in batch] for column in columns}
+    return pa.table(data, schema=schema)
+
+
+WRITERS = {"xlsx": write_xlsx, "csv": write_csv, "parquet": write_parquet}
+
+
+class RecordWriter:
+    """
+    Append-only, constant-memory writer for one job's part records
+
+    Args:
+        output_dir: Directory for the export files
+        base_name: File name stem; exports are named <base_name>_parts.<format>
+        formats: Export formats to produce (see parse_formats)
+        snapshot_interval: Seconds between partial .xlsx snapshots while
+            records are being added (0 disables snapshots)
+        spool_path: Keep the record spool at this path (flushed per record)
+            instead of a temporary file
+        write_exports: False to only write the spool, leaving the exports to
+            be generated on demand (see services.outputs)
+    """
+
+    def __init__(self, output_dir: str, base_name: str, formats=None,
+                 snapshot_interval: float = EXCEL_SNAPSHOT_SECONDS,
+                 spool_path: str = None, write_exports: bool = True):
+        self.formats = parse_formats(formats)
+        self.paths = {fmt: export_path(output_dir, base_name, fmt) for fmt in self.formats}
+        self.write_exports = write_exports
+        self.snapshot_interval = snapshot_interval if write_exports and "xlsx" in self.formats else 0
+        self.columns = []
+        self._known_columns = set()
+        self.rows = 0
+        self._snapshot_rows = 0
+        self._last_snapshot = time.monotonic()
+        self._snapshot_thread = None
+        self._lock = threading.Lock()
+
+        # A requested spool path, or else the NDJSON export, doubles as the
+        # spool; otherwise spool to a temp file
+        if spool_path or (write_exports and "ndjson" in self.formats):
+            self._spool_path = str(spool_path or self.paths["ndjson"])
+            os.makedirs(os.path.dirname(self._spool_path) or ".", exist_ok=True)
+            self._spool = open(self._spool_path, "w", encoding="utf-8")
+            self._temporary_spool = False
+        else:
+            fd, self._spool_path = tempfile.mkstemp(prefix="parts_", suffix=".ndjson")
+            self._spool = os.fdopen(fd, "w", encoding="utf-8")
+            self._temporary_spool = True
+        self.closed = False
+
+    @property
+    def primary_path(self) -> str:
+        """Main output: the spreadsheet if requested, otherwise the first format"""
+        return self.paths.get("xlsx") or self.paths[self.formats[0]]
+
+    def add(self, record: dict):
+        """Append one record and refresh the partial spreadsheet if it is due"""
+        with self._lock:
+            for key in record:
+                if key not in self._known_columns:
+                    self._known_columns.add(key)
+                    self.columns.append(key)
+            self._spool.write(json.dumps(record, ensure_ascii=False, default=str) + "\n")
+            self.rows += 1
+            if not self._temporary_spool:
+                self._spool.flush()
+
+            if (self.snapshot_interval > 0
+                    and time.monotonic() - self._last_snapshot >= self.snapshot_interval
+                    and not (self._snapshot_thread and self._snapshot_thread.is_alive())):
+                # Rebuilding the workbook rereads the whole spool, so it runs
+                # off the caller's thread (the streaming/LLM loop)
+                self._spool.flush()
+                self._last_snapshot = time.monotonic()
+                self._snapshot_thread = threading.Thread(
+                    target=self._write_snapshot, args=(self.rows, order_columns(self.columns)),
+                    name="xlsx-snapshot", daemon=True,
+                )
+                self._snapshot_thread.start()
+
+    def _write_snapshot(self, rows: int, columns: list):
+        """Write the partial .xlsx from the first `rows` spooled records"""
+        try:
+            # Only records flushed before the thread started are read, never a
+            # line that is still being appended
+            write_xlsx(itertools.islice(iter_spool(self._spool_path), rows), columns, self.paths["xlsx"])
+            self._snapshot_rows = rows
+        except Exception as e:
+            print(f"⚠️ Partial spreadsheet snapshot failed: {e}")
+
+    def _wait_for_snapshot(self):
+        if self._snapshot_thread is not None:
+            self._snapshot_thread.join()
+            self._snapshot_thread = None
+
+    def close(self) -> dict:
+        """Write the final exports, remove a temporary spool and return {format: path}"""
+        with self._lock:
+            if self.closed:
+                return self.paths
+            # The final workbook must not be overwritten by a late snapshot
+            self._wait_for_snapshot()
+            try:
+                self._spool.flush()
+                columns = order_columns(self.columns)
+                for fmt in (self.formats if self.write_exports else []):
+                    if fmt == "ndjson":
+                        if self._spool_path != self.paths[fmt]:
+                            shutil.copyfile(self._spool_path, self.paths[fmt])
+                        continue
+                    if fmt == "xlsx" and self.rows == self._snapshot_rows and os.path.exists(self.paths[fmt]):
+                        continue
+                    WRITERS[fmt](iter_spool(self._spool_path), columns, self.paths[fmt])
+            finally:
+                self._discard_spool()
+        if self.write_exports:
+            print(f"✅ Exported {self.rows} records ({len(self.columns)} columns) as {', '.join(self.formats)}")
+        else:
+            print(f"✅ Stored {self.rows} records ({len(self.columns)} columns); exports are generated on download")
+        return self.paths
+
+    def abort(self):
+        """Stop without finalizing (NDJSON and the last .xlsx snapshot are kept)"""
+        with self._lock:
+            if not self.closed:
+                self._wait_for_snapshot()
+                self._discard_spool()
+
+    def _discard_spool(self):
+        self._spool.close()
+        self.closed = True
+        if self._temporary_spool:
+            try:
+                os.remove(self._spool_path)
+            except FileNotFoundError:
+                pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.close()
+        else:
+            self.abort()
+        return False
@@ -0,0 +1,179 @@
+"""
+Rule-driven part-number expansion
+
+Instead of asking the LLM to enumerate every concrete record 25 at a time,
+one call extracts the drawing's part-number construction rules as structured
+data and this module expands them locally into every record.
+
+Rule schema (as returned by the model for generate_rules_prompt):
+
+    {
+      "base_part_number": "HL79",
+      "name_template": "{base}{material}{dash}",
+      "shared_attributes": {"Part Series": "HL", "Self-Locking": "Yes"},
+      "variables": [
+        {"name": "material", "options": [
+          {"code": "D", "attributes": {"Sales Description": "..."}}
+        ]},
+        {"name": "dash", "options": [
+          {"code": "6", "attributes": {"Thread": "3/8-24UNJF-3B"}}
+        ]}
+      ],
+      "exclusions": [{"material": "C", "dash": "12"}]
+    }
+
+Attribute values may reference variable codes with the same {placeholders}
+as the name template (e.g. "Dash size {dash}").
+
+Rules that would expand into more than RULES_MAX_COMBINATIONS records are
+rejected, so one malformed rule object cannot produce millions of records.
+"""
+
+import itertools
+import os
+
+# Largest number of combinations a rule object may expand into
+RULES_MAX_COMBINATIONS = int(os.getenv("RULES_MAX_COMBINATIONS", "100000"))
+
+
+class RuleError(ValueError):
+    """Raised when extracted rules cannot be expanded"""
+
+
+class _Codes(dict):
+    """format_map mapping that leaves unknown placeholders untouched"""
+
+    def __missing__(self, key):
+        return "{" + key + "}"
+
+
+def _fill(template, codes):
+    """Fill an attribute value, tolerating literal braces"""
+    if not isinstance(template, str):
+        return template
+    try:
+        return template.format_map(codes)
+    except (ValueError, IndexError, AttributeError):
+        # Literal braces or malformed placeholders: keep the text as-is
+        return template
+
+
+def _fill_name(template: str, codes: dict) -> str:
+    """Fill the name template strictly; every placeholder must be a known variable"""
+    try:
+        return template.format_map(dict(codes))
+    except KeyError as e:
+        raise RuleError(f"name_template references unknown placeholder {e}")
+    except (ValueError, IndexError, AttributeError) as e:
+        raise RuleError(f"name_template {template!r} cannot be filled: {e}")
+
+
+def validate_rules(rules: dict):
+    """Check the rule structure and raise RuleError describing the first problem"""
+    if not isinstance(rules, dict):
+        raise RuleError("rules must be a JSON object")
+    if not rules.get("base_part_number"):
+        raise RuleError("missing base_part_number")
+    if not isinstance(rules.get("name_template", ""), str):
+        raise RuleError("name_template must be a string")
+    if not isinstance(rules.get("shared_attributes") or {}, dict):
+        raise RuleError("shared_attributes must be an object")
+
+    variables = rules.get("variables", [])
+    if not isinstance(variables, list):
+        raise RuleError("variables must be a list")
+
+    names = set()
+    for variable in variables:
+        if not isinstance(variable, dict) or not variable.get("name"):
+            raise RuleError("every variable needs a name")
+        if variable["name"] in names:
+            raise RuleError(f"duplicate variable {variable['name']!r}")
+        names.add(variable["name"])
+        options = variable.get("options")
+        if not isinstance(options, list) or not options:
+            raise RuleError(f"variable {variable['name']!r} has no options")
+        for option in options:
+            if not isinstance(option, dict) or "code" not in option:
+                raise RuleError(f"variable {variable['name']!r} has an option without a code")
+            if not isinstance(option.get("attributes") or {}, dict):
+                raise RuleError(f"variable {variable['name']!r} has an option whose attributes are not an object")
+
+    exclusions = rules.get("exclusions", []) or []
+    if not isinstance(exclusions, list):
+        raise RuleError("exclusions must be a list")
+    for exclusion in exclusions:
+        if not isinstance(exclusion, dict):
+            raise RuleError("exclusions must be objects mapping variable names to codes")
+
+
+def _is_excluded(codes: dict, exclusions: list) -> bool:
+    for exclusion in exclusions:
+        if exclusion and all(str(codes.get(name)) == str(code) for name, code in exclusion.items()):
+            return True
+    return False
+
+
+def count_combinations(rules: dict, limit: int = RULES_MAX_COMBINATIONS) -> int:
+    """
+    Number of records before exclusions are applied
+
+    Raises:
+        RuleError: if the count exceeds limit (0 disables the check)
+    """
+    total = 1
+    for variable in rules.get("variables", []):
+        total *= len(variable["options"])
+        if limit and total > limit:
+            raise RuleError(f"rules expand into more than {limit} combinations")
+    return total
+
+
+def expand_rules(rules: dict) -> list:
+    """
+    Expand construction rules into concrete part records
+
+    Args:
+        rules: Rule object in the schema described in the module docstring
+
+    Returns:
+        List of record dicts, one per valid combination, in rule order and
+        deduplicated by Name
+    """
+    validate_rules(rules)
+    count_combinations(rules)
+
+    base = str(rules["base_part_number"])
+    variables = rules.get("variables", [])
+    variable_names = [variable["name"] for variable in variables]
+    template = rules.get("name_template") or "{base}" + "".join("{" + name + "}" for name in variable_names)
+    shared = rules.get("shared_attributes", {}) or {}
+    exclusions = rules.get("exclusions", []) or []
+
+    records = []
+    seen_names = set()
+
+    for combination in itertools.product(*[variable["options"] for variable in variables]):
+        codes = _Codes(base=base)
+        for name, option in zip(variable_names, combination):
+            codes[name] = str(option["code"])
+
+        if _is_excluded(codes, exclusions):
+            continue
+
+        name = _fill_name(template, codes)
+        if name in seen_names:
+            continue
+        seen_names.add(name)
+
+        record = {"Name": name, "Base Part Number 1": base}
+        for key, value in shared.items():
+            record[key] = _fill(value, codes)
+        for option in combination:
+            for key, value in (option.get("attributes") or {}).items():
+                record[key] = _fill(value, codes)
+        record["Name"] = name
+
+        records.append(record)
+
+    return records
@@ -1,9 +1,9 @@
 from operator import itemgetter
 
-def json_to_markdown(json_output, space_threshold=10, y_tolerance=5):
+def json_to_markdown(json_output, space_threshold=10, y_tolerance=5, page_offset=0):
     md_pages = []
 
-    for page_num, page in enumerate(json_output['pages']):
+    for page_num, page in enumerate(json_output['pages'], start=page_offset):
         page_width, page_height = page['dimensions']
         word_items = []
 
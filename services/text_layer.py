@@ -0,0 +1,139 @@
+"""
+Native PDF text-layer extraction
+
+Born-digital (vector) PDFs already carry their text with positions, so
+rasterizing them and running the OCR model is wasted work. This module reads
+words straight from the PDF text layer with PyMuPDF and emits them in the same
+pages/blocks/lines/words structure as doctr's result.export(), so
+reconstruct_text and json_to_markdown work unchanged. Pages whose text layer
+is missing or unusable (scans, outlined fonts, broken encodings) are left for
+OCR.
+"""
+
+import os
+
+import fitz  # PyMuPDF
+
+from .pdf_pages import RENDER_SCALE
+
+# Text-layer fast path configuration (overridable from the environment)
+TEXT_LAYER_ENABLED = os.getenv("OCR_TEXT_LAYER", "1") not in ("0", "false", "False")
+TEXT_LAYER_MIN_WORDS = int(os.getenv("OCR_TEXT_LAYER_MIN_WORDS", "10"))
+TEXT_LAYER_MIN_CLEAN_RATIO = 0.9
+
+
+def _is_usable(words) -> bool:
+    """Decide whether a page's text layer can replace OCR"""
+    if len(words) < TEXT_LAYER_MIN_WORDS:
+        return False
+
+    text = "".join(word[4] for word in words)
+    if not text:
+        return False
+
+    # Broken font encodings show up as replacement or control characters
+    clean = sum(1 for char in text if char.isprintable() and char != "�")
+    return clean / len(text) >= TEXT_LAYER_MIN_CLEAN_RATIO
+
+
+def _bbox(items):
+    """Normalized ((x0, y0), (x1, y1)) enclosing a list of geometries"""
+    return (
+        (min(g[0][0] for g in items), min(g[0][1] for g in items)),
+        (max(g[1][0] for g in items), max(g[1][1] for g in items)),
+    )
+
+
+def extract_page(page, page_idx: int):
+    """
+    Build a doctr-style page export from one fitz page's text layer
+
+    Args:
+        page: fitz.Page
+        page_idx: 0-based page number in the source PDF
+
+    Returns:
+        Page dict compatible with result.export()["pages"][n], or None if the
+        page has no usable text layer
+    """
+    # Rotated pages report word boxes in unrotated space; let OCR handle them
+    if page.rotation:
+        return None
+
+    words = page.get_text("words", sort=True)
+    if not _is_usable(words):
+        return None
+
+    rect = page.rect
+    width, height = rect.width, rect.height
+
+    # Group words into blocks and lines using PyMuPDF's own numbering
+    blocks = {}
+    for x0, y0, x1, y1, value, block_no, line_no, _ in words:
+        geometry = (
+            (max(0.0, x0 / width), max(0.0, y0 / height)),
+            (min(1.0, x1 / width), min(1.0, y1 / height)),
+        )
+        blocks.setdefault(block_no, {}).setdefault(line_no, []).append({
+            "value": value,
+            "confidence": 1.0,
+            "geometry": geometry,
+            "objectness_score": 1.0,
+            "crop_orientation": {"value": 0, "confidence": None},
+        })
+
+    export_blocks = []
+    for block_no in sorted(blocks):
+        lines = []
+        for line_no in sorted(blocks[block_no]):
+            line_words = blocks[block_no][line_no]
+            lines.append({
+                "geometry": _bbox([word["geometry"] for word in line_words]),
+                "objectness_score": 1.0,
+                "words": line_words,
+            })
+        export_blocks.append({
+            "geometry": _bbox([line["geometry"] for line in lines]),
+            "objectness_score": 1.0,
+            "lines": lines,
+            "artefacts": [],
+        })
+
+    return {
+        "page_idx": page_idx,
+        # doctr reports (height, width) of the rendered page image; use the
+        # same render scale so absolute-pixel heuristics behave identically
+        "dimensions": (int(height * RENDER_SCALE), int(width * RENDER_SCALE)),
+        "orientation": {"value": None, "confidence": None},
+        "language": {"value": None, "confidence": None},
+        "blocks": export_blocks,
+        "source": "text_layer",
+    }
+
+
+def split_text_layer_pages(pdf_path: str, page_indices=None):
+    """
+    Extract every page that has a usable text layer
+
+    Args:
+        pdf_path: Path to the PDF file
+        page_indices: 0-based page numbers to consider (all pages if None)
+
+    Returns:
+        tuple: (native_pages, remaining) where native_pages maps page index to
+        its page export and remaining lists the pages that still need OCR
+    """
+    native_pages = {}
+    remaining = []
+
+    with fitz.open(pdf_path) as pdf_doc:
+        if page_indices is None:
+            page_indices = range(pdf_doc.page_count)
+        for page_idx in page_indices:
+            page_export = extract_page(pdf_doc[page_idx], page_idx)
+            if page_export is None:
+                remaining.append(page_idx)
+            else:
+                native_pages[page_idx] = page_export
+
+    return native_pages, remaining
@@ -5,10 +5,23 @@ Utility functions for the PDF processing web application
 import os
 import shutil
 import time
+import asyncio
+import hashlib
 from pathlib import Path
 from typing import List, Dict, Any
 from datetime import datetime, timedelta
 
+from services import outputs
+
+# Largest accepted upload, and bytes buffered between disk writes while streaming one
+MAX_UPLOAD_MB = int(os.getenv("MAX_UPLOAD_MB", "50"))
+MAX_UPLOAD_BYTES = MAX_UPLOAD_MB * 1024 * 1024
+UPLOAD_CHUNK_BYTES = 1024 * 1024
+# Allowance for multipart boundaries and headers when checking Content-Length
+MULTIPART_OVERHEAD_BYTES = 64 * 1024
+PDF_MAGIC = b"%PDF-"
+PDF_HEADER_WINDOW = 1024
+
 def cleanup_old_files(directory: Path, days: int = 7):
     """
     Clean up files older than specified days
@@ -140,7 +153,7 @@ def get_file_info(directory: Path) -> List[Dict[str, Any]]:
         return files_info
     
     for file_path in directory.iterdir():
-        if file_path.is_file() and file_path.name != "status.json":
+        if file_path.is_file() and file_path.name != "status.json" and not file_path.name.startswith("."):
             try:
                 stat = file_path.stat()
                 
@@ -156,11 +169,28 @@ def get_file_info(directory: Path) -> List[Dict[str, Any]]:
                     "modified": datetime.fromtimestamp(stat.st_mtime).isoformat(),
                     "type": get_file_type_from_extension(file_path.suffix),
                     "category": get_file_category(file_path.name),
-                    "download_url": f"/download/{directory.name}/{file_type}/{file_path.name}"
+                    "download_url": f"/download/{directory.name}/{file_type}/{file_path.name}",
+                    "materialized": True
                 })
             except Exception as e:
                 print(f"⚠️ Could not get info for {file_path}: {e}")
     
+    # Outputs that are generated on first download
+    for filename in outputs.pending_outputs(directory):
+        file_type = get_file_category_for_download(filename)
+        files_info.append({
+            "filename": filename,
+            "size_bytes": 0,
+            "size_kb": 0,
+            "size_mb": 0,
+            "created": None,
+            "modified": None,
+            "type": get_file_type_from_extension(Path(filename).suffix),
+            "category": get_file_category(filename),
+            "download_url": f"/download/{directory.name}/{file_type}/{filename}",
+            "materialized": False
+        })
+    
     # Sort by category and then by name
     files_info.sort(key=lambda x: (x["category"], x["filename"]))
     return files_info
@@ -175,6 +205,8 @@ def get_file_type_from_extension(extension: str) -> str:
         ".json": "JSON Data",
         ".pdf": "PDF Document",
         ".csv": "CSV Data",
+        ".ndjson": "NDJSON Data",
+        ".parquet": "Parquet Data",
         ".zip": "ZIP Archive",
         ".png": "PNG Image",
         ".jpg": "JPEG Image",
@@ -186,7 +218,7 @@ def get_file_category(filename: str) -> str:
     """Categorize files based on their purpose"""
     filename_lower = filename.lower()
     
-    if "_parts.xlsx" in filename_lower:
+    if "_parts." in filename_lower and filename_lower.endswith((".xlsx", ".csv", ".ndjson", ".parquet")):
         return "1_main_output"
     elif "_extracted.txt" in filename_lower:
         return "2_extracted_text"
@@ -211,6 +243,12 @@ def get_file_category_for_download(filename: str) -> str:
         return "markdown"
     elif filename_lower.endswith('.json'):
         return "json"
+    elif filename_lower.endswith('.csv'):
+        return "csv"
+    elif filename_lower.endswith('.ndjson'):
+        return "ndjson"
+    elif filename_lower.endswith('.parquet'):
+        return "parquet"
     elif filename_lower.endswith('.zip'):
         return "archive"
     else:
@@ -273,20 +311,198 @@ def get_disk_usage(directory: Path) -> Dict[str, Any]:
             "formatted_size": "0 B"
         }
 
-def validate_upload_file(file) -> bool:
-    """Validate uploaded file"""
-    # Check file size (max 50MB)
-    max_size = 50 * 1024 * 1024  # 50MB
+class UploadError(ValueError):
+    """An upload was rejected; status_code is the HTTP status to answer with"""
+    
+    def __init__(self, status_code: int, detail: str):
+        super().__init__(detail)
+        self.status_code = status_code
+        self.detail = detail
+
+def validate_upload_file(filename: str = None, size: int = None, max_bytes: int = None):
+    """
+    Validate an upload by name and by (declared or received) size
+    
+    Args:
+        filename: Client-supplied file name, if known yet
+        size: Bytes declared or received so far, if known
+        max_bytes: Size limit (defaults to MAX_UPLOAD_MB)
+        
+    Raises:
+        UploadError: 400 for a non-PDF name, 413 when the size is over the limit
+    """
+    max_bytes = MAX_UPLOAD_BYTES if max_bytes is None else max_bytes
+    if size is not None and size > max_bytes:
+        raise UploadError(413, f"File exceeds the {max_bytes // (1024 * 1024)} MB upload limit")
+    if filename is not None and not filename.lower().endswith('.pdf'):
+        raise UploadError(400, "Only PDF files are allowed")
+
+class UploadSink:
+    """
+    Writes an upload to disk as it arrives, off the event loop
+    
+    Every chunk is counted against the size limit, hashed and checked for
+    the PDF header before it is buffered; buffered bytes are written to the
+    destination in UPLOAD_CHUNK_BYTES pieces from a worker thread.
+    """
+    
+    def __init__(self, destination: Path, max_bytes: int = None, flush_bytes: int = None):
+        self.destination = Path(destination)
+        self.max_bytes = MAX_UPLOAD_BYTES if max_bytes is None else max_bytes
+        self.flush_bytes = flush_bytes or UPLOAD_CHUNK_BYTES
+        self.filename = None
+        self.size = 0
+        self._digest = hashlib.sha256()
+        self._head = b""
+        self._header_ok = False
+        self._buffer = bytearray()
+        self._file = None
+    
+    async def write(self, data: bytes):
+        self.size += len(data)
+        validate_upload_file(size=self.size, max_bytes=self.max_bytes)
+        if not self._header_ok:
+            self._head += data[:PDF_HEADER_WINDOW - len(self._head)]
+            self._check_header(final=False)
+        self._digest.update(data)
+        self._buffer += data
+        if len(self._buffer) >= self.flush_bytes:
+            await self._flush()
+    
+    def _check_header(self, final: bool):
+        # PDF readers accept the %PDF- marker anywhere in the first 1024 bytes
+        if PDF_MAGIC in self._head:
+            self._header_ok = True
+        elif final or len(self._head) >= PDF_HEADER_WINDOW:
+            raise UploadError(400, "File is not a PDF (missing %PDF header)")
+    
+    async def _flush(self):
+        if self._file is None:
+            self._file = await asyncio.to_thread(open, self.destination, "wb")
+        data = bytes(self._buffer)
+        self._buffer.clear()
+        await asyncio.to_thread(self._file.write, data)
+    
+    async def finish(self) -> str:
+        """Validate the complete upload, close the file and return its SHA-256"""
+        if self.size == 0:
+            raise UploadError(400, "Uploaded file is empty")
+        self._check_header(final=True)
+        await self._flush()
+        await asyncio.to_thread(self._file.close)
+        return self._digest.hexdigest()
+    
+    def discard(self):
+        """Drop a partial or rejected upload"""
+        if self._file is not None:
+            self._file.close()
+        self.destination.unlink(missing_ok=True)
+
+class _MultipartEvents:
+    """Collects python-multipart parser callbacks so they can be handled asynchronously"""
+    
+    def __init__(self):
+        self.events = []
+        self._header_field = b""
+        self._header_value = b""
+        self._headers = {}
+    
+    def callbacks(self) -> dict:
+        return {
+            "on_part_begin": self._on_part_begin,
+            "on_part_data": lambda data, start, end: self.events.append(("data", data[start:end])),
+            "on_part_end": lambda: self.events.append(("end", None)),
+            "on_header_field": self._on_header_field,
+            "on_header_value": self._on_header_value,
+            "on_header_end": self._on_header_end,
+            "on_headers_finished": lambda: self.events.append(("headers", self._headers)),
+        }
+    
+    def _on_part_begin(self):
+        self._headers = {}
+    
+    def _on_header_field(self, data, start, end):
+        self._header_field += data[start:end]
+    
+    def _on_header_value(self, data, start, end):
+        self._header_value += data[start:end]
+    
+    def _on_header_end(self):
+        self._headers[self._header_field.lower()] = self._header_value
+        self._header_field = b""
+        self._header_value = b""
+
+async def save_upload_stream(request, destination: Path, field: str = "file", max_bytes: int = None) -> Dict[str, Any]:
+    """
+    Stream a PDF upload from the request body straight to disk
     
-    # Note: This is a simplified check. In production, you'd want more thorough validation
-    if hasattr(file, 'size') and file.size > max_size:
-        return False
+    Accepts multipart/form-data (the PDF in the `field` part) or a raw
+    application/pdf body. The declared Content-Length, the running size, the
+    file name and the PDF header are checked as the body arrives, so bad
+    uploads are rejected before they are read in full.
     
-    # Check file extension
-    if not file.filename.lower().endswith('.pdf'):
-        return False
+    Args:
+        request: Incoming Starlette/FastAPI request (body not yet read)
+        destination: Path to write the PDF to
+        field: Multipart field holding the file
+        max_bytes: Size limit (defaults to MAX_UPLOAD_MB)
+        
+    Returns:
+        {"filename", "size_bytes", "content_hash"} (SHA-256 hex digest)
+        
+    Raises:
+        UploadError: the upload was rejected; nothing is left at destination
+    """
+    try:
+        from python_multipart.multipart import MultipartParser, parse_options_header
+    except ModuleNotFoundError:
+        from multipart.multipart import MultipartParser, parse_options_header
     
-    return True
+    max_bytes = MAX_UPLOAD_BYTES if max_bytes is None else max_bytes
+    content_length = request.headers.get("content-length")
+    if content_length and content_length.isdigit():
+        validate_upload_file(size=int(content_length) - MULTIPART_OVERHEAD_BYTES, max_bytes=max_bytes)
+    
+    content_type, params = parse_options_header(request.headers.get("content-type", ""))
+    sink = UploadSink(destination, max_bytes)
+    try:
+        if content_type == b"multipart/form-data":
+            boundary = params.get(b"boundary")
+            if not boundary:
+                raise UploadError(400, "Missing multipart boundary")
+            collector = _MultipartEvents()
+            parser = MultipartParser(boundary, collector.callbacks())
+            in_file = False
+            async for chunk in request.stream():
+                parser.write(chunk)
+                events, collector.events = collector.events, []
+                for event, value in events:
+                    if event == "headers":
+                        _, options = parse_options_header(value.get(b"content-disposition", b""))
+                        in_file = sink.filename is None and options.get(b"name", b"").decode() == field
+                        if in_file:
+                            sink.filename = Path(options.get(b"filename", b"").decode("utf-8", "replace")).name
+                            validate_upload_file(filename=sink.filename)
+                    elif event == "data" and in_file:
+                        await sink.write(value)
+                    elif event == "end":
+                        in_file = False
+            parser.finalize()
+            if sink.filename is None:
+                raise UploadError(400, f"No '{field}' file in the upload")
+        elif content_type in (b"application/pdf", b"application/octet-stream"):
+            sink.filename = Path(request.query_params.get("filename") or "upload.pdf").name
+            validate_upload_file(filename=sink.filename)
+            async for chunk in request.stream():
+                await sink.write(chunk)
+        else:
+            raise UploadError(415, "Upload a PDF as multipart/form-data or application/pdf")
+        content_hash = await sink.finish()
+    except BaseException:
+        sink.discard()
+        raise
+    
+    return {"filename": sink.filename, "size_bytes": sink.size, "content_hash": content_hash}
 
 def create_processing_summary(result_data: Dict[str, Any]) -> str:
     """Create a human-readable processing summary"""